@@ -1,80 +1,230 @@
 # --- BLACK BOX LOGGING (with permission handling) ---
-import os, sys, signal, atexit, tempfile
+import os, sys, atexit, tempfile, time, queue, threading
 import faulthandler
 
-# Try Desktop first, fallback to temp directory
-try:
-    LOG_DIR = os.path.expanduser("~/Desktop")
-    # Test write permission
-    test_file = os.path.join(LOG_DIR, "commander_test_write")
-    with open(test_file, "w") as f:
-        f.write("test")
-    os.remove(test_file)
-except (PermissionError, OSError):
-    LOG_DIR = tempfile.gettempdir()
-
-PY_LOG = os.path.join(LOG_DIR, "commander_plugin_faulthandler.log")
-QT_LOG = os.path.join(LOG_DIR, "commander_plugin_qt.log")
-
-# Python stacks on fatal signals (SEGSEGV/ABRT/BUS/ILL) - with error handling
+# Log files kept per log: this session's plus the previous sessions'
+LOG_SESSIONS = 5
+
+# The Qt log moves to .part1, .part2, ... past this size (this session only)
+QT_LOG_MAX_BYTES = 2 * 1024 * 1024
+
+# Earlier parts of this session's Qt log kept once it has rolled over
+QT_LOG_PARTS = 4
+
+# Qt messages are written in batches, at most this long (s) after they arrive
+QT_LOG_FLUSH_SECONDS = 0.5
+
+def rotate_log_files(path, keep=LOG_SESSIONS):
+    """Shift path -> path.1 -> ... -> path.<keep-1>, dropping the oldest"""
+    for index in range(keep - 1, 0, -1):
+        source = path if index == 1 else f"{path}.{index - 1}"
+        if os.path.exists(source):
+            os.replace(source, f"{path}.{index}")
+
+def remove_log_parts(path, parts=QT_LOG_PARTS):
+    """Delete the .partN files a previous session's log rolled over into"""
+    for index in range(1, parts + 1):
+        part = f"{path}.part{index}"
+        if os.path.exists(part):
+            os.remove(part)
+
+class QueuedLogWriter:
+    """Appends lines to a log file from a background thread, in batches.
+    
+    write() only queues the line, so a burst of Qt warnings costs no disk I/O on
+    the thread that logs them; flush() writes synchronously (fatal messages, exit).
+    Lines stay in the queue until they are written, so they are written in order.
+    """
+    
+    def __init__(self, path, header, max_bytes=QT_LOG_MAX_BYTES, parts=QT_LOG_PARTS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.parts = parts
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._pending = threading.Event()
+        self._closing = False
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write(header)
+        self._file.flush()
+        self._thread = threading.Thread(target=self._run, name="CommanderLogWriter", daemon=True)
+        self._thread.start()
+    
+    def write(self, line):
+        """Queue a line for the writer thread"""
+        self._queue.put(line)
+        self._pending.set()
+    
+    def flush(self):
+        """Write everything queued so far, now"""
+        with self._lock:
+            self._write_queued()
+    
+    def close(self):
+        """Write what's left, stop the writer thread and close the file"""
+        self._closing = True
+        self._pending.set()
+        self._thread.join()
+        with self._lock:
+            self._write_queued()
+            self._file.close()
+    
+    def _run(self):
+        """Writer thread: wait for lines, give the burst time to arrive, write it in one go"""
+        while not self._closing:
+            self._pending.wait()
+            if self._closing:
+                return
+            time.sleep(QT_LOG_FLUSH_SECONDS)
+            self._pending.clear()
+            self.flush()
+    
+    def _write_queued(self):
+        """Append the queued lines to the file (lock held)"""
+        lines = []
+        while True:
+            try:
+                lines.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not lines or self._file.closed:
+            return
+        self._file.write("".join(lines))
+        self._file.flush()
+        if self._file.tell() > self.max_bytes:
+            # Roll over into this session's own .partN files; path.1, path.2, ... are earlier sessions
+            self._file.close()
+            for index in range(self.parts, 1, -1):
+                if os.path.exists(f"{self.path}.part{index - 1}"):
+                    os.replace(f"{self.path}.part{index - 1}", f"{self.path}.part{index}")
+            os.replace(self.path, f"{self.path}.part1")
+            self._file = open(self.path, "w", encoding="utf-8")
+            self._file.write("=== COMMANDER QT LOG CONTINUED (previous part in .part1) ===\n")
+
+LOG_DIR = None
+PY_LOG = None
+QT_LOG = None
 _fh = None
 _qt = None
-try:
-    _fh = open(PY_LOG, "w", buffering=1)
-    _fh.write("=== COMMANDER CRASH LOG STARTED ===\n")
-    _fh.flush()
-    
-    faulthandler.enable(_fh)
-    for _sig in (signal.SIGSEGV, signal.SIGABRT, signal.SIGBUS, signal.SIGILL):
-        faulthandler.register(_sig, _fh, all_threads=True)
-    def _atexit_handler():
-        if _fh:
-            _fh.write("=== ATEXIT HANDLER CALLED ===\n")
-            _fh.flush()
-        print("Commander: atexit handler called - Python process ending normally")
-    atexit.register(_atexit_handler)
-
-    # Qt messages to file
-    _qt = open(QT_LOG, "w", buffering=1)
-    _qt.write("=== COMMANDER QT LOG STARTED ===\n")
-    _qt.flush()
-    
-    def _qt_msg(mode, ctx, msg):
-        try:
-            if _qt:
-                _qt.write(f"[QT][{mode}] {msg}\n")
-                _qt.flush()  # Force immediate write
-        except Exception:
-            pass
-    
-    print(f"Commander: Crash logging initialized successfully")
-    print(f"Python log: {PY_LOG}")
-    print(f"Qt log: {QT_LOG}")
-            
-except Exception as e:
-    # Fallback: disable logging if it fails
-    print(f"Commander: Could not initialize crash logging: {e}")
-    _fh = None
-    _qt = None
-    def _qt_msg(mode, ctx, msg):
+_previous_qt_handler = None
+_faulthandler_was_enabled = False
+
+def _atexit_handler():
+    if _qt:
+        _qt.flush()
+    if _fh:
+        _fh.write("=== ATEXIT HANDLER CALLED ===\n")
+        _fh.flush()
+    print("Commander: atexit handler called - Python process ending normally")
+
+def _qt_msg(mode, ctx, msg):
+    try:
+        if _qt:
+            _qt.write(f"[QT][{mode}] {msg}\n")
+            if mode == QtCore.QtMsgType.QtFatalMsg:
+                _qt.flush()  # Qt aborts right after a fatal message
+    except Exception:
         pass
 
+def init_crash_logging():
+    """Open the crash/Qt logs and install faulthandler and the Qt message handler (from start_plugin, once)"""
+    global LOG_DIR, PY_LOG, QT_LOG, _fh, _qt, _previous_qt_handler, _faulthandler_was_enabled
+    if PY_LOG is not None:
+        return
+    
+    # Try Desktop first, fallback to temp directory
+    try:
+        LOG_DIR = os.path.expanduser("~/Desktop")
+        # Test write permission
+        test_file = os.path.join(LOG_DIR, "commander_test_write")
+        with open(test_file, "w") as f:
+            f.write("test")
+        os.remove(test_file)
+    except (PermissionError, OSError):
+        LOG_DIR = tempfile.gettempdir()
+    
+    PY_LOG = os.path.join(LOG_DIR, "commander_plugin_faulthandler.log")
+    QT_LOG = os.path.join(LOG_DIR, "commander_plugin_qt.log")
+    
+    # Python stacks on fatal signals (SEGSEGV/ABRT/BUS/ILL) - with error handling
+    try:
+        # Keep the previous sessions' logs (the evidence of the last crash) as .1, .2, ...
+        rotate_log_files(PY_LOG)
+        rotate_log_files(QT_LOG)
+        remove_log_parts(QT_LOG)  # its last part, with the crash, is now .1
+        
+        _fh = open(PY_LOG, "w", buffering=1)
+        _fh.write("=== COMMANDER CRASH LOG STARTED ===\n")
+        _fh.flush()
+        
+        _faulthandler_was_enabled = faulthandler.is_enabled()
+        # enable() covers SIGSEGV/FPE/ABRT/BUS/ILL; register() refuses these fatal signals
+        faulthandler.enable(_fh, all_threads=True)
+        atexit.register(_atexit_handler)
+        
+        # Qt messages to file, written in batches off the logging thread
+        _qt = QueuedLogWriter(QT_LOG, "=== COMMANDER QT LOG STARTED ===\n")
+        
+        print(f"Commander: Crash logging initialized successfully")
+        print(f"Python log: {PY_LOG}")
+        print(f"Qt log: {QT_LOG}")
+    
+    except Exception as e:
+        # Fallback: disable logging if it fails
+        print(f"Commander: Could not initialize crash logging: {e}")
+        _fh = None
+        _qt = None
+    
+    # Install Qt message handler
+    try:
+        _previous_qt_handler = QtCore.qInstallMessageHandler(_qt_msg)
+        print(f"Commander: Qt message handler installed, logging to: {QT_LOG if _qt else 'disabled'}")
+    except Exception as e:
+        print(f"Commander: Failed to install Qt message handler: {e}")
+
+def shutdown_crash_logging():
+    """Undo init_crash_logging (plugin unload): restore Qt's handler, stop faulthandler, close the logs"""
+    global LOG_DIR, PY_LOG, QT_LOG, _fh, _qt, _previous_qt_handler
+    if PY_LOG is None:
+        return
+    
+    try:
+        QtCore.qInstallMessageHandler(_previous_qt_handler)
+    except Exception as e:
+        print(f"Commander: Failed to restore the Qt message handler: {e}")
+    _previous_qt_handler = None
+    
+    if _fh:
+        faulthandler.disable()
+        if _faulthandler_was_enabled:
+            faulthandler.enable()  # back to stderr, as the host had it
+        atexit.unregister(_atexit_handler)
+    
+    # A reload rotates these files, which fails on Windows while they are open
+    for log in (_qt, _fh):
+        try:
+            if log:
+                log.close()
+        except Exception as e:
+            print(f"Commander: Failed to close crash log: {e}")
+    LOG_DIR = PY_LOG = QT_LOG = _fh = _qt = None
+
 # Commander plugin with hardened popup
 from PySide6 import QtWidgets, QtCore, QtGui
 import substance_painter.ui
 import substance_painter.logging
 import json
-import os
-
-# Install Qt message handler
-try:
-    QtCore.qInstallMessageHandler(_qt_msg)
-    print(f"Commander: Qt message handler installed, logging to: {QT_LOG if _qt else 'disabled'}")
-except Exception as e:
-    print(f"Commander: Failed to install Qt message handler: {e}")
+import contextlib
+import fnmatch
+import collections
+import functools
+import io
+import cProfile
+import pstats
 import substance_painter.layerstack
 import substance_painter.textureset
 import substance_painter.resource
+import substance_painter.project
 from substance_painter.layerstack import (
     InsertPosition, NodeStack, MaskBackground, GeometryMaskType, ProjectionMode,
     SelectionType, BlendingMode, delete_node, get_selected_nodes, set_selected_nodes, set_selection_type,
@@ -91,6 +241,534 @@ COMMANDER_WIDGET = None
 COMMANDER_SHORTCUT = None
 DOCK_WIDGET = None
 
+# Startup phase -> milliseconds, in the order the phases ran (see log_startup_timings)
+STARTUP_TIMINGS = {}
+
+@contextlib.contextmanager
+def timed_phase(phase):
+    """Record how long a startup phase takes in STARTUP_TIMINGS"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMINGS[phase] = (time.perf_counter() - start) * 1000
+
+def log_startup_timings(title, phases):
+    """Log the total and per-phase cost of a group of startup phases"""
+    timings = [(phase, STARTUP_TIMINGS[phase]) for phase in phases if phase in STARTUP_TIMINGS]
+    details = ", ".join(f"{phase} {ms:.1f}" for phase, ms in timings)
+    substance_painter.logging.info(f"Commander: {title} took {sum(ms for _, ms in timings):.1f} ms ({details})")
+
+# ---- Instrumentation: timed spans for commands, macro steps, host calls and the list ----
+
+# Spans kept in memory; the oldest are dropped once the buffer is full
+PROFILE_BUFFER_SIZE = 5000
+
+class CommandProfiler:
+    """Ring buffer of timed spans (category, name, start, duration, thread, args), exportable as a Chrome trace.
+    
+    Spans nest: a macro holds its steps, a step its command, a command its host
+    calls, so chrome://tracing or ui.perfetto.dev draws them as a flame chart.
+    """
+    
+    def __init__(self, size=PROFILE_BUFFER_SIZE):
+        self.spans = collections.deque(maxlen=size)
+        self.profile_path = None  # set by profile_next_macro()
+        self._origin = time.perf_counter()
+    
+    @contextlib.contextmanager
+    def span(self, category, name, **args):
+        """Record how long the block takes (and the error, if it raises)"""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            args['error'] = str(e)
+            raise
+        finally:
+            self.spans.append((category, name, start, time.perf_counter() - start, threading.get_ident(), args))
+    
+    def wrap(self, category, name, function):
+        """function, recording a span on every call"""
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            with self.span(category, name):
+                return function(*args, **kwargs)
+        return timed
+    
+    def timed(self, category):
+        """Decorator form of wrap(), named after the function"""
+        return lambda function: self.wrap(category, function.__name__, function)
+    
+    def clear(self):
+        self.spans.clear()
+    
+    def summary(self):
+        """Count, total and slowest ms per (category, name), most total time first"""
+        totals = {}
+        for category, name, _, duration, _, _ in self.spans:
+            entry = totals.setdefault((category, name), {'category': category, 'name': name, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            entry['count'] += 1
+            entry['total_ms'] += duration * 1000
+            entry['max_ms'] = max(entry['max_ms'], duration * 1000)
+        return sorted(totals.values(), key=lambda entry: entry['total_ms'], reverse=True)
+    
+    def chrome_trace(self):
+        """The recorded spans in Chrome's trace event format (complete events, times in microseconds)"""
+        pid = os.getpid()
+        events = [{'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                   'ts': round((start - self._origin) * 1e6, 1), 'dur': round(duration * 1e6, 1), 'args': args}
+                  for category, name, start, duration, tid, args in self.spans]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'commanderSummary': self.summary()}
+    
+    def export(self, path):
+        """Write the Chrome trace (with a per-name summary) to path; returns the number of spans"""
+        trace = self.chrome_trace()
+        write_file_atomically(path, json.dumps(trace))
+        return len(trace['traceEvents'])
+    
+    def profile_next_macro(self, path):
+        """Run the next macro under cProfile and save its stats to path (read with pstats or snakeviz)"""
+        self.profile_path = path
+    
+    @contextlib.contextmanager
+    def macro_profile(self, name):
+        """cProfile the block if profile_next_macro() asked for it (one run only)"""
+        path, self.profile_path = self.profile_path, None
+        if path is None:
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:  # another profiler is already running
+            substance_painter.logging.warning(f"Commander: Could not profile macro '{name}': {e}")
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            try:
+                profile.dump_stats(path)
+                stats = io.StringIO()
+                pstats.Stats(profile, stream=stats).sort_stats("cumulative").print_stats(15)
+                substance_painter.logging.info(f"Commander: Profile of macro '{name}' saved to {path}\n{stats.getvalue()}")
+            except OSError as e:
+                substance_painter.logging.warning(f"Commander: Could not save profile of macro '{name}': {e}")
+
+PROFILER = CommandProfiler()
+
+# The host calls commands spend their time in, timed as "host" spans
+get_selected_nodes = PROFILER.wrap("host", "get_selected_nodes", get_selected_nodes)
+set_selected_nodes = PROFILER.wrap("host", "set_selected_nodes", set_selected_nodes)
+delete_node = PROFILER.wrap("host", "delete_node", delete_node)
+insert_fill = PROFILER.wrap("host", "insert_fill", insert_fill)
+insert_paint = PROFILER.wrap("host", "insert_paint", insert_paint)
+insert_group = PROFILER.wrap("host", "insert_group", insert_group)
+instantiate = PROFILER.wrap("host", "instantiate", instantiate)
+insert_levels_effect = PROFILER.wrap("host", "insert_levels_effect", insert_levels_effect)
+insert_compare_mask_effect = PROFILER.wrap("host", "insert_compare_mask_effect", insert_compare_mask_effect)
+insert_filter_effect = PROFILER.wrap("host", "insert_filter_effect", insert_filter_effect)
+insert_generator_effect = PROFILER.wrap("host", "insert_generator_effect", insert_generator_effect)
+insert_anchor_point_effect = PROFILER.wrap("host", "insert_anchor_point_effect", insert_anchor_point_effect)
+insert_color_selection_effect = PROFILER.wrap("host", "insert_color_selection_effect", insert_color_selection_effect)
+insert_smart_material = PROFILER.wrap("host", "insert_smart_material", insert_smart_material)
+insert_smart_mask = PROFILER.wrap("host", "insert_smart_mask", insert_smart_mask)
+
+# ---- Command registry: single source for the list, the dispatcher and macros ----
+
+# Context a command needs before its handler runs
+REQUIRES_PROJECT = "project"
+REQUIRES_SELECTION = "selection"
+REQUIRES_MASK = "mask"
+
+# Kinds of command arguments a macro step can bind instead of prompting when it runs
+PARAM_FLOAT = "float"
+PARAM_CHOICE = "choice"
+PARAM_TEXT = "text"
+
+BLEND_MODE_NAMES = (
+    "Normal", "PassThrough", "Disable", "Replace", "Multiply", "Divide", 
+    "InverseDivide", "Darken", "Lighten", "LinearDodge", "Subtract", 
+    "InverseSubtract", "Difference", "Exclusion", "SignedAddition", 
+    "Overlay", "Screen", "LinearBurn", "ColorBurn", "ColorDodge", 
+    "SoftLight", "HardLight", "VividLight", "LinearLight", "PinLight", 
+    "Tint", "Saturation", "Color", "Value", "NormalMapCombine", 
+    "NormalMapDetail", "NormalMapInverseDetail"
+)
+
+class CommandParam:
+    """An input a command prompts for; macro steps can store its value under 'args' instead"""
+    
+    def __init__(self, key, label, kind, default, choices=(), minimum=0.0, maximum=1.0):
+        self.key = key
+        self.label = label
+        self.kind = kind
+        self.default = default
+        self.choices = choices
+        self.minimum = minimum
+        self.maximum = maximum
+    
+    def coerce(self, value):
+        """Check a stored argument and convert it to this parameter's type; raises ValueError"""
+        if self.kind == PARAM_FLOAT:
+            value = float(value)
+            if not self.minimum <= value <= self.maximum:
+                raise ValueError(f"{self.label} must be between {self.minimum} and {self.maximum}, got {value}")
+            return value
+        value = str(value)
+        if self.kind == PARAM_CHOICE and value not in self.choices:
+            raise ValueError(f"Unknown {self.label.lower()}: {value}")
+        return value
+
+class CommandDescriptor:
+    """A palette command: stable id, list label, category, handler method name, context requirements and bindable inputs"""
+    
+    def __init__(self, command_id, label, category, handler, requires=(REQUIRES_PROJECT,), params=(), modifies=True):
+        self.id = command_id
+        self.label = label
+        self.category = category
+        self.handler = handler  # LayerCommands method name
+        self.requires = frozenset(requires)
+        self.params = params  # CommandParams a macro step can bind (see LayerCommands.ask_*)
+        self.modifies = modifies  # False for read-only commands (nothing to undo)
+
+_SEL = (REQUIRES_SELECTION,)
+_MASK = (REQUIRES_SELECTION, REQUIRES_MASK)
+
+COMMAND_REGISTRY = (
+    # === Layer Creation (Real API: insert_*) ===
+    CommandDescriptor("create_paint_layer", "Create Paint Layer", "Layer Creation", "create_paint_layer"),            # → insert_paint()
+    CommandDescriptor("create_fill_layer", "Create Fill Layer", "Layer Creation", "create_fill_layer"),               # → insert_fill()
+    CommandDescriptor("create_group_layer", "Create Group Layer", "Layer Creation", "create_group_layer"),            # → insert_group()
+    CommandDescriptor("create_layer_instance", "Create Layer Instance", "Layer Creation", "create_instance_layer", _SEL),  # → instantiate()
+    
+    # === Effect Creation (Real API: insert_*_effect) ===
+    CommandDescriptor("insert_levels_effect", "Insert Levels Effect", "Effects", "insert_levels_effect", _SEL),       # → insert_levels_effect()
+    CommandDescriptor("insert_filter_effect", "Insert Filter Effect", "Effects", "insert_filter_effect", _SEL),       # → insert_filter_effect()
+    CommandDescriptor("insert_fill_effect", "Insert Fill Effect", "Effects", "insert_fill_effect", _SEL),             # → insert_fill() (creates FillEffectNode when in effect stack)
+    CommandDescriptor("insert_paint_effect", "Insert Paint Effect", "Effects", "insert_paint_effect", _SEL),          # → insert_paint() (creates PaintEffectNode when in effect stack)
+    CommandDescriptor("insert_generator_effect", "Insert Generator Effect", "Effects", "insert_generator_effect", _SEL),  # → insert_generator_effect()
+    CommandDescriptor("insert_compare_mask_effect", "Insert Compare Mask Effect", "Effects", "insert_compare_mask_effect", _MASK),  # → insert_compare_mask_effect()
+    CommandDescriptor("insert_color_selection_effect", "Insert Color Selection Effect", "Effects", "insert_color_selection_effect", _MASK),  # → insert_color_selection_effect()
+    CommandDescriptor("insert_anchor_point_effect", "Insert Anchor Point Effect", "Effects", "insert_anchor_point_effect", _SEL),  # → insert_anchor_point_effect()
+    
+    # === Layer Management (Real API) ===
+    CommandDescriptor("delete_selected_layers", "Delete Selected Layers", "Layer Management", "delete_selected", _SEL),  # → delete_node()
+    CommandDescriptor("rename_selected_layer", "Rename Selected Layer", "Layer Management", "rename_selected_layer", _SEL,
+                      (CommandParam("name", "Name ({name} = current name)", PARAM_TEXT, ""),)),  # → node.set_name()
+    
+    # === Layer Properties (Real API: Node methods) ===
+    CommandDescriptor("toggle_layer_visibility", "Toggle Layer Visibility", "Layer Properties", "toggle_layer_visibility", _SEL),  # → node.set_visible()
+    CommandDescriptor("show_layer", "Show Layer", "Layer Properties", "show_layer", _SEL),                            # → node.set_visible(True)
+    CommandDescriptor("hide_layer", "Hide Layer", "Layer Properties", "hide_layer", _SEL),                            # → node.set_visible(False)
+    CommandDescriptor("set_layer_opacity", "Set Layer Opacity", "Layer Properties", "set_layer_opacity", _SEL,
+                      (CommandParam("opacity", "Opacity", PARAM_FLOAT, 1.0),)),       # → node.set_opacity()
+    CommandDescriptor("get_layer_opacity", "Get Layer Opacity", "Layer Properties", "get_layer_opacity", _SEL, modifies=False),  # → node.get_opacity()
+    CommandDescriptor("set_blend_mode", "Set Blend Mode", "Layer Properties", "set_blend_mode", _SEL,
+                      (CommandParam("blend_mode", "Blend mode", PARAM_CHOICE, "Normal", BLEND_MODE_NAMES),)),                # → node.set_blending_mode()
+    CommandDescriptor("get_blend_mode", "Get Blend Mode", "Layer Properties", "get_blend_mode", _SEL, modifies=False),  # → node.get_blending_mode()
+    
+    # === Channel Management (Real API: ActiveChannelsMixin) ===
+    CommandDescriptor("enable_basecolor_channel", "Enable BaseColor Channel", "Channels", "enable_basecolor_channel", _SEL),  # → layer.active_channels = {BaseColor}
+    CommandDescriptor("enable_all_channels", "Enable All Channels", "Channels", "enable_all_channels", _SEL),          # → layer.active_channels = all available
+    CommandDescriptor("disable_all_channels", "Disable All Channels", "Channels", "disable_all_channels", _SEL),       # → layer.active_channels = set()
+    CommandDescriptor("toggle_channels", "Toggle Channels", "Channels", "toggle_channels", _SEL),                     # → interactive channel selection
+    
+    # === Layer Masks (Real API: LayerNode methods) ===
+    CommandDescriptor("add_layer_mask", "Add Layer Mask", "Masks", "add_layer_mask", _SEL),                           # → layer.add_mask()
+    CommandDescriptor("remove_layer_mask", "Remove Layer Mask", "Masks", "remove_layer_mask", _MASK),                 # → layer.remove_mask()
+    CommandDescriptor("enable_layer_mask", "Enable Layer Mask", "Masks", "enable_layer_mask", _MASK),                 # → layer.enable_mask(True)
+    CommandDescriptor("disable_layer_mask", "Disable Layer Mask", "Masks", "disable_layer_mask", _MASK),              # → layer.enable_mask(False)
+    CommandDescriptor("toggle_layer_mask", "Toggle Layer Mask", "Masks", "toggle_mask", _MASK),                       # → layer.enable_mask(not enabled)
+    CommandDescriptor("set_mask_background_white", "Set Mask Background White", "Masks", "set_mask_white", _MASK),    # → layer.set_mask_background(MaskBackground.White)
+    CommandDescriptor("set_mask_background_black", "Set Mask Background Black", "Masks", "set_mask_black", _MASK),    # → layer.set_mask_background(MaskBackground.Black)
+    
+    # === Smart Materials/Masks (Real API) ===
+    CommandDescriptor("insert_smart_material", "Insert Smart Material", "Smart Materials", "insert_smart_material"),  # → insert_smart_material()
+    CommandDescriptor("create_smart_material", "Create Smart Material", "Smart Materials", "create_smart_material", _SEL,
+                      (CommandParam("name", "Smart material name", PARAM_TEXT, ""),)),  # → create_smart_material()
+    CommandDescriptor("insert_smart_mask", "Insert Smart Mask", "Smart Materials", "insert_smart_mask"),              # → insert_smart_mask()
+    CommandDescriptor("create_smart_mask", "Create Smart Mask", "Smart Materials", "create_smart_mask", _MASK,
+                      (CommandParam("name", "Smart mask name", PARAM_TEXT, ""),)),       # → create_smart_mask()
+    
+    # === Geometry Masks (Real API: LayerNode methods) ===
+    CommandDescriptor("set_geometry_mask_mesh", "Set Geometry Mask Mesh", "Geometry Masks", "set_geometry_mask_mesh", _SEL),  # → layer.set_geometry_mask_type(GeometryMaskType.Mesh)
+    CommandDescriptor("set_geometry_mask_uv_tile", "Set Geometry Mask UV Tile", "Geometry Masks", "set_geometry_mask_uv_tile", _SEL),  # → layer.set_geometry_mask_type(GeometryMaskType.UVTile)
+    CommandDescriptor("enable_geometry_mask", "Enable Geometry Mask", "Geometry Masks", "enable_geometry_mask", _SEL),  # → layer.set_geometry_mask_enabled_meshes()
+    
+    # === Projection Modes (Real API: FillParamsEditorMixin) ===
+    CommandDescriptor("set_projection_uv", "Set Projection UV", "Projection", "set_projection_uv", _SEL),              # → layer.set_projection_mode(ProjectionMode.UV)
+    CommandDescriptor("set_projection_triplanar", "Set Projection Triplanar", "Projection", "set_projection_triplanar", _SEL),  # → layer.set_projection_mode(ProjectionMode.Triplanar)
+    CommandDescriptor("set_projection_planar", "Set Projection Planar", "Projection", "set_projection_planar", _SEL),  # → layer.set_projection_mode(ProjectionMode.Planar)
+    CommandDescriptor("set_projection_spherical", "Set Projection Spherical", "Projection", "set_projection_spherical", _SEL),  # → layer.set_projection_mode(ProjectionMode.Spherical)
+    CommandDescriptor("set_projection_cylindrical", "Set Projection Cylindrical", "Projection", "set_projection_cylindrical", _SEL),  # → layer.set_projection_mode(ProjectionMode.Cylindrical)
+    CommandDescriptor("enable_symmetry", "Enable Symmetry", "Projection", "enable_symmetry", _SEL),                   # → layer.set_symmetry_enabled(True)
+    CommandDescriptor("disable_symmetry", "Disable Symmetry", "Projection", "disable_symmetry", _SEL),                # → layer.set_symmetry_enabled(False)
+    
+    # === Selection (Real API: set_selection_type) ===
+    CommandDescriptor("select_content", "Select Content", "Selection", "select_content", _SEL),                       # → set_selection_type(SelectionType.Content)
+    CommandDescriptor("select_mask", "Select Mask", "Selection", "select_mask", _MASK),                               # → set_selection_type(SelectionType.Mask)
+    CommandDescriptor("select_properties", "Select Properties", "Selection", "select_properties", _SEL),              # → set_selection_type(SelectionType.Properties)
+)
+
+COMMANDS_BY_ID = {descriptor.id: descriptor for descriptor in COMMAND_REGISTRY}
+COMMANDS_BY_LABEL = {descriptor.label: descriptor for descriptor in COMMAND_REGISTRY}
+
+def macro_step_label(step):
+    """Display label of a stored macro step (a plain label, or a dict with a 'command' label)"""
+    return step['command'] if isinstance(step, dict) else step
+
+def macro_step_modifies(label):
+    """Whether a macro step (by label) edits the layer stack; procedurals always do, unknown steps never run"""
+    if label.startswith("[PROC]"):
+        return True
+    descriptor = COMMANDS_BY_LABEL.get(label)
+    return descriptor is not None and descriptor.modifies
+
+def host_groups_modifications():
+    """Whether the host can group layer stack edits into one undo entry (ScopedModification)"""
+    return hasattr(substance_painter.layerstack, 'ScopedModification')
+
+def macro_step_description(step):
+    """Macro step label with its bound arguments, e.g. Set Layer Opacity (opacity=0.35)"""
+    args = step.get('args') if isinstance(step, dict) else None
+    if not args:
+        return macro_step_label(step)
+    return f"{macro_step_label(step)} ({', '.join(f'{key}={value}' for key, value in args.items())})"
+
+# Macros file layout: {"version": MACROS_VERSION, "macros": {name: macro data}}
+# (version 1 files were the bare {name: macro data} mapping)
+MACROS_VERSION = 2
+
+# Quiet period (ms) that coalesces several settings/macro edits into one write
+PERSIST_DELAY_MS = 300
+
+def read_macros_file(path):
+    """Load the macros mapping from a macros file, upgrading older layouts; returns (macros, migrated)"""
+    if not os.path.exists(path):
+        return {}, False
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    
+    # A version 1 file could hold a macro named "version", so check the whole envelope
+    if isinstance(data.get('version'), int) and isinstance(data.get('macros'), dict):
+        if data['version'] > MACROS_VERSION:
+            raise ValueError(f"{path} was written by a newer Commander (format version {data['version']})")
+        return data['macros'], False
+    return data, True
+
+def macros_file_text(macros):
+    """Compact JSON for the macros file"""
+    return json.dumps({'version': MACROS_VERSION, 'macros': macros}, separators=(',', ':'), ensure_ascii=False)
+
+def write_file_atomically(path, text):
+    """Write text to a temp file next to path, then rename it over path, so readers never see half a file"""
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def write_macros_file(path, macros):
+    """Write the macros mapping compactly and atomically"""
+    write_file_atomically(path, macros_file_text(macros))
+
+def commander_data_file(filename):
+    """Path of a Commander data file in the host's application data folder (home folder as fallback)"""
+    try:
+        import substance_painter.application
+        app_data = substance_painter.application.application_data_folder()
+        return os.path.join(app_data, filename)
+    except:
+        # Fallback to user home directory
+        return os.path.expanduser(f"~/{filename}")
+
+class ProceduralEntry:
+    """Compact catalog record for one procedural resource (holds no live Resource object)"""
+    __slots__ = ('name', 'category', 'url', 'embedded', '_resource_id')
+    
+    def __init__(self, name, category, url, embedded=False):
+        self.name = name
+        self.category = category
+        self.url = url
+        self.embedded = embedded  # embedded in the open project rather than on a shelf
+        self._resource_id = None
+    
+    @property
+    def resource_id(self):
+        """ResourceID for the host API, built from the URL on first use"""
+        if self._resource_id is None:
+            self._resource_id = substance_painter.resource.ResourceID.from_url(self.url)
+        return self._resource_id
+
+# Procedural catalog file layout: {"version": CATALOG_VERSION, "fingerprint": [shelves, count] or null,
+# "entries": [[name, category, url], ...]}; bump when it changes (older files are rescanned)
+CATALOG_VERSION = 3
+
+def read_catalog_file(path):
+    """Load (entry records, shelf fingerprint) from a catalog file; raises ValueError on an unexpected layout"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or data.get('version') != CATALOG_VERSION:
+        raise ValueError("written by another Commander version")
+    records = [(str(name), str(category), str(url)) for name, category, url in data['entries']]
+    fingerprint = data.get('fingerprint')
+    if fingerprint is not None:
+        shelves, count = fingerprint
+        fingerprint = (tuple((str(name), str(shelf_path)) for name, shelf_path in shelves), int(count))
+    return records, fingerprint
+
+def catalog_file_text(records, fingerprint):
+    """Compact JSON for the procedural catalog file"""
+    return json.dumps({'version': CATALOG_VERSION, 'fingerprint': fingerprint, 'entries': records},
+                      separators=(',', ':'), ensure_ascii=False)
+
+# Fallback project polling interval range (ms) when host events are unavailable
+PROJECT_POLL_MIN_MS = 2000
+PROJECT_POLL_MAX_MS = 30000
+
+# Channels that opacity/blend mode commands edit on content layers (when present in the stack)
+MAJOR_CHANNELS = (ChannelType.BaseColor, ChannelType.Roughness, ChannelType.Normal,
+                  ChannelType.Metallic, ChannelType.Height)
+
+def list_shelves():
+    """The resource shelves as sorted (name, path) pairs"""
+    return tuple(sorted((shelf.name(), shelf.path()) for shelf in substance_painter.resource.Shelves.all()))
+
+def compute_shelf_fingerprint(embedded_count=0):
+    """Cheap signature of the resource libraries, used to tell if the procedural catalog is stale.
+    
+    The shelves (name and path) and how many procedurals they hold: one
+    u:procedural search, minus embedded_count for the open project's own
+    procedurals, which are listed but kept out of the fingerprint and the cache.
+    Returns None when the shelves can't be read (the catalog is then rescanned).
+    """
+    try:
+        shelves = list_shelves()
+        try:
+            count = len(substance_painter.resource.search("u:procedural"))
+        except Exception:
+            count = 0  # no usage filter in this host version: compare the shelves only
+        return (shelves, count - embedded_count)
+    except Exception as e:
+        substance_painter.logging.warning(f"Commander: Could not fingerprint shelves: {e}")
+        return None
+
+class ExecutionContext:
+    """Stack, selection, selection types and stack channels for running commands.
+    
+    Each value is asked from the host once and then cached; commands change the
+    selection through select()/set_selection_type() so the cache stays current
+    across the steps of a macro.
+    """
+    
+    def __init__(self, stack=None):
+        self._stack = stack
+        self._selection = None
+        self._selection_types = {}  # node uid -> SelectionType
+        self._channels = None
+        self.procedural_scan_done = False  # name-only procedural steps load the library once per run
+    
+    @property
+    def stack(self):
+        if self._stack is None:
+            self._stack = substance_painter.textureset.get_active_stack()
+        return self._stack
+    
+    @property
+    def selection(self):
+        if self._selection is None:
+            self._selection = get_selected_nodes(self.stack)
+        return self._selection
+    
+    @property
+    def channels(self):
+        """Channels of the stack (ChannelType -> Channel)"""
+        if self._channels is None:
+            self._channels = self.stack.all_channels()
+        return self._channels
+    
+    def selection_type(self, layer):
+        """Selection type (content/mask/properties) of a layer"""
+        uid = layer.uid()
+        if uid not in self._selection_types:
+            self._selection_types[uid] = substance_painter.layerstack.get_selection_type(layer)
+        return self._selection_types[uid]
+    
+    def select(self, nodes):
+        """Select nodes in the host and in the cache"""
+        set_selected_nodes(nodes)
+        self._selection = list(nodes)
+        for node in nodes:
+            self._selection_types.pop(node.uid(), None)
+    
+    def set_selection_type(self, layer, selection_type):
+        """Switch a layer's selection type in the host and in the cache"""
+        set_selection_type(layer, selection_type)
+        self._selection_types[layer.uid()] = selection_type
+    
+    def forget_selection_type(self, layer):
+        """Drop a layer's cached selection type (the host changed it, e.g. its mask was removed)"""
+        self._selection_types.pop(layer.uid(), None)
+    
+    def invalidate_selection(self):
+        """Forget the cached selection (after nodes were deleted)"""
+        self._selection = None
+        self._selection_types = {}
+
+# How long (ms) the first stroke of a multi-stroke hotkey (e.g. "Ctrl+K, F") waits for the next
+HOTKEY_CHORD_TIMEOUT_MS = 1500
+
+_MODIFIER_KEYS = (QtCore.Qt.Key.Key_Control, QtCore.Qt.Key.Key_Alt, QtCore.Qt.Key.Key_Shift,
+                  QtCore.Qt.Key.Key_Meta, QtCore.Qt.Key.Key_AltGr)
+
+_KEYPAD_MODIFIER = QtCore.Qt.KeyboardModifier.KeypadModifier.value
+
+# Shortcuts a focused text field handles itself (copy, undo, word moves, ...); its plain keys are its own too
+_TEXT_EDIT_KEYS = (
+    QtGui.QKeySequence.StandardKey.Copy, QtGui.QKeySequence.StandardKey.Cut, QtGui.QKeySequence.StandardKey.Paste,
+    QtGui.QKeySequence.StandardKey.Undo, QtGui.QKeySequence.StandardKey.Redo, QtGui.QKeySequence.StandardKey.SelectAll,
+    QtGui.QKeySequence.StandardKey.MoveToNextWord, QtGui.QKeySequence.StandardKey.MoveToPreviousWord,
+    QtGui.QKeySequence.StandardKey.SelectNextWord, QtGui.QKeySequence.StandardKey.SelectPreviousWord,
+    QtGui.QKeySequence.StandardKey.MoveToStartOfLine, QtGui.QKeySequence.StandardKey.MoveToEndOfLine,
+    QtGui.QKeySequence.StandardKey.SelectStartOfLine, QtGui.QKeySequence.StandardKey.SelectEndOfLine,
+    QtGui.QKeySequence.StandardKey.DeleteStartOfWord, QtGui.QKeySequence.StandardKey.DeleteEndOfWord,
+)
+
+def _parse_hotkey(hotkey):
+    """QKeySequence for a hotkey string, or None if any part of it isn't a key Qt knows"""
+    sequence = QtGui.QKeySequence(hotkey)
+    if sequence.isEmpty() or any(sequence[i].key() == QtCore.Qt.Key.Key_unknown for i in range(sequence.count())):
+        return None
+    return sequence
+
+def canonical_hotkey(hotkey):
+    """The one spelling stored and compared for a hotkey, e.g. "shift+ctrl+w" -> "Ctrl+Shift+W"; "" if invalid"""
+    sequence = _parse_hotkey(hotkey)
+    return sequence.toString(QtGui.QKeySequence.SequenceFormat.PortableText) if sequence is not None else ""
+
+def hotkey_chord(hotkey):
+    """Hashable key for a hotkey string: one int (key | modifiers) per stroke; () if invalid"""
+    sequence = _parse_hotkey(hotkey)
+    return tuple(sequence[i].toCombined() for i in range(sequence.count())) if sequence is not None else ()
+
+def key_event_stroke(event):
+    """key | modifiers int for a key event (keypad flag dropped), as used in hotkey chords"""
+    return event.keyCombination().toCombined() & ~_KEYPAD_MODIFIER
+
+def hotkey_from_key_event(event):
+    """Canonical hotkey text for a key press; "" for a bare modifier key"""
+    if event.key() in _MODIFIER_KEYS:
+        return ""
+    return canonical_hotkey(QtGui.QKeySequence(key_event_stroke(event)))
+
+def hotkey_in(hotkey, hotkeys):
+    """True if hotkey is one of hotkeys, however either is spelled"""
+    return canonical_hotkey(hotkey) in {canonical_hotkey(other) for other in hotkeys}
+
 class MacroCreationDialog(QtWidgets.QDialog):
     """Advanced dialog for creating macros with hotkey assignment"""
     
@@ -116,10 +794,41 @@ class MacroCreationDialog(QtWidgets.QDialog):
         commands_list = QtWidgets.QTextEdit()
         commands_list.setReadOnly(True)
         commands_list.setMaximumHeight(100)
-        commands_text = "\n".join([f"• {cmd}" for cmd in self.selected_commands])
+        commands_text = "\n".join([f"• {macro_step_description(cmd)}" for cmd in self.selected_commands])
         commands_list.setText(commands_text)
         layout.addWidget(commands_list)
         
+        # Values for commands that would otherwise prompt, so the macro runs without dialogs
+        self.param_editors = []  # (step index, CommandParam, editor widget)
+        params_layout = QtWidgets.QFormLayout()
+        for index, step in enumerate(self.selected_commands):
+            descriptor = COMMANDS_BY_LABEL.get(macro_step_label(step))
+            if descriptor is None:
+                continue
+            bound = step.get('args', {}) if isinstance(step, dict) else {}
+            for param in descriptor.params:
+                value = bound.get(param.key, param.default)
+                if param.kind == PARAM_FLOAT:
+                    editor = QtWidgets.QDoubleSpinBox()
+                    editor.setRange(param.minimum, param.maximum)
+                    editor.setDecimals(2)
+                    editor.setSingleStep(0.05)
+                    editor.setValue(float(value))
+                elif param.kind == PARAM_CHOICE:
+                    editor = QtWidgets.QComboBox()
+                    editor.addItems(list(param.choices))
+                    editor.setCurrentText(str(value))
+                else:
+                    editor = QtWidgets.QLineEdit(str(value))
+                    editor.setPlaceholderText("Ask when the macro runs")
+                params_layout.addRow(f"{descriptor.label} › {param.label}:", editor)
+                self.param_editors.append((index, param, editor))
+        if self.param_editors:
+            params_label = QtWidgets.QLabel("Step values:")
+            params_label.setStyleSheet("font-weight: bold; margin-top: 10px;")
+            layout.addWidget(params_label)
+            layout.addLayout(params_layout)
+        
         # Macro name input
         name_label = QtWidgets.QLabel("Macro name:")
         name_label.setStyleSheet("font-weight: bold; margin-top: 10px;")
@@ -192,44 +901,11 @@ class MacroCreationDialog(QtWidgets.QDialog):
     def eventFilter(self, obj, event):
         """Capture keyboard events for hotkey recording"""
         if event.type() == QtCore.QEvent.Type.KeyPress:
-            key = event.key()
-            modifiers = event.modifiers()
-            
             # Ignore standalone modifier keys
-            if key in (QtCore.Qt.Key.Key_Control, QtCore.Qt.Key.Key_Alt, 
-                      QtCore.Qt.Key.Key_Shift, QtCore.Qt.Key.Key_Meta):
+            if event.key() in _MODIFIER_KEYS:
                 return False
             
-            # Build key sequence
-            modifier_names = []
-            if modifiers & QtCore.Qt.KeyboardModifier.ControlModifier:
-                modifier_names.append("Ctrl")
-            if modifiers & QtCore.Qt.KeyboardModifier.AltModifier:
-                modifier_names.append("Alt")
-            if modifiers & QtCore.Qt.KeyboardModifier.ShiftModifier:
-                modifier_names.append("Shift")
-            if modifiers & QtCore.Qt.KeyboardModifier.MetaModifier:
-                modifier_names.append("Meta")
-            
-            # Get key name
-            key_name = ""
-            if key == QtCore.Qt.Key.Key_F1: key_name = "F1"
-            elif key == QtCore.Qt.Key.Key_F2: key_name = "F2"
-            elif key == QtCore.Qt.Key.Key_F3: key_name = "F3"
-            elif key == QtCore.Qt.Key.Key_F4: key_name = "F4"
-            elif key == QtCore.Qt.Key.Key_F5: key_name = "F5"
-            elif key == QtCore.Qt.Key.Key_F6: key_name = "F6"
-            elif key == QtCore.Qt.Key.Key_F7: key_name = "F7"
-            elif key == QtCore.Qt.Key.Key_F8: key_name = "F8"
-            elif key == QtCore.Qt.Key.Key_F9: key_name = "F9"
-            elif key == QtCore.Qt.Key.Key_F10: key_name = "F10"
-            elif key == QtCore.Qt.Key.Key_F11: key_name = "F11"
-            elif key == QtCore.Qt.Key.Key_F12: key_name = "F12"
-            else:
-                # Convert to character
-                key_name = QtGui.QKeySequence(key).toString()
-            
-            sequence_text = "+".join(modifier_names + [key_name]) if modifier_names else key_name
+            sequence_text = hotkey_from_key_event(event)
             
             if sequence_text:
                 self.hotkey_sequence = sequence_text
@@ -257,6 +933,25 @@ class MacroCreationDialog(QtWidgets.QDialog):
     def get_hotkey(self):
         """Get the hotkey"""
         return self.hotkey_sequence
+    
+    def get_steps(self):
+        """Selected steps with the entered values bound as step arguments"""
+        steps = list(self.selected_commands)
+        for index, param, editor in self.param_editors:
+            if param.kind == PARAM_FLOAT:
+                value = editor.value()
+            elif param.kind == PARAM_CHOICE:
+                value = editor.currentText()
+            else:
+                value = editor.text().strip()
+                if not value:
+                    continue  # left empty: ask when the macro runs
+            step = steps[index]
+            if not isinstance(step, dict):
+                step = {'command': step}
+            step = dict(step, args=dict(step.get('args', {}), **{param.key: value}))
+            steps[index] = step
+        return steps
 
 class SettingsDialog(QtWidgets.QDialog):
     """Dialog for configuring Commander settings"""
@@ -339,6 +1034,27 @@ class SettingsDialog(QtWidgets.QDialog):
         help_text.setWordWrap(True)
         layout.addWidget(help_text)
         
+        # Macro behaviour
+        self.undo_failed_macros_checkbox = QtWidgets.QCheckBox("Undo a macro's changes when one of its steps fails")
+        self.undo_failed_macros_checkbox.setChecked(self.current_settings.get('undo_failed_macros', False))
+        self.undo_failed_macros_checkbox.setToolTip("Macros run as a single undo step; this undoes that step if the macro doesn't complete")
+        if not host_groups_modifications():
+            # Without grouped edits Undo would only revert the macro's last step
+            self.undo_failed_macros_checkbox.setEnabled(False)
+            self.undo_failed_macros_checkbox.setToolTip("Needs a Substance Painter version that can group a macro's edits into one undo step")
+        layout.addWidget(self.undo_failed_macros_checkbox)
+        
+        # Timings of recent commands, macro steps, host calls and searches
+        timings_layout = QtWidgets.QHBoxLayout()
+        timings_label = QtWidgets.QLabel(f"Recorded timings: {len(PROFILER.spans)}")
+        timings_layout.addWidget(timings_label)
+        timings_layout.addStretch()
+        export_timings_button = QtWidgets.QPushButton("Export Timings...")
+        export_timings_button.setToolTip("Save as a Chrome trace (open in chrome://tracing or ui.perfetto.dev)")
+        export_timings_button.clicked.connect(self.export_timings)
+        timings_layout.addWidget(export_timings_button)
+        layout.addLayout(timings_layout)
+        
         # Recovery information
         recovery_text = QtWidgets.QLabel(
             "🔧 Manual Recovery: If Commander won't open, edit the file:\n" +
@@ -382,44 +1098,11 @@ class SettingsDialog(QtWidgets.QDialog):
     def eventFilter(self, obj, event):
         """Capture keyboard events for shortcut recording (same as macro system)"""
         if event.type() == QtCore.QEvent.Type.KeyPress:
-            key = event.key()
-            modifiers = event.modifiers()
-            
-            # Ignore modifier keys by themselves
-            if key in [QtCore.Qt.Key.Key_Control, QtCore.Qt.Key.Key_Alt, 
-                      QtCore.Qt.Key.Key_Shift, QtCore.Qt.Key.Key_Meta]:
+            # Ignore standalone modifier keys
+            if event.key() in _MODIFIER_KEYS:
                 return False
             
-            # Build key sequence
-            modifier_names = []
-            if modifiers & QtCore.Qt.KeyboardModifier.ControlModifier:
-                modifier_names.append("Ctrl")
-            if modifiers & QtCore.Qt.KeyboardModifier.AltModifier:
-                modifier_names.append("Alt")
-            if modifiers & QtCore.Qt.KeyboardModifier.ShiftModifier:
-                modifier_names.append("Shift")
-            if modifiers & QtCore.Qt.KeyboardModifier.MetaModifier:
-                modifier_names.append("Meta")
-            
-            # Get key name (same mapping as macro system)
-            key_name = ""
-            if key == QtCore.Qt.Key.Key_F1: key_name = "F1"
-            elif key == QtCore.Qt.Key.Key_F2: key_name = "F2"
-            elif key == QtCore.Qt.Key.Key_F3: key_name = "F3"
-            elif key == QtCore.Qt.Key.Key_F4: key_name = "F4"
-            elif key == QtCore.Qt.Key.Key_F5: key_name = "F5"
-            elif key == QtCore.Qt.Key.Key_F6: key_name = "F6"
-            elif key == QtCore.Qt.Key.Key_F7: key_name = "F7"
-            elif key == QtCore.Qt.Key.Key_F8: key_name = "F8"
-            elif key == QtCore.Qt.Key.Key_F9: key_name = "F9"
-            elif key == QtCore.Qt.Key.Key_F10: key_name = "F10"
-            elif key == QtCore.Qt.Key.Key_F11: key_name = "F11"
-            elif key == QtCore.Qt.Key.Key_F12: key_name = "F12"
-            else:
-                # Convert to character
-                key_name = QtGui.QKeySequence(key).toString()
-            
-            sequence_text = "+".join(modifier_names + [key_name]) if modifier_names else key_name
+            sequence_text = hotkey_from_key_event(event)
             
             if sequence_text:
                 self.new_shortcut = sequence_text
@@ -435,6 +1118,19 @@ class SettingsDialog(QtWidgets.QDialog):
         
         return False
     
+    def export_timings(self):
+        """Save the recorded timings as a Chrome trace file"""
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Export Timings", commander_data_file("commander_trace.json"), "Chrome trace (*.json)")
+        if not path:
+            return
+        try:
+            count = PROFILER.export(path)
+        except OSError as e:
+            QtWidgets.QMessageBox.warning(self, "Export Timings", f"Could not write {path}:\n{e}")
+            return
+        substance_painter.logging.info(f"Commander: Exported {count} timings to {path}")
+    
     def reset_to_default(self):
         """Reset shortcut to default"""
         self.new_shortcut = 'Ctrl+;'
@@ -445,2326 +1141,3747 @@ class SettingsDialog(QtWidgets.QDialog):
         settings = self.current_settings.copy()
         if self.new_shortcut:
             settings['main_shortcut'] = self.new_shortcut
+        settings['undo_failed_macros'] = self.undo_failed_macros_checkbox.isChecked()
         return settings
 
-class CommanderWidget(QtWidgets.QWidget):
-    """Stable dock widget - no crashes!"""
+class CommandSearchIndex:
+    """Precomputed fuzzy search index over the command list rows.
+
+    Built once per refresh so a keystroke only touches candidate rows:
+    - haystacks: pre-lowered row text
+    - word_starts: per-row flags marking the first character of each word
+    - chars: character -> set of rows containing it (candidate prefilter)
+    - initials: character -> set of rows where it starts a word
+    - prefix table: matches of earlier queries, so typing more characters
+      only re-scores the rows that matched the shorter query
+    - a cap on rows scored per call: past SCORE_LIMIT candidates, the likeliest
+      rows are ranked first and the rest are scored by score_pending()
+
+    Rows are the list model's entry ids; single rows can be added, updated
+    or removed without rebuilding the rest of the index.
+    """
+
+    SCORE_MATCH = 16
+    BONUS_WORD_START = 8
+    BONUS_CONSECUTIVE = 4
+    GAP_START = 3
+    GAP_EXTENSION = 1
+
+    # Rows scored per call, so a keystroke stays within a frame; the rest wait for score_pending()
+    SCORE_LIMIT = 1000
+
+    def __init__(self):
+        self.haystacks = []
+        self.word_starts = []
+        self.tiebreak = []
+        self.chars = {}
+        self.initials = {}
+        self.order = []  # rows in unfiltered list order
+        self._prefix_results = {}
+        self._pending = None  # (needle, terms, ranked head, rows left to score, scored so far)
+
+    @property
+    def pending(self):
+        """True while the last query's result holds only its first ranked rows"""
+        return self._pending is not None
+
+    def build(self, texts):
+        """Rebuild the index from the row texts (row order = list order)"""
+        count = len(texts)
+        self.haystacks = [None] * count
+        self.word_starts = [None] * count
+        self.tiebreak = [0] * count
+        self.chars = {}
+        self.initials = {}
+        self.order = list(range(count))
+        self._prefix_results = {}
+        self._pending = None
+        for row, text in enumerate(texts):
+            self._index_row(row, text)
+
+    def add(self, row, text, position):
+        """Index a new row and place it at position in the unfiltered order"""
+        missing = row + 1 - len(self.haystacks)
+        if missing > 0:
+            self.haystacks.extend([None] * missing)
+            self.word_starts.extend([None] * missing)
+            self.tiebreak.extend([0] * missing)
+        self._index_row(row, text)
+        self.order.insert(position, row)
+        self._prefix_results = {}
+        self._pending = None
+
+    def extend(self, texts, first_row):
+        """Index a batch of new rows placed after all existing rows"""
+        end = first_row + len(texts)
+        missing = end - len(self.haystacks)
+        if missing > 0:
+            self.haystacks.extend([None] * missing)
+            self.word_starts.extend([None] * missing)
+            self.tiebreak.extend([0] * missing)
+        for offset, text in enumerate(texts):
+            self._index_row(first_row + offset, text)
+        self.order.extend(range(first_row, end))
+        self._prefix_results = {}
+        self._pending = None
+
+    def update(self, row, text):
+        """Re-index a row whose text changed"""
+        self._unindex_row(row)
+        self._index_row(row, text)
+        self._prefix_results = {}
+        self._pending = None
+
+    def remove(self, row):
+        """Drop a row from the index"""
+        self._unindex_row(row)
+        self.haystacks[row] = None
+        self.word_starts[row] = None
+        self.order.remove(row)
+        self._prefix_results = {}
+        self._pending = None
+
+    def _index_row(self, row, text):
+        haystack = text.lower()
+        starts = self._compute_word_starts(text)
+        self.haystacks[row] = haystack
+        self.word_starts[row] = starts
+        # Equal scores: shorter labels first, then list order
+        self.tiebreak[row] = ((len(haystack) // 8) << 32) | row
+
+        for table, keys in self._posting_keys(haystack, starts):
+            for ch in keys:
+                rows = table.get(ch)
+                if rows is None:
+                    table[ch] = {row}
+                else:
+                    rows.add(row)
+
+    def _unindex_row(self, row):
+        for table, keys in self._posting_keys(self.haystacks[row], self.word_starts[row]):
+            for ch in keys:
+                table[ch].discard(row)
+
+    def _posting_keys(self, haystack, starts):
+        return (
+            (self.chars, set(haystack)),
+            (self.initials, {haystack[i] for i, flag in enumerate(starts) if flag}),
+        )
+
+    @staticmethod
+    def _compute_word_starts(text):
+        """Flag word starts: after a separator, camelCase humps and digit runs"""
+        starts = bytearray(len(text))
+        prev = ""
+        for i, ch in enumerate(text):
+            if ch.isalnum() and (
+                not prev.isalnum()
+                or (ch.isupper() and prev.islower())
+                or (ch.isdigit() and not prev.isdigit())
+            ):
+                starts[i] = 1
+            prev = ch
+        return bytes(starts)
+
+    def __len__(self):
+        return len(self.order)
+
+    def query(self, text):
+        """Return the matching rows ranked by fuzzy score (best first).
+
+        Whitespace separates terms; every term must match, scores add up.
+        While pending is True, only the first rows are ranked; score_pending()
+        returns the complete result, which only appends to this one.
+        """
+        needle = " ".join(text.lower().split())
+        if not needle:
+            self._pending = None
+            return list(self.order)
+        if self._pending is not None and self._pending[0] == needle:
+            return self._pending[2]
+        self._pending = None
+
+        cached = self._prefix_results.get(needle)
+        if cached is None:
+            cached = self._match_rows(needle)
+            if self._pending is not None:
+                return cached
+            self._cache_result(needle, cached)
+        return cached
+
+    def score_pending(self):
+        """Score the next SCORE_LIMIT rows of a capped query; returns its complete result once done, else None"""
+        if self._pending is None:
+            return None
+        needle, terms, head, rest, scored = self._pending
+        scored.extend(self._score_rows(terms, rest[:self.SCORE_LIMIT]))
+        del rest[:self.SCORE_LIMIT]
+        if rest:
+            return None
+        self._pending = None
+        scored.sort()
+        result = head + [row for _, _, row in scored]
+        self._cache_result(needle, result)
+        return result
+
+    def _cache_result(self, needle, rows):
+        # Keep only the chain of prefixes of the current query
+        for key in [key for key in self._prefix_results if not needle.startswith(key)]:
+            del self._prefix_results[key]
+        self._prefix_results[needle] = rows
+
+    def _match_rows(self, needle):
+        """Score all candidate rows for the needle in one batch"""
+        terms = needle.split(" ")
+        if len(terms) == 1 and len(needle) == 1:
+            return self._match_single_char(needle)
+
+        # Matches of a longer query are a subset of the shorter one's
+        candidates = None
+        for end in range(len(needle) - 1, 0, -1):
+            previous = self._prefix_results.get(needle[:end])
+            if previous is not None:
+                candidates = previous
+                break
+
+        if candidates is None:
+            postings = []
+            for ch in set(needle.replace(" ", "")):
+                rows = self.chars.get(ch)
+                if not rows:
+                    return []
+                postings.append(rows)
+            postings.sort(key=len)
+            candidates = postings[0].intersection(*postings[1:])
+            if len(candidates) > self.SCORE_LIMIT:
+                # Likeliest first: rows where more of the query's characters start a word, shorter ones first
+                word_start_hits = dict.fromkeys(candidates, 0)
+                for ch in set(needle.replace(" ", "")):
+                    for row in candidates & self.initials.get(ch, set()):
+                        word_start_hits[row] -= 1
+                tiebreak = self.tiebreak
+                candidates = sorted(candidates, key=lambda row: (word_start_hits[row], tiebreak[row]))
+        # else: the shorter query's ranking is the priority order
+
+        if len(candidates) > self.SCORE_LIMIT:
+            candidates = list(candidates)
+            head = [row for _, _, row in sorted(self._score_rows(terms, candidates[:self.SCORE_LIMIT]))]
+            self._pending = (needle, terms, head, candidates[self.SCORE_LIMIT:], [])
+            return head
+        scored = self._score_rows(terms, candidates)
+        scored.sort()
+        return [row for _, _, row in scored]
+
+    def _score_rows(self, terms, rows):
+        """(-score, tiebreak, row) for the rows matching every term"""
+        haystacks = self.haystacks
+        word_starts = self.word_starts
+        tiebreak = self.tiebreak
+        score = self._score
+        scored = []
+        for row in rows:
+            haystack = haystacks[row]
+            starts = word_starts[row]
+            total = 0
+            for term in terms:
+                value = score(term, haystack, starts)
+                if value is None:
+                    break
+                total += value
+            else:
+                scored.append((-total, tiebreak[row], row))
+        return scored
+
+    def _match_single_char(self, needle):
+        """One character: rows where it starts a word first, then the rest"""
+        rows = self.chars.get(needle)
+        if not rows:
+            return []
+        at_word_start = self.initials.get(needle, set())
+        key = self.tiebreak.__getitem__
+        return sorted(at_word_start, key=key) + sorted(rows - at_word_start, key=key)
+
+    def _score(self, needle, haystack, starts):
+        """Fuzzy score of needle as a subsequence of haystack, None if no match"""
+        # A contiguous run starting a word is the best possible alignment
+        pos = haystack.find(needle)
+        if pos >= 0 and starts[pos]:
+            return (self.SCORE_MATCH + self.BONUS_WORD_START) * len(needle) + self.BONUS_WORD_START
+
+        find = haystack.find
+
+        # Greedy forward pass proves the match exists...
+        pos = -1
+        for ch in needle:
+            pos = find(ch, pos + 1)
+            if pos < 0:
+                return None
+
+        # ...and a backward pass from its end gives the tightest window
+        rfind = haystack.rfind
+        tight = [pos]
+        for ch in needle[-2::-1]:
+            pos = rfind(ch, 0, pos)
+            tight.append(pos)
+        tight.reverse()
+        best = self._score_positions(tight, starts)
+
+        # Prefer continuing a run, then word starts (acronyms like "cfl")
+        preferred = []
+        pos = -1
+        last = len(needle) - 1
+        for i, ch in enumerate(needle):
+            nxt = find(ch, pos + 1)
+            if nxt != pos + 1 or pos < 0:
+                candidate = nxt
+                while candidate >= 0 and not starts[candidate]:
+                    candidate = find(ch, candidate + 1)
+                if candidate >= 0 and (i == last or self._is_subsequence(needle, i + 1, haystack, candidate + 1)):
+                    nxt = candidate
+            preferred.append(nxt)
+            pos = nxt
+        if preferred != tight:
+            best = max(best, self._score_positions(preferred, starts))
+        return best
+
+    @staticmethod
+    def _is_subsequence(needle, index, haystack, pos):
+        find = haystack.find
+        for ch in needle[index:]:
+            pos = find(ch, pos)
+            if pos < 0:
+                return False
+            pos += 1
+        return True
+
+    def _score_positions(self, positions, starts):
+        """Match score plus bonuses: word starts (doubled on the first character),
+        runs that inherit the bonus of the character that started them, minus gaps"""
+        first = positions[0]
+        run_bonus = self.BONUS_WORD_START if starts[first] else 0
+        score = self.SCORE_MATCH + 2 * run_bonus
+        prev = first
+        for pos in positions[1:]:
+            bonus = self.BONUS_WORD_START if starts[pos] else 0
+            if pos == prev + 1:
+                run_bonus = max(run_bonus, bonus, self.BONUS_CONSECUTIVE)
+            else:
+                score -= self.GAP_START + self.GAP_EXTENSION * (pos - prev - 2)
+                run_bonus = bonus
+            score += self.SCORE_MATCH + run_bonus
+            prev = pos
+        return score
+
+class CommandListModel(QtCore.QAbstractListModel):
+    """Results list model backed by flat arrays (no per-row widget items).
+
+    Entries live in parallel lists (labels, kinds, payloads); `order` holds the
+    entries currently shown, so filtering and ranking only swap that list.
+    """
+
+    KIND_COMMAND = 0
+    KIND_PROCEDURAL = 1
+    KIND_MACRO = 2
+
+    PayloadRole = QtCore.Qt.UserRole
+    KindRole = QtCore.Qt.UserRole + 1
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        
-        # Set required properties for dock widget
-        self.setObjectName("CommanderWidget") 
-        self.setWindowTitle("Commander")
-        
-        # Simple layout
-        layout = QtWidgets.QVBoxLayout()
-        
-        # Search input
-        self.search_input = QtWidgets.QLineEdit()
-        self.search_input.setPlaceholderText("Search commands and procedurals...")
-        layout.addWidget(self.search_input)
-        
-        # Results list 
-        self.results_list = QtWidgets.QListWidget()
-        layout.addWidget(self.results_list)
-        
-        # Macro controls
-        macro_layout = QtWidgets.QHBoxLayout()
-        
-        self.create_macro_button = QtWidgets.QPushButton("Create Macro")
-        self.create_macro_button.clicked.connect(self.start_macro_creation)
-        macro_layout.addWidget(self.create_macro_button)
-        
-        self.cancel_macro_button = QtWidgets.QPushButton("Cancel")
-        self.cancel_macro_button.clicked.connect(self.cancel_macro_creation)
-        self.cancel_macro_button.setVisible(False)
-        macro_layout.addWidget(self.cancel_macro_button)
-        
-        layout.addLayout(macro_layout)
-        
-        # Procedural refresh controls
-        procedural_layout = QtWidgets.QHBoxLayout()
-        
-        self.refresh_procedurals_button = QtWidgets.QPushButton("Refresh Procedurals")
-        self.refresh_procedurals_button.clicked.connect(self.refresh_procedurals)
-        self.refresh_procedurals_button.setToolTip("Reload procedural resources from Substance Painter")
-        procedural_layout.addWidget(self.refresh_procedurals_button)
-        
-        self.settings_button = QtWidgets.QPushButton("Settings")
-        self.settings_button.clicked.connect(self.open_settings)
-        self.settings_button.setToolTip("Configure Commander settings including keyboard shortcuts")
-        procedural_layout.addWidget(self.settings_button)
-        
-        layout.addLayout(procedural_layout)
-        
-        # Status label
-        self.status_label = QtWidgets.QLabel("Ready")
-        layout.addWidget(self.status_label)
-        
-        self.setLayout(layout)
-        
-        # Connect events
-        self.search_input.textChanged.connect(self.on_search_changed)
-        self.results_list.itemDoubleClicked.connect(self.on_item_double_clicked)
-        self.results_list.itemClicked.connect(self.on_single_click)
-        
-        # Install event filter on search input to capture arrow keys
-        self.search_input.installEventFilter(self)
-        
-        # Context menu
-        self.results_list.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
-        self.results_list.customContextMenuRequested.connect(self.show_context_menu)
-        
-        # Initialize macro system BEFORE refreshing commands (since refresh_commands uses self.macros)
-        self.macro_creation_mode = False
-        self.selected_commands = []
-        self.macros = {}
-        self.macros_file = self._get_macros_file_path()
-        self.load_macros()
-        
-        # Initialize settings system
-        self.settings = self.load_settings()
-        self.settings_file = self._get_settings_file_path()  # Store for easy access
-        
-        # Initialize procedural loading state
-        self.procedurals_loaded = False
-        self.procedurals_cache = []
-        
-        # Project monitoring
-        self.last_project_state = None
-        
-        # Initialize with commands (now that macros are loaded)
-        self.refresh_commands()
-        
-        # Start project monitoring for automatic procedural loading
-        self.start_project_monitoring()
+        self.labels = []
+        self.kinds = []
+        self.payloads = []
+        self.order = []
+        self.marked = set()  # entries picked during macro creation
+
+        # Shared brushes - one per kind instead of one per row
+        self._kind_brushes = {
+            self.KIND_PROCEDURAL: QtGui.QBrush(QtGui.QColor(100, 149, 237)),  # Cornflower blue
+            self.KIND_MACRO: QtGui.QBrush(QtGui.QColor(255, 215, 0)),  # Golden yellow
+        }
+        self._marked_brush = QtGui.QBrush(QtGui.QColor(255, 215, 0))
+
+    # ---- Qt model interface ----
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.order[index.row()]
+
+        if role == QtCore.Qt.DisplayRole:
+            return self.labels[entry]
+        if role == QtCore.Qt.ForegroundRole:
+            if entry in self.marked:
+                return self._marked_brush
+            return self._kind_brushes.get(self.kinds[entry])
+        if role == QtCore.Qt.ToolTipRole:
+            if self.kinds[entry] == self.KIND_PROCEDURAL:
+                return f"Procedural: {self.payloads[entry].category}\nApplies to Roughness channel"
+            return None
+        if role == self.PayloadRole:
+            return self.payloads[entry]
+        if role == self.KindRole:
+            return self.kinds[entry]
+        return None
+
+    # ---- Entry management ----
+
+    def set_entries(self, labels, kinds, payloads):
+        """Replace all entries with a single model reset"""
+        self.beginResetModel()
+        self.labels = labels
+        self.kinds = kinds
+        self.payloads = payloads
+        self.order = list(range(len(labels)))
+        self.marked = set()
+        self.endResetModel()
+
+    def add_entry(self, label, kind, payload):
+        """Append an entry (not shown until it appears in an order); returns its id"""
+        self.labels.append(label)
+        self.kinds.append(kind)
+        self.payloads.append(payload)
+        return len(self.labels) - 1
+
+    def add_entries(self, labels, kind, payloads):
+        """Append a batch of entries of one kind; returns the first new id"""
+        first = len(self.labels)
+        self.labels.extend(labels)
+        self.kinds.extend([kind] * len(labels))
+        self.payloads.extend(payloads)
+        return first
+
+    def remove_entry(self, entry):
+        """Retire an entry id (it must already be out of the shown order)"""
+        self.labels[entry] = None
+        self.kinds[entry] = None
+        self.payloads[entry] = None
+        self.marked.discard(entry)
+
+    def set_label(self, entry, label):
+        """Relabel an entry in place"""
+        self.labels[entry] = label
+        self._emit_entry_changed(entry, [QtCore.Qt.DisplayRole])
+
+    def set_order(self, order):
+        """Show only the given entries, in the given order.
+
+        Entries appended after the current rows, or a single inserted or
+        removed entry, are signalled as row changes so the view keeps its
+        scroll position and current row; anything else resets.
+        """
+        old = self.order
+        if order == old:
+            return
+
+        if len(order) > len(old) and order[:len(old)] == old:
+            self.beginInsertRows(QtCore.QModelIndex(), len(old), len(order) - 1)
+            self.order = order
+            self.endInsertRows()
+            return
+
+        delta = len(order) - len(old)
+        if delta in (1, -1):
+            longer, shorter = (order, old) if delta == 1 else (old, order)
+            row = len(shorter)
+            for position, (a, b) in enumerate(zip(shorter, longer)):
+                if a != b:
+                    row = position
+                    break
+            if longer[row + 1:] == shorter[row:]:
+                if delta == 1:
+                    self.beginInsertRows(QtCore.QModelIndex(), row, row)
+                    self.order = order
+                    self.endInsertRows()
+                else:
+                    self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+                    self.order = order
+                    self.endRemoveRows()
+                return
+
+        self.beginResetModel()
+        self.order = order
+        self.endResetModel()
+
+    def entry_at(self, row):
+        """Entry index behind a view row"""
+        return self.order[row]
+
+    def set_marked(self, entry, marked):
+        """Highlight (or un-highlight) an entry picked for a macro"""
+        if marked:
+            self.marked.add(entry)
+        else:
+            self.marked.discard(entry)
+        self._emit_entry_changed(entry)
+
+    def clear_marks(self):
+        """Remove all macro-creation highlights"""
+        marked, self.marked = self.marked, set()
+        for entry in marked:
+            self._emit_entry_changed(entry)
+
+    def _emit_entry_changed(self, entry, roles=(QtCore.Qt.ForegroundRole,)):
+        try:
+            row = self.order.index(entry)
+        except ValueError:
+            return
+        index = self.index(row)
+        self.dataChanged.emit(index, index, list(roles))
+
+class ProceduralLoader(QtCore.QObject):
+    """Builds the procedural catalog in timer-driven chunks so the GUI stays responsive.
+
+    The host returns the candidate resources in one call; reading each one's
+    name, category and identifier is the slow part, so that work is sliced
+    into CHUNK_SIZE batches run from a zero-interval timer between UI events.
+    """
+
+    CHUNK_SIZE = 100
+
+    batch_loaded = QtCore.Signal(list)  # new ProceduralEntry records
+    progress = QtCore.Signal(int, int)  # resources processed, total
+    finished = QtCore.Signal(list)  # all ProceduralEntry records
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.entries = []
+        self._candidates = []
+        self._position = 0
+        self._total = 0
+        self._filtered = False
+        self._query = ""
+        self._skipped = 0
+        self._shelves = None
+        self._shelf_names = set()
+        self.embedded_count = 0  # procedurals found in the open project rather than on a shelf
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._process_chunk)
+
+    def is_running(self):
+        return self._timer.isActive()
+
+    def start(self):
+        """Query the host for candidate resources and start processing them in chunks"""
+        self._timer.stop()
+        self.entries = []
+        self._position = 0
+        self._skipped = 0
+        self.embedded_count = 0
+        try:
+            self._shelves = list_shelves()
+        except Exception:
+            self._shelves = None
+        self._shelf_names = {name for name, path in self._shelves or ()}
+        try:
+            self._candidates, self._filtered, self._query = self._search_candidates()
+        except Exception as e:
+            substance_painter.logging.error(f"Error searching for procedural resources: {e}")
+            import traceback
+            substance_painter.logging.error(f"Traceback: {traceback.format_exc()}")
+            self._candidates, self._filtered, self._query = [], False, "failed"
+        self._total = len(self._candidates)
+        self._timer.start()
+
+    def run_to_completion(self):
+        """Process all remaining chunks now (for callers that need the full catalog)"""
+        while self._timer.isActive():
+            self._process_chunk()
+        return self.entries
+
+    def cancel(self):
+        """Stop loading; records already delivered are kept"""
+        self._timer.stop()
+        self._candidates = []
+    
+    def fingerprint(self):
+        """Shelf fingerprint of the finished scan (see compute_shelf_fingerprint), from its own search"""
+        if self._shelves is None:
+            return None
+        count = self._total if self._filtered else 0  # a full scan means the usage search found nothing
+        return (self._shelves, count - self.embedded_count)
+
+    @staticmethod
+    def _search_candidates():
+        """Return (resources, already usage-filtered, query description)"""
+        # Let the host filter by usage (same syntax as the shelf search bar)
+        try:
+            candidates = substance_painter.resource.search("u:procedural")
+        except Exception:
+            candidates = []
+        if candidates:
+            return candidates, True, "u:procedural"
+        # Filter not supported or nothing matched - fall back to a full scan
+        return substance_painter.resource.search(""), False, "full scan"
+
+    def _process_chunk(self):
+        from substance_painter.resource import Usage
+        total = len(self._candidates)
+        end = min(self._position + self.CHUNK_SIZE, total)
+
+        batch = []
+        for resource in self._candidates[self._position:end]:
+            try:
+                # The usage filter already did this check; only the full scan needs it
+                if not self._filtered and Usage.PROCEDURAL not in resource.usages():
+                    continue
+                category = resource.category() if hasattr(resource, 'category') else 'Unknown'
+                identifier = resource.identifier()
+                # Resources whose context isn't a shelf come from the open project
+                context = getattr(identifier, 'context', None)
+                embedded = bool(self._shelf_names) and context is not None and context not in self._shelf_names
+                self.embedded_count += embedded
+                batch.append(ProceduralEntry(resource.gui_name(), category, identifier.url(), embedded))
+            except Exception:
+                # Skip resources that cause errors - counted in the summary line
+                self._skipped += 1
+        self._position = end
+        self.entries.extend(batch)
+
+        if batch:
+            self.batch_loaded.emit(batch)
+        self.progress.emit(end, total)
+
+        if end >= total:
+            self._timer.stop()
+            self._candidates = []
+            substance_painter.logging.info(
+                f"Commander: Found {len(self.entries)} procedurals ({self._query}, {total} resources checked, {self._skipped} skipped)")
+            self.finished.emit(self.entries)
+
+class PersistenceWriter(QtCore.QObject):
+    """Saves settings/macros files after a quiet period, doing the file I/O on a background thread.
+    
+    mark_dirty() registers a function that serializes a file's current state; all
+    edits within delay_ms share one write. Serializing runs on the GUI thread, so
+    each write is a consistent snapshot; one writer thread writes them in order.
+    """
+    
+    written = QtCore.Signal(str, str)  # label, path
+    failed = QtCore.Signal(str, str)  # label, error
+    
+    def __init__(self, delay_ms=PERSIST_DELAY_MS, parent=None):
+        super().__init__(parent)
+        self._pending = {}  # path -> (serialize, label)
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self.flush)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write_loop, name="CommanderPersistence", daemon=True)
+        self._thread.start()
+        
+        # Emitted from the writer thread, delivered (and logged) on the GUI thread
+        self.written.connect(lambda label, path: substance_painter.logging.info(f"Commander: Saved {label}"))
+        self.failed.connect(lambda label, error: substance_painter.logging.error(f"Failed to save {label}: {error}"))
+    
+    def mark_dirty(self, path, serialize, label):
+        """Schedule a write of path; serialize() returns the file's text when the write happens"""
+        self._pending[path] = (serialize, label)
+        self._timer.start()
+    
+    def flush(self, wait=False):
+        """Hand every pending file to the writer thread (optionally blocking until all are written)"""
+        self._timer.stop()
+        pending, self._pending = self._pending, {}
+        for path, (serialize, label) in pending.items():
+            try:
+                self._queue.put((path, serialize(), label))
+            except Exception as e:
+                substance_painter.logging.error(f"Failed to save {label}: {str(e)}")
+        if wait:
+            self._queue.join()
+    
+    def close(self):
+        """Write everything still pending and stop the writer thread"""
+        self.flush(wait=True)
+        self._queue.put(None)
+        self._thread.join()
+    
+    def _write_loop(self):
+        """Writer thread: write queued snapshots until close() sends None"""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                path, text, label = item
+                try:
+                    write_file_atomically(path, text)
+                    self.written.emit(label, path)
+                except Exception as e:
+                    self.failed.emit(label, str(e))
+            finally:
+                self._queue.task_done()
+
+class HotkeyRouter(QtCore.QObject):
+    """Dispatches macro hotkeys from one application event filter and a chord -> name table.
+    
+    Replaces a QShortcut per macro: lookups and conflict checks are dict hits, and
+    multi-stroke hotkeys work by remembering the strokes typed so far. Keys a focused
+    text field uses itself (typing, editing shortcuts), keys in modal dialogs and
+    keys outside the host window are left alone.
+    """
+    
+    activated = QtCore.Signal(str)  # name bound to the completed chord
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.bindings = {}  # chord -> name
+        self.chords = {}  # name -> chord
+        self.prefixes = {}  # chord prefix -> {name: None} of the bound chords starting with it
+        self.pending = ()  # strokes typed so far of a multi-stroke chord
+        self.chord_timer = QtCore.QTimer(self)
+        self.chord_timer.setSingleShot(True)
+        self.chord_timer.setInterval(HOTKEY_CHORD_TIMEOUT_MS)
+        self.chord_timer.timeout.connect(self.reset_pending)
+        self.installed = False
+        self.text_edit_strokes = {sequence[0].toCombined() for key in _TEXT_EDIT_KEYS
+                                  for sequence in QtGui.QKeySequence.keyBindings(key) if sequence.count() == 1}
+    
+    def install(self):
+        """Start filtering the application's key events"""
+        if not self.installed:
+            QtWidgets.QApplication.instance().installEventFilter(self)
+            self.installed = True
+    
+    def uninstall(self):
+        """Stop filtering key events and drop all bindings"""
+        if self.installed:
+            QtWidgets.QApplication.instance().removeEventFilter(self)
+            self.installed = False
+        self.bindings.clear()
+        self.chords.clear()
+        self.prefixes.clear()
+        self.reset_pending()
+    
+    def bind(self, hotkey, name):
+        """Route hotkey to name (replacing name's previous hotkey); raises ValueError if it doesn't parse"""
+        chord = hotkey_chord(hotkey)
+        if not chord:
+            raise ValueError(f"Invalid hotkey: {hotkey}")
+        self.unbind(name)
+        previous = self.bindings.get(chord)
+        if previous is not None:
+            # Same chord spelled differently in an older file: the later macro keeps it
+            substance_painter.logging.warning(f"Commander: Hotkey '{hotkey}' of macro '{name}' replaces that of '{previous}'")
+            self.unbind(previous)
+        self.bindings[chord] = name
+        self.chords[name] = chord
+        for length in range(1, len(chord)):
+            self.prefixes.setdefault(chord[:length], {})[name] = None
+    
+    def unbind(self, name):
+        """Remove name's hotkey, if it has one"""
+        chord = self.chords.pop(name, None)
+        if chord is None:
+            return
+        del self.bindings[chord]
+        for length in range(1, len(chord)):
+            prefix = chord[:length]
+            del self.prefixes[prefix][name]
+            if not self.prefixes[prefix]:
+                del self.prefixes[prefix]
+    
+    def conflict(self, hotkey):
+        """Name whose hotkey is the same as, a first part of, or starts with hotkey; None if free"""
+        chord = hotkey_chord(hotkey)
+        if chord in self.bindings:
+            return self.bindings[chord]
+        for length in range(1, len(chord)):
+            if chord[:length] in self.bindings:
+                return self.bindings[chord[:length]]
+        if chord in self.prefixes:
+            return next(iter(self.prefixes[chord]))
+        return None
+    
+    def reset_pending(self):
+        """Forget a partly typed multi-stroke chord"""
+        self.pending = ()
+        self.chord_timer.stop()
     
     def eventFilter(self, obj, event):
-        """Event filter to intercept key events from search input"""
-        if obj == self.search_input and event.type() == QtCore.QEvent.Type.KeyPress:
-            key = event.key()
-            
-            if key == QtCore.Qt.Key_Down:
-                # Down arrow pressed in search field - jump to results
-                self._jump_to_results()
-                return True  # Event handled
-            elif key == QtCore.Qt.Key_Up:
-                # Up arrow in search field - also jump to results (last item)
-                self._jump_to_results(select_last=True)
-                return True  # Event handled
-            elif key == QtCore.Qt.Key_Return or key == QtCore.Qt.Key_Enter:
-                # Enter in search field - execute first visible item
-                if self.results_list.count() > 0:
-                    for i in range(self.results_list.count()):
-                        item = self.results_list.item(i)
-                        if not item.isHidden():
-                            self.on_item_double_clicked(item)
-                            break
-                return True  # Event handled
-                
-        # Pass the event to the parent class
-        return super().eventFilter(obj, event)
+        """Claim (ShortcutOverride) and dispatch (KeyPress) strokes of bound chords"""
+        event_type = event.type()
+        if event_type not in (QtCore.QEvent.Type.KeyPress, QtCore.QEvent.Type.ShortcutOverride):
+            return False
+        if not self.bindings or event.key() in _MODIFIER_KEYS or not self._accepts_hotkeys():
+            return False
         
-    def keyPressEvent(self, event):
-        """Enhanced key press handler for results list navigation"""
-        key = event.key()
+        stroke = key_event_stroke(event)
+        if not self.pending and self._focus_claims(event, stroke):
+            return False
+        chord = self.pending + (stroke,)
+        bound = chord in self.bindings or chord in self.prefixes
+        
+        if event_type == QtCore.QEvent.Type.ShortcutOverride:
+            # Accepting it stops host shortcuts on the same keys; the KeyPress then comes to us
+            if bound:
+                event.accept()
+                return True
+            return False
         
-        if key == QtCore.Qt.Key_Escape:
-            # Hide dock on ESC
-            global DOCK_WIDGET
-            if DOCK_WIDGET:
-                DOCK_WIDGET.hide()
-                
-        elif key == QtCore.Qt.Key_Down and self.results_list.hasFocus():
-            # Arrow down in results - navigate to next item
-            self._navigate_results(1)
-            
-        elif key == QtCore.Qt.Key_Up and self.results_list.hasFocus():
-            # Arrow up in results - navigate to previous item
-            self._navigate_results(-1)
-            
-        elif key == QtCore.Qt.Key_Return or key == QtCore.Qt.Key_Enter:
-            # Enter key - execute selected command
-            if self.results_list.hasFocus():
-                current_item = self.results_list.currentItem()
-                if current_item:
-                    self.on_item_double_clicked(current_item)
-            
-        else:
-            # For any other key, make sure search input gets focus for typing
-            if not self.search_input.hasFocus() and event.text().isprintable():
-                self.search_input.setFocus()
-                # Re-send the key event to the search input
-                QtWidgets.QApplication.sendEvent(self.search_input, event)
-                return
-            super().keyPressEvent(event)
+        if chord in self.bindings:
+            self.reset_pending()
+            self.activated.emit(self.bindings[chord])
+            return True
+        if chord in self.prefixes:
+            self.pending = chord
+            self.chord_timer.start()
+            return True
+        if self.pending:
+            # Wrong next stroke: swallow it and start over, like Qt's own chord handling
+            self.reset_pending()
+            return True
+        return False
     
-    def _navigate_results(self, direction):
-        """Navigate through visible items only (direction: 1 for down, -1 for up)"""
-        if self.results_list.count() == 0:
-            return
-            
-        # Get list of visible rows
-        visible_rows = []
-        for i in range(self.results_list.count()):
-            if not self.results_list.item(i).isHidden():
-                visible_rows.append(i)
+    def _focus_claims(self, event, stroke):
+        """True if the focused widget takes this stroke itself: a text field's typing and editing keys"""
+        focus = QtWidgets.QApplication.focusWidget()
+        if isinstance(focus, QtWidgets.QKeySequenceEdit):
+            return True  # records whatever is pressed
+        if not isinstance(focus, (QtWidgets.QLineEdit, QtWidgets.QTextEdit, QtWidgets.QPlainTextEdit,
+                                  QtWidgets.QAbstractSpinBox)):
+            return False
+        modifiers = event.modifiers() & ~(QtCore.Qt.KeyboardModifier.ShiftModifier | QtCore.Qt.KeyboardModifier.KeypadModifier)
+        if modifiers == QtCore.Qt.KeyboardModifier.NoModifier:
+            # Plain keys type, move or submit; function keys are free for hotkeys
+            return not QtCore.Qt.Key.Key_F1.value <= event.key() <= QtCore.Qt.Key.Key_F35.value
+        return stroke in self.text_edit_strokes
+    
+    def _accepts_hotkeys(self):
+        """False in a modal dialog, or when another app/window is active"""
+        if QtWidgets.QApplication.activeModalWidget() is not None:
+            return False
+        window = QtWidgets.QApplication.activeWindow()
+        main_window = substance_painter.ui.get_main_window()
+        # Floating docks are separate windows parented to the main window
+        while window is not None and window is not main_window:
+            window = window.parentWidget()
+        return window is not None
+
+class LayerCommands:
+    """Layer stack commands and macro step execution, without any UI.
+    
+    CommanderWidget puts the palette on top of this; MacroRunner uses it headless.
+    Commands talk to the user only through report() and the ask_*() hooks.
+    """
+    
+    def __init__(self):
+        # Stack/selection cache while a command or macro runs (see execution_context)
+        self._context = None
         
-        if not visible_rows:
-            return
-            
-        # Find current position in visible items
-        current_row = self.results_list.currentRow()
-        try:
-            current_visible_index = visible_rows.index(current_row)
-        except ValueError:
-            # Current row not visible, start from first/last
-            current_visible_index = 0 if direction > 0 else len(visible_rows) - 1
-        else:
-            # Move to next/previous visible item
-            current_visible_index += direction
-            
-        # Wrap around if needed
-        if current_visible_index >= len(visible_rows):
-            current_visible_index = 0
-        elif current_visible_index < 0:
-            current_visible_index = len(visible_rows) - 1
-            
-        # Select the new row
-        new_row = visible_rows[current_visible_index]
-        self.results_list.setCurrentRow(new_row)
+        # Command id -> bound handler, resolved once from the registry
+        self.command_handlers = {descriptor.id: getattr(self, descriptor.handler) for descriptor in COMMAND_REGISTRY}
         
-        # Scroll to make sure it's visible
-        self.results_list.scrollToItem(self.results_list.item(new_row))
+        # Name -> ProceduralEntry, built on first use by name-only procedural steps
+        self._procedurals_by_name = None
         
-        # Focus stays on results list for continued navigation
+        # Arguments bound by the running macro step (see ask_*)
+        self._command_args = {}
     
-    def _jump_to_results(self, select_last=False):
-        """Jump from search field to results list and select first/last visible item"""
-        if self.results_list.count() == 0:
+    # ---- User interaction hooks ----
+    
+    def report(self, message):
+        """Show a command's result message"""
+        substance_painter.logging.info(f"Commander: {message}")
+    
+    def ask_double(self, key, title, label, value, minimum, maximum, decimals):
+        """A number from the step's arguments, else prompted for; returns (value, ok)"""
+        if key in self._command_args:
+            return self._command_args[key], True
+        return self.prompt_double(title, label, value, minimum, maximum, decimals)
+    
+    def ask_item(self, key, title, label, items, current):
+        """One of items from the step's arguments, else prompted for; returns (item, ok)"""
+        if key in self._command_args:
+            return self._command_args[key], True
+        return self.prompt_item(title, label, items, current)
+    
+    def ask_text(self, key, title, label, text=""):
+        """A line of text from the step's arguments, else prompted for; returns (text, ok)"""
+        if key in self._command_args:
+            return self._command_args[key], True
+        return self.prompt_text(title, label, text)
+    
+    def ask_params(self, title, params, bound=None):
+        """Values for params not already in bound, asked for once; returns the merged args, or None if cancelled"""
+        args = dict(bound or {})
+        for param in params:
+            if param.key in args:
+                continue
+            if param.kind == PARAM_FLOAT:
+                value, ok = self.prompt_double(title, f"{param.label}:", param.default, param.minimum, param.maximum, 2)
+            elif param.kind == PARAM_CHOICE:
+                value, ok = self.prompt_item(title, f"{param.label}:", list(param.choices), param.choices.index(param.default))
+            else:
+                value, ok = self.prompt_text(title, f"{param.label}:", param.default)
+            if not ok:
+                return None
+            args[param.key] = value
+        return args
+    
+    def prompt_double(self, title, label, value, minimum, maximum, decimals):
+        """Ask the user for a number; returns (value, ok)"""
+        raise ValueError(f"{title} needs interactive input")
+    
+    def prompt_item(self, title, label, items, current):
+        """Ask the user to pick one of items; returns (item, ok)"""
+        raise ValueError(f"{title} needs interactive input")
+    
+    def prompt_text(self, title, label, text=""):
+        """Ask the user for a line of text; returns (text, ok)"""
+        raise ValueError(f"{title} needs interactive input")
+    
+    # ---- Command execution ----
+    
+    def run_command(self, command_id, args=None):
+        """Dispatch a registered command by id after checking its context requirements.
+        
+        args holds values for the command's params, answered instead of prompting.
+        """
+        descriptor = COMMANDS_BY_ID[command_id]
+        with PROFILER.span("command", command_id), self.execution_context():
+            self._check_command_requirements(descriptor)
+            previous_args, self._command_args = self._command_args, args or {}
+            try:
+                self.command_handlers[command_id]()
+            finally:
+                self._command_args = previous_args
+    
+    @property
+    def context(self):
+        """ExecutionContext of the running command or macro (a fresh one outside execution)"""
+        return self._context if self._context is not None else ExecutionContext()
+    
+    @contextlib.contextmanager
+    def execution_context(self, stack=None):
+        """Share one ExecutionContext with everything run inside the block (nested blocks reuse it)"""
+        if self._context is not None and stack is None:
+            yield self._context
             return
-            
-        # Find visible items
-        visible_items = []
-        for i in range(self.results_list.count()):
-            item = self.results_list.item(i)
-            if not item.isHidden():
-                visible_items.append((i, item))
-        
-        if not visible_items:
+        previous = self._context
+        self._context = ExecutionContext(stack)
+        try:
+            yield self._context
+        finally:
+            self._context = previous
+    
+    def _check_command_requirements(self, descriptor):
+        """Raise ValueError when the project/selection doesn't satisfy a command"""
+        requires = descriptor.requires
+        if not requires:
             return
-            
-        # Select first or last visible item
-        if select_last:
-            index, item = visible_items[-1]  # Last visible item
-        else:
-            index, item = visible_items[0]   # First visible item
-            
-        self.results_list.setCurrentItem(item)
-        self.results_list.scrollToItem(item)
-        self.results_list.setFocus()
+        if not substance_painter.project.is_open():
+            raise ValueError("No project open")
+        if REQUIRES_SELECTION in requires or REQUIRES_MASK in requires:
+            selected = self.context.selection
+            if not selected:
+                raise ValueError("No layer selected")
+            if REQUIRES_MASK in requires:
+                layer = selected[0]
+                if not (hasattr(layer, 'has_mask') and layer.has_mask()):
+                    raise ValueError("Layer has no mask")
     
+    def _modification_scope(self, label):
+        """Group layer stack edits into one undo entry and one recompute, where the host supports it"""
+        if not host_groups_modifications():
+            return contextlib.nullcontext()
+        return substance_painter.layerstack.ScopedModification(f"Commander {label}")
     
-    # ---- Core Commander functionality ----
+    def compile_macro_steps(self, commands):
+        """Resolve macro steps to (label, callable) pairs once, so running them skips lookups"""
+        return [(macro_step_label(step), self._compile_macro_step(step)) for step in commands]
     
-    def refresh_commands(self, force_reload_procedurals=False):
-        """Populate the list with ALL available layer commands from API"""
-        self.results_list.clear()
-        
-        commands = [
-            # === Layer Creation (Real API: insert_*) ===
-            "Create Paint Layer",           # → insert_paint()
-            "Create Fill Layer",            # → insert_fill()
-            "Create Group Layer",           # → insert_group()
-            "Create Layer Instance",        # → instantiate()
-            
-            # === Effect Creation (Real API: insert_*_effect) ===
-            "Insert Levels Effect",         # → insert_levels_effect()
-            "Insert Filter Effect",         # → insert_filter_effect()
-            "Insert Fill Effect",           # → insert_fill() (creates FillEffectNode when in effect stack)
-            "Insert Paint Effect",          # → insert_paint() (creates PaintEffectNode when in effect stack)
-            "Insert Generator Effect",      # → insert_generator_effect()
-            "Insert Compare Mask Effect",   # → insert_compare_mask_effect()
-            "Insert Color Selection Effect", # → insert_color_selection_effect()
-            "Insert Anchor Point Effect",   # → insert_anchor_point_effect()
-            
-            # === Layer Management (Real API) ===
-            "Delete Selected Layers",      # → delete_node()
-            "Rename Selected Layer",       # → node.set_name()
-            
-            # === Layer Properties (Real API: Node methods) ===
-            "Toggle Layer Visibility",     # → node.set_visible()
-            "Show Layer",                  # → node.set_visible(True)
-            "Hide Layer",                  # → node.set_visible(False)
-            "Set Layer Opacity",          # → node.set_opacity()
-            "Get Layer Opacity",          # → node.get_opacity()
-            "Set Blend Mode",              # → node.set_blending_mode()
-            "Get Blend Mode",              # → node.get_blending_mode()
-            
-            # === Channel Management (Real API: ActiveChannelsMixin) ===
-            "Enable BaseColor Channel",    # → layer.active_channels = {BaseColor}
-            "Enable All Channels",         # → layer.active_channels = all available
-            "Disable All Channels",        # → layer.active_channels = set()
-            "Toggle Channels",             # → interactive channel selection
-            
-            # === Layer Masks (Real API: LayerNode methods) ===
-            "Add Layer Mask",             # → layer.add_mask()
-            "Remove Layer Mask",          # → layer.remove_mask()
-            "Enable Layer Mask",          # → layer.enable_mask(True)
-            "Disable Layer Mask",         # → layer.enable_mask(False)
-            "Set Mask Background White",  # → layer.set_mask_background(MaskBackground.White)
-            "Set Mask Background Black",  # → layer.set_mask_background(MaskBackground.Black)
-            
-            # === Smart Materials/Masks (Real API) ===
-            "Insert Smart Material",      # → insert_smart_material()
-            "Create Smart Material",      # → create_smart_material()
-            "Insert Smart Mask",          # → insert_smart_mask()
-            "Create Smart Mask",          # → create_smart_mask()
-            
-            # === Geometry Masks (Real API: LayerNode methods) ===
-            "Set Geometry Mask Mesh",     # → layer.set_geometry_mask_type(GeometryMaskType.Mesh)
-            "Set Geometry Mask UV Tile",  # → layer.set_geometry_mask_type(GeometryMaskType.UVTile)
-            "Enable Geometry Mask",       # → layer.set_geometry_mask_enabled_meshes()
-            
-            # === Projection Modes (Real API: FillParamsEditorMixin) ===
-            "Set Projection UV",          # → layer.set_projection_mode(ProjectionMode.UV)
-            "Set Projection Triplanar",   # → layer.set_projection_mode(ProjectionMode.Triplanar)
-            "Set Projection Planar",      # → layer.set_projection_mode(ProjectionMode.Planar)
-            "Set Projection Spherical",   # → layer.set_projection_mode(ProjectionMode.Spherical)
-            "Set Projection Cylindrical", # → layer.set_projection_mode(ProjectionMode.Cylindrical)
-            "Enable Symmetry",            # → layer.set_symmetry_enabled(True)
-            "Disable Symmetry"            # → layer.set_symmetry_enabled(False)
-        ]
+    def _compile_macro_step(self, step):
+        """Bind one macro step to a callable that raises on failure"""
+        command = macro_step_label(step)
+        if command.startswith("[PROC]"):
+            proc_name = command[7:].strip()  # Remove "[PROC] " prefix
+            resource_id = step.get('resource_id') if isinstance(step, dict) else None
+            return lambda: self.execute_procedural_step(proc_name, resource_id)
+        
+        descriptor = COMMANDS_BY_LABEL.get(command)
+        if descriptor is None:
+            def unknown_step():
+                raise ValueError(f"Unknown command: {command}")
+            return unknown_step
         
-        for cmd in commands:
-            self.results_list.addItem(cmd)
+        command_id = descriptor.id
+        args = step.get('args') if isinstance(step, dict) else None
+        if not args:
+            return lambda: self.run_command(command_id)
         
-        # Add procedural resources with lazy loading
-        procedural_count = 0
+        # Check stored values once, here, rather than on every run
+        params = {param.key: param for param in descriptor.params}
         try:
-            if force_reload_procedurals or not self.procedurals_loaded:
-                substance_painter.logging.info("Commander: Loading procedural resources...")
-                procedurals = self.get_procedural_resources()
-                substance_painter.logging.info(f"Commander: Found {len(procedurals)} procedural resources")
-                
-                if len(procedurals) > 0:
-                    self.procedurals_cache = procedurals
-                    self.procedurals_loaded = True
-                    substance_painter.logging.info("Commander: Successfully cached procedural resources")
-                else:
-                    substance_painter.logging.warning("Commander: No procedural resources found - resource system may not be ready yet")
-            else:
-                procedurals = self.procedurals_cache
-                substance_painter.logging.info(f"Commander: Using cached procedural resources ({len(procedurals)} items)")
-            
-            for procedural in procedurals:
-                item = QtWidgets.QListWidgetItem(f"[PROC] {procedural['name']}")
-                item.setForeground(QtGui.QBrush(QtGui.QColor(100, 149, 237)))  # Cornflower blue
-                item.setToolTip(f"Procedural: {procedural.get('category', 'Unknown')}\nApplies to Roughness channel")
-                # Store the resource identifier for later use
-                item.setData(QtCore.Qt.UserRole, procedural)
-                self.results_list.addItem(item)
-                procedural_count += 1
-                
-        except Exception as e:
-            substance_painter.logging.error(f"Commander: Error loading procedural resources: {e}")
-            import traceback
-            substance_painter.logging.error(f"Commander: Traceback: {traceback.format_exc()}")
-        
-        # Add macros to the list FIRST (at the top) in yellow
-        macro_count = 0
-        for macro_name, macro_data in self.macros.items():
-            # Display macro with hotkey if it has one
-            hotkey_suffix = f" ({macro_data['hotkey']})" if 'hotkey' in macro_data else ""
-            display_text = f"[MACRO] {macro_name}{hotkey_suffix}"
-            
-            item = QtWidgets.QListWidgetItem(display_text)
-            item.setForeground(QtGui.QBrush(QtGui.QColor(255, 215, 0)))  # Golden yellow
-            self.results_list.insertItem(macro_count, item)  # Insert at top
-            macro_count += 1
-        
-        total_items = len(commands) + procedural_count + macro_count
-        status_text = f"Found {total_items} items ({len(commands)} commands, {procedural_count} procedurals, {macro_count} macros)"
-        if not self.procedurals_loaded and procedural_count == 0:
-            status_text += " - Try 'Refresh Procedurals' if missing"
-        self.status_label.setText(status_text)
+            args = {key: params[key].coerce(value) for key, value in args.items() if key in params}
+        except ValueError as e:
+            error = f"{command}: {e}"
+            def invalid_step():
+                raise ValueError(error)
+            return invalid_step
+        return lambda: self.run_command(command_id, args)
     
-    def on_search_changed(self, text):
-        """Filter commands based on search and auto-select first visible item"""
-        # Check if user is searching for procedurals but they haven't been loaded yet
-        if text.lower() in ['proc', 'procedural', 'noise', 'grunge', 'pattern'] and not self.procedurals_loaded:
-            substance_painter.logging.info("Commander: User searching for procedurals - triggering lazy load")
-            self.refresh_commands(force_reload_procedurals=True)
+    def run_macro_steps(self, name, steps, succeeded=None):
+        """Run compiled macro steps in the current execution context; returns (success count, failed commands).
         
-        first_visible_item = None
+        The labels of the steps that succeeded are appended to succeeded, if given.
+        """
+        substance_painter.logging.info(f"Executing macro '{name}' with {len(steps)} commands")
         
-        for i in range(self.results_list.count()):
-            item = self.results_list.item(i)
-            is_match = text.lower() in item.text().lower()
-            item.setHidden(not is_match)
-            
-            # Track first visible item for auto-selection
-            if is_match and first_visible_item is None:
-                first_visible_item = item
+        success_count = 0
+        failed_commands = []
+        start = time.perf_counter()
         
-        # Auto-select first visible item for easy arrow navigation
-        if first_visible_item:
-            self.results_list.setCurrentItem(first_visible_item)
-        else:
-            self.results_list.setCurrentItem(None)
+        # Steps share one stack/selection context instead of each asking the host again
+        with PROFILER.span("macro", name), PROFILER.macro_profile(name), self.execution_context():
+            for i, (command, step) in enumerate(steps):
+                try:
+                    substance_painter.logging.info(f"  [{i+1}/{len(steps)}] {command}")
+                    with PROFILER.span("step", command, index=i + 1):
+                        step()
+                    success_count += 1
+                    if succeeded is not None:
+                        succeeded.append(command)
+                except Exception as e:
+                    failed_commands.append(command)
+                    substance_painter.logging.error(f"    Error: {e}")
+                    # A step that failed part-way may have changed the selection
+                    self.context.invalidate_selection()
+        
+        substance_painter.logging.info(f"Macro '{name}' finished in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return success_count, failed_commands
     
-    def on_item_double_clicked(self, item):
-        """Execute the selected command using official API functions"""
-        global DOCK_WIDGET
-        command = item.text()
+    def execute_procedural_step(self, proc_name, resource_id=None):
+        """Apply a procedural as a macro step"""
+        proc = self.find_procedural(proc_name, resource_id)
+        if proc is None:
+            raise ValueError(f"Procedural not found: {proc_name}")
+        self.apply_procedural(proc)
+    
+    def find_procedural(self, name, resource_id=None):
+        """Resolve a procedural step; a stored resource id needs no library scan"""
+        if resource_id:
+            return ProceduralEntry(name, "Unknown", resource_id)
+        if self._procedurals_by_name is None:
+            # Older steps only store the name: scan the library once per runner
+            loader = ProceduralLoader()
+            loader.start()
+            self._procedurals_by_name = {}
+            for proc in loader.run_to_completion():
+                self._procedurals_by_name.setdefault(proc.name, proc)
+        return self._procedurals_by_name.get(name)
+    
+    def run_on_texture_sets(self, label, action, name_filter=None):
+        """Run action() on every texture set stack (optionally only sets matching a name pattern or in a list of names).
+        
+        Each stack gets its own execution context; the whole pass is one undo entry.
+        Returns [(texture set name, error message or None)].
+        """
+        results = []
+        with self._modification_scope(label):
+            for texture_set in substance_painter.textureset.all_texture_sets():
+                set_name = texture_set.name()
+                if name_filter and not self._texture_set_matches(set_name, name_filter):
+                    continue
+                for stack in texture_set.all_stacks():
+                    # Layered materials have several named stacks per set
+                    target = f"{set_name}/{stack.name()}" if stack.name() else set_name
+                    try:
+                        with self.execution_context(stack):
+                            action()
+                        results.append((target, None))
+                    except Exception as e:
+                        results.append((target, str(e)))
+        return results
+    
+    def _texture_set_matches(self, set_name, name_filter):
+        """True if a texture set name matches a pattern string or is in a collection of names"""
+        if isinstance(name_filter, str):
+            return fnmatch.fnmatchcase(set_name, name_filter)
+        return set_name in name_filter
+    
+    # ---- Layer commands ----
+    
+    def apply_blending_batch(self, layers, setter_name, value):
+        """Call a blending setter (set_opacity/set_blending_mode) on every valid (layer, channel) pair.
         
-        try:
-            # Handle macro execution
-            if command.startswith("[MACRO]"):
-                macro_display = command[7:].strip()  # Remove "[MACRO] " prefix
-                
-                # Extract actual macro name (remove hotkey suffix if present)
-                if '(' in macro_display and macro_display.endswith(')'):
-                    macro_name = macro_display.rsplit(' (', 1)[0].strip()
+        The stack's channels are looked up once and intersected with MAJOR_CHANNELS,
+        so no call is made for a channel the stack doesn't have. Mask-stack layers
+        take no channel. Returns (updated layer count, skipped layer count).
+        """
+        stack_channels = self.context.channels
+        channels = [channel for channel in MAJOR_CHANNELS if channel in stack_channels]
+        
+        success_count = 0
+        skip_count = 0
+        for layer in layers:
+            if not layer.has_blending():
+                skip_count += 1
+                continue
+            setter = getattr(layer, setter_name)
+            try:
+                if layer.is_in_mask_stack():
+                    setter(value)  # No channel needed for mask
                 else:
-                    macro_name = macro_display
-                
-                self.execute_macro(macro_name)
-                return
-            
-            # Handle procedural resources
-            elif command.startswith("[PROC]"):
-                procedural_data = item.data(QtCore.Qt.UserRole)
-                if procedural_data:
-                    result = self.apply_procedural(procedural_data)
-                    self.status_label.setText(result)
-                    # Keep dock open after procedural execution - user can use shortcut to refocus
+                    for channel in channels:
+                        setter(value, channel)
+                success_count += 1
+            except Exception as e:
+                substance_painter.logging.warning(f"Failed to {setter_name} for layer '{layer.get_name()}': {e}")
+                skip_count += 1
+        return success_count, skip_count
+    
+    def set_layer_opacity(self):
+        """Set opacity for all selected layers using official API"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            # Get current opacity from first layer for default value
+            first_layer = selected_nodes[0]
+            if first_layer.has_blending():
+                # Get current opacity from first layer
+                if first_layer.is_in_mask_stack():
+                    current_opacity = first_layer.get_opacity()
                 else:
-                    raise ValueError("No procedural data found")
-                return
-            
-            # === Layer Creation Commands ===
-            if command == "Create Paint Layer":
-                self.create_paint_layer()
-            elif command == "Create Fill Layer":
-                self.create_fill_layer()
-            elif command == "Create Group Layer":
-                self.create_group_layer()
-            elif command == "Create Layer Instance":
-                self.create_instance_layer()
-                
-            # === Effect Commands ===  
-            elif command == "Insert Fill Effect":
-                self.insert_fill_effect()
-            elif command == "Insert Paint Effect":
-                self.insert_paint_effect()
-            elif command == "Insert Levels Effect":
-                self.insert_levels_effect()
-            elif command == "Insert Compare Mask Effect":
-                self.insert_compare_mask_effect()
-            elif command == "Insert Filter Effect":
-                self.insert_filter_effect()
-            elif command == "Insert Generator Effect":
-                self.insert_generator_effect()
-            elif command == "Insert Anchor Point Effect":
-                self.insert_anchor_point_effect()
-            elif command == "Insert Color Selection Effect":
-                self.insert_color_selection_effect()
-                
-            # === Layer Management ===
-            elif command == "Delete Selected Layers":
-                self.delete_selected()
-            elif command == "Rename Selected Layer":
-                self.rename_selected_layer()
+                    current_opacity = first_layer.get_opacity(ChannelType.BaseColor)
                 
-            # === Layer Properties ===
-            elif command == "Toggle Layer Visibility":
-                self.toggle_layer_visibility()
-            elif command == "Show Layer":
-                self.show_layer()
-            elif command == "Hide Layer":
-                self.hide_layer()
-            elif command == "Set Layer Opacity":
-                self.set_layer_opacity()
-            elif command == "Get Layer Opacity":
-                self.get_layer_opacity()
-            elif command == "Set Blend Mode":
-                self.set_blend_mode()
-            elif command == "Get Blend Mode":
-                self.get_blend_mode()
+                # Show count of selected layers in dialog
+                layer_count = len(selected_nodes)
+                dialog_title = f"Set Layer Opacity ({layer_count} layer{'s' if layer_count > 1 else ''} selected)"
                 
-            # === Channel Management ===
-            elif command == "Enable BaseColor Channel":
-                self.enable_basecolor_channel()
-            elif command == "Enable All Channels":
-                self.enable_all_channels()
-            elif command == "Disable All Channels":
-                self.disable_all_channels()
-            elif command == "Toggle Channels":
-                self.toggle_channels()
+                # Prompt user for opacity
+                opacity, ok = self.ask_double(
+                    "opacity", dialog_title, f"Enter opacity (0.0 - 1.0) for {layer_count} layer{'s' if layer_count > 1 else ''}:",
+                    current_opacity, 0.0, 1.0, 2
+                )
                 
-            # === Mask Operations ===
-            elif command == "Add Layer Mask":
-                self.add_layer_mask()
-            elif command == "Remove Layer Mask":
-                self.remove_layer_mask()
-            elif command == "Enable Layer Mask":
-                self.enable_layer_mask()
-            elif command == "Disable Layer Mask":
-                self.disable_layer_mask()
-            elif command == "Set Mask Background White":
-                self.set_mask_white()
-            elif command == "Set Mask Background Black":
-                self.set_mask_black()
+                if ok:
+                    # Apply to all selected layers
+                    success_count, skip_count = self.apply_blending_batch(selected_nodes, 'set_opacity', opacity)
+                    
+                    # Log results
+                    if success_count > 0:
+                        substance_painter.logging.info(f"Set opacity to {opacity} for {success_count} layer{'s' if success_count != 1 else ''}")
+                    if skip_count > 0:
+                        substance_painter.logging.info(f"Skipped {skip_count} layer{'s' if skip_count != 1 else ''} (no blending support)")
+                    
+                    self.report(f"Opacity: {opacity} → {success_count} layer{'s' if success_count != 1 else ''}")
+            else:
+                raise ValueError("First selected layer does not support opacity")
+        else:
+            raise ValueError("No layers selected")
+    
+    def get_layer_opacity(self):
+        """Get opacity of selected layer using official API"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if layer.has_blending():
+                if layer.is_in_mask_stack():
+                    opacity = layer.get_opacity()
+                    substance_painter.logging.info(f"Mask '{layer.get_name()}' opacity: {opacity}")
+                    self.report(f"Mask opacity: {opacity}")
+                else:
+                    # For content layers, show BaseColor channel opacity as representative
+                    opacity = layer.get_opacity(ChannelType.BaseColor)
+                    substance_painter.logging.info(f"Layer '{layer.get_name()}' opacity (BaseColor): {opacity}")
+                    self.report(f"Layer opacity: {opacity}")
+            else:
+                raise ValueError("Selected layer does not support opacity")
+        else:
+            raise ValueError("No layer selected")
+    
+    def set_blend_mode(self):
+        """Set blend mode for all selected layers using official API"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            # Get current blend mode from first layer for default selection
+            first_layer = selected_nodes[0]
+            current_index = 0
+            if first_layer.has_blending():
+                # Get available blend modes
+                blend_modes = list(BLEND_MODE_NAMES)
                 
-            # === Smart Materials/Masks ===
-            elif command == "Insert Smart Material":
-                self.insert_smart_material()
-            elif command == "Create Smart Material":
-                self.create_smart_material()
-            elif command == "Insert Smart Mask":
-                self.insert_smart_mask()
-            elif command == "Create Smart Mask":
-                self.create_smart_mask()
+                # Get current blend mode from first layer
+                try:
+                    if first_layer.is_in_mask_stack():
+                        current_mode = first_layer.get_blending_mode()
+                    else:
+                        current_mode = first_layer.get_blending_mode(ChannelType.BaseColor)
+                    current_index = blend_modes.index(current_mode.name)
+                except:
+                    pass
                 
-            # === Geometry Masks ===
-            elif command == "Set Geometry Mask Mesh":
-                self.set_geometry_mask_mesh()
-            elif command == "Set Geometry Mask UV Tile":
-                self.set_geometry_mask_uv_tile()
-            elif command == "Enable Geometry Mask":
-                self.enable_geometry_mask()
+                # Show count of selected layers in dialog
+                layer_count = len(selected_nodes)
+                dialog_title = f"Set Blend Mode ({layer_count} layer{'s' if layer_count > 1 else ''} selected)"
                 
-            # === Projection Modes ===
-            elif command == "Set Projection UV":
-                self.set_projection_uv()
-            elif command == "Set Projection Triplanar":
-                self.set_projection_triplanar()
-            elif command == "Set Projection Planar":
-                self.set_projection_planar()
-            elif command == "Set Projection Spherical":
-                self.set_projection_spherical()
-            elif command == "Set Projection Cylindrical":
-                self.set_projection_cylindrical()
-            elif command == "Enable Symmetry":
-                self.enable_symmetry()
-            elif command == "Disable Symmetry":
-                self.disable_symmetry()
+                # Prompt user for blend mode
+                blend_mode_name, ok = self.ask_item(
+                    "blend_mode", dialog_title, f"Select blend mode to apply to {layer_count} layer{'s' if layer_count > 1 else ''}:",
+                    blend_modes, current_index
+                )
                 
-            # === Selection ===
-            elif command == "Select Content":
-                self.select_content()
-            elif command == "Select Mask":
-                self.select_mask()
-            elif command == "Select Properties":
-                self.select_properties()
+                if ok and blend_mode_name:
+                    # Convert string to BlendingMode enum
+                    blend_mode = getattr(BlendingMode, blend_mode_name)
+                    
+                    # Apply to all selected layers
+                    success_count, skip_count = self.apply_blending_batch(selected_nodes, 'set_blending_mode', blend_mode)
+                    
+                    # Log results
+                    if success_count > 0:
+                        substance_painter.logging.info(f"Set blend mode to {blend_mode_name} for {success_count} layer{'s' if success_count != 1 else ''}")
+                    if skip_count > 0:
+                        substance_painter.logging.info(f"Skipped {skip_count} layer{'s' if skip_count != 1 else ''} (no blending support)")
+                    
+                    self.report(f"Blend mode: {blend_mode_name} → {success_count} layer{'s' if success_count != 1 else ''}")
             else:
-                raise ValueError(f"Unknown command: {command}")
-                
-            self.status_label.setText(f"✓ Executed: {command}")
-            # Keep dock open after execution - user can use shortcut to refocus
-            
-        except Exception as e:
-            self.status_label.setText(f"✗ Failed: {command}")
-            substance_painter.logging.error(f"Command failed: {e}")
-    
-    # ---- Macro System Methods ----
-    
-    def _get_macros_file_path(self):
-        """Get the path for the macros file"""
-        try:
-            import substance_painter.application
-            app_data = substance_painter.application.application_data_folder()
-            return os.path.join(app_data, "commander_macros.json")
-        except:
-            # Fallback to user home directory
-            return os.path.expanduser("~/commander_macros.json")
-    
-    def _get_settings_file_path(self):
-        """Get the path for the settings file"""
-        try:
-            import substance_painter.application
-            app_data = substance_painter.application.application_data_folder()
-            return os.path.join(app_data, "commander_settings.json")
-        except:
-            # Fallback to user home directory
-            return os.path.expanduser("~/commander_settings.json")
+                raise ValueError("First selected layer does not support blending")
+        else:
+            raise ValueError("No layers selected")
     
-    def load_settings(self):
-        """Load Commander settings from file"""
-        try:
-            settings_file = self._get_settings_file_path()
-            if os.path.exists(settings_file):
-                with open(settings_file, 'r') as f:
-                    return json.load(f)
+    def get_blend_mode(self):
+        """Get blend mode of selected layer using official API"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if layer.has_blending():
+                if layer.is_in_mask_stack():
+                    blend_mode = layer.get_blending_mode()
+                    substance_painter.logging.info(f"Mask '{layer.get_name()}' blend mode: {blend_mode.name}")
+                    self.report(f"Mask blend mode: {blend_mode.name}")
+                else:
+                    # For content layers, show BaseColor channel blend mode as representative
+                    blend_mode = layer.get_blending_mode(ChannelType.BaseColor)
+                    substance_painter.logging.info(f"Layer '{layer.get_name()}' blend mode (BaseColor): {blend_mode.name}")
+                    self.report(f"Layer blend mode: {blend_mode.name}")
             else:
-                # Return default settings
-                return {
-                    'main_shortcut': 'Ctrl+;',
-                    'version': '1.0'
-                }
-        except Exception as e:
-            substance_painter.logging.error(f"Failed to load settings: {str(e)}")
-            return {'main_shortcut': 'Ctrl+;', 'version': '1.0'}
-    
-    def save_settings(self, settings):
-        """Save Commander settings to file"""
-        try:
-            settings_file = self._get_settings_file_path()
-            with open(settings_file, 'w') as f:
-                json.dump(settings, f, indent=2)
-            substance_painter.logging.info(f"Settings saved to {settings_file}")
-        except Exception as e:
-            substance_painter.logging.error(f"Failed to save settings: {str(e)}")
+                raise ValueError("Selected layer does not support blending")
+        else:
+            raise ValueError("No layer selected")
     
-    def open_settings(self):
-        """Open the settings dialog"""
-        dialog = SettingsDialog(self, self.settings)
-        if dialog.exec() == QtWidgets.QDialog.DialogCode.Accepted:
-            new_settings = dialog.get_settings()
+    def rename_selected_layer(self):
+        """Rename the selected layer using official API"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            layer = selected_nodes[0]
+            current_name = layer.get_name()
             
-            # Check for shortcut changes
-            if new_settings['main_shortcut'] != self.settings['main_shortcut']:
-                # Check for conflicts with existing macros
-                if self.is_main_shortcut_conflict(new_settings['main_shortcut']):
-                    return  # User declined to proceed with conflict
-                
-                # Update the global shortcut
-                self.update_main_shortcut(new_settings['main_shortcut'])
-                
-                self.status_label.setText(f"Main shortcut changed to: {new_settings['main_shortcut']}")
-                substance_painter.logging.info(f"Commander main shortcut updated to: {new_settings['main_shortcut']}")
+            # Prompt user for new name
+            new_name, ok = self.ask_text("name", "Rename Layer", "Enter new layer name:", current_name)
+            # A bound name can be a template around the current one, e.g. "{name}_worn"
+            new_name = new_name.replace("{name}", current_name)
             
-            # Save the new settings
-            self.settings = new_settings
-            self.save_settings(self.settings)
+            if ok and new_name.strip():
+                layer.set_name(new_name.strip())
+                substance_painter.logging.info(f"Renamed layer from '{current_name}' to '{new_name.strip()}'")
+                self.report(f"Renamed layer to: {new_name.strip()}")
+        else:
+            raise ValueError("No layer selected")
     
-    def is_main_shortcut_conflict(self, shortcut):
-        """Check if main shortcut conflicts with existing macro shortcuts or problematic keys"""
-        
-        # Check for problematic shortcuts that won't work
-        problematic_shortcuts = ['Space', 'Tab', 'Enter', 'Return', 'Escape']
-        if shortcut in problematic_shortcuts:
-            QtWidgets.QMessageBox.warning(
-                self, "Problematic Shortcut",
-                f"⚠️ Shortcut '{shortcut}' is reserved by Substance Painter and may not work properly.\n\n" +
-                f"Recommended shortcuts: F9, F10, F11, Ctrl+Shift+C, Alt+Space, Ctrl+/\n\n" +
-                f"If Commander stops responding, manually edit:\n" +
-                f"commander_settings.json (in your home folder)\n" +
-                f"and change 'main_shortcut' back to 'Ctrl+;'"
-            )
-            # Allow it but warn them
-        
-        # Check for known SP conflicts and warn
-        sp_shortcuts = ['F1', 'F5', 'Ctrl+N', 'Ctrl+O', 'Ctrl+S', 'Ctrl+Z', 'Ctrl+Y', 
-                       'Ctrl+C', 'Ctrl+V', 'Ctrl+X', 'Ctrl+A', 'Ctrl+R', 'Ctrl+Shift+S']
-        if shortcut in sp_shortcuts:
-            reply = QtWidgets.QMessageBox.question(
-                self, "Potential Conflict",
-                f"⚠️ Shortcut '{shortcut}' is used by Substance Painter.\n" +
-                f"This may cause conflicts. Use it anyway?\n\n" +
-                f"Better alternatives: F9, F10, F11, Ctrl+Shift+C",
-                QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
-            )
-            if reply == QtWidgets.QMessageBox.StandardButton.No:
-                return True  # User declined, treat as conflict
+    def toggle_layer_visibility(self):
+        """Toggle visibility of all selected layers using official API"""
+        selected_nodes = self.context.selection
         
-        # Check against existing macro shortcuts
-        for macro_name, macro_data in self.macros.items():
-            if 'hotkey' in macro_data and macro_data['hotkey'] == shortcut:
-                reply = QtWidgets.QMessageBox.question(
-                    self, "Shortcut Conflict",
-                    f"Shortcut '{shortcut}' is already assigned to macro '{macro_name}'.\n" +
-                    f"Remove it from '{macro_name}' and use as main Commander shortcut?",
-                    QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
-                )
-                if reply == QtWidgets.QMessageBox.StandardButton.Yes:
-                    # Remove from macro
-                    self.unregister_macro_hotkey(macro_name)
-                    del self.macros[macro_name]['hotkey']
-                    self.save_macros()
-                    return False  # No conflict, we resolved it
-                else:
-                    return True  # Conflict, user declined to resolve
-        return False  # No conflict
+        if selected_nodes:
+            layer_count = len(selected_nodes)
+            
+            # Determine action based on first layer's visibility
+            first_layer_visible = selected_nodes[0].is_visible()
+            new_visibility = not first_layer_visible
+            
+            # Apply to all selected layers
+            for layer in selected_nodes:
+                layer.set_visible(new_visibility)
+            
+            status = "visible" if new_visibility else "hidden"
+            substance_painter.logging.info(f"Set {layer_count} layer{'s' if layer_count != 1 else ''} to {status}")
+            self.report(f"{layer_count} layer{'s' if layer_count != 1 else ''} {status}")
+        else:
+            raise ValueError("No layers selected")
     
-    def update_main_shortcut(self, new_shortcut):
-        """Update the main Commander shortcut"""
-        global COMMANDER_SHORTCUT
-        
-        # Update the global shortcut reference
-        if COMMANDER_SHORTCUT:
-            try:
-                COMMANDER_SHORTCUT.activated.disconnect()
-                COMMANDER_SHORTCUT.setParent(None)
-                COMMANDER_SHORTCUT.deleteLater()
-            except Exception as e:
-                substance_painter.logging.warning(f"Error cleaning up old shortcut: {e}")
+    def show_layer(self):
+        """Show all selected layers using official API"""
+        selected_nodes = self.context.selection
         
-        # Create new shortcut with updated key sequence
-        main_window = substance_painter.ui.get_main_window()
-        COMMANDER_SHORTCUT = QtGui.QShortcut(QtGui.QKeySequence(new_shortcut), main_window)
-        COMMANDER_SHORTCUT.activated.connect(show_commander)
+        if selected_nodes:
+            layer_count = len(selected_nodes)
+            
+            # Apply to all selected layers
+            for layer in selected_nodes:
+                layer.set_visible(True)
+            
+            substance_painter.logging.info(f"Showed {layer_count} layer{'s' if layer_count != 1 else ''}")
+            self.report(f"{layer_count} layer{'s' if layer_count != 1 else ''} shown")
+        else:
+            raise ValueError("No layers selected")
+    
+    def hide_layer(self):
+        """Hide all selected layers using official API"""
+        selected_nodes = self.context.selection
         
-        substance_painter.logging.info(f"Updated main shortcut to: {new_shortcut}")
+        if selected_nodes:
+            layer_count = len(selected_nodes)
+            
+            # Apply to all selected layers
+            for layer in selected_nodes:
+                layer.set_visible(False)
+            
+            substance_painter.logging.info(f"Hid {layer_count} layer{'s' if layer_count != 1 else ''}")
+            self.report(f"{layer_count} layer{'s' if layer_count != 1 else ''} hidden")
+        else:
+            raise ValueError("No layers selected")
     
-    def load_macros(self):
-        """Load macros from file and register their hotkeys"""
-        try:
-            if os.path.exists(self.macros_file):
-                with open(self.macros_file, 'r') as f:
-                    self.macros = json.load(f)
-                
-                # Register hotkeys for existing macros
-                hotkey_count = 0
-                for macro_name, macro_data in self.macros.items():
-                    if 'hotkey' in macro_data:
-                        self.register_macro_hotkey(macro_name, macro_data['hotkey'])
-                        hotkey_count += 1
-                
-                substance_painter.logging.info(f"Loaded {len(self.macros)} macros ({hotkey_count} with hotkeys)")
+    # Smart Material and Mask methods (placeholder implementations)
+    def create_smart_material(self):
+        """Create smart material from selected group - requires group layer selection"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if hasattr(layer, 'get_type') and layer.get_type().name == 'GroupLayer':
+                # Prompt for name
+                name, ok = self.ask_text("name", "Create Smart Material", "Enter smart material name:")
+                if ok and name.strip():
+                    try:
+                        from substance_painter.layerstack import create_smart_material
+                        resource = create_smart_material(layer, name.strip())
+                        substance_painter.logging.info(f"Created smart material: {name.strip()}")
+                        self.report(f"Created smart material: {name.strip()}")
+                    except Exception as e:
+                        raise ValueError(f"Failed to create smart material: {e}")
+                else:
+                    raise ValueError("Smart material name required")
             else:
-                self.macros = {}
-                substance_painter.logging.info("No macros file found, starting with empty macros")
-        except Exception as e:
-            substance_painter.logging.error(f"Failed to load macros: {str(e)}")
-            self.macros = {}
+                raise ValueError("Please select a group layer to create smart material")
+        else:
+            raise ValueError("No layer selected")
     
-    def save_macros(self):
-        """Save macros to file"""
-        try:
-            with open(self.macros_file, 'w') as f:
-                json.dump(self.macros, f, indent=2)
-            substance_painter.logging.info(f"Saved {len(self.macros)} macros")
-        except Exception as e:
-            substance_painter.logging.error(f"Failed to save macros: {str(e)}")
+    def insert_smart_mask(self):
+        """Insert smart mask - requires smart mask resource selection"""
+        raise ValueError("Smart mask insertion requires resource selection (not implemented in minimal version)")
     
-    def is_hotkey_conflict(self, hotkey, macro_name):
-        """Check if hotkey conflicts with existing assignments"""
-        # Check against main Commander shortcut
-        if hotkey == self.settings['main_shortcut']:
-            reply = QtWidgets.QMessageBox.question(
-                self, "Shortcut Conflict",
-                f"Hotkey '{hotkey}' is the main Commander shortcut.\n" +
-                f"Use it for macro '{macro_name}' instead? (You can set a new main shortcut in Settings)",
-                QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
-            )
-            if reply == QtWidgets.QMessageBox.StandardButton.Yes:
-                # Change main shortcut to default
-                self.settings['main_shortcut'] = 'Ctrl+;'
-                self.save_settings(self.settings)
-                self.update_main_shortcut('Ctrl+;')
-                self.status_label.setText(f"Main shortcut reset to Ctrl+; ('{hotkey}' assigned to macro)")
-                return False  # No conflict, we resolved it
+    def create_smart_mask(self):
+        """Create smart mask from selected layer's mask stack"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if layer.has_mask():
+                # Prompt for name
+                name, ok = self.ask_text("name", "Create Smart Mask", "Enter smart mask name:")
+                if ok and name.strip():
+                    try:
+                        from substance_painter.layerstack import create_smart_mask
+                        resource = create_smart_mask(layer, name.strip())
+                        substance_painter.logging.info(f"Created smart mask: {name.strip()}")
+                        self.report(f"Created smart mask: {name.strip()}")
+                    except Exception as e:
+                        raise ValueError(f"Failed to create smart mask: {e}")
+                else:
+                    raise ValueError("Smart mask name required")
             else:
-                return True  # Conflict, user declined to resolve
+                raise ValueError("Selected layer must have a mask to create smart mask")
+        else:
+            raise ValueError("No layer selected")
+    
+    # Geometry mask methods
+    def set_geometry_mask_mesh(self):
+        """Set geometry mask to mesh mode and configure mesh selection"""
+        selected_nodes = self.context.selection
         
-        # Check against other macros
-        for name, macro_data in self.macros.items():
-            if name != macro_name and 'hotkey' in macro_data:
-                if macro_data['hotkey'] == hotkey:
-                    reply = QtWidgets.QMessageBox.question(
-                        self, "Hotkey Conflict",
-                        f"Hotkey '{hotkey}' is already assigned to macro '{name}'.\n" +
-                        f"Remove it from '{name}' and assign to '{macro_name}'?",
-                        QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
-                    )
-                    if reply == QtWidgets.QMessageBox.StandardButton.Yes:
-                        # Remove from old macro
-                        self.unregister_macro_hotkey(name)
-                        del self.macros[name]['hotkey']
-                        return False  # No conflict, we resolved it
-                    else:
-                        return True  # Conflict, user declined to resolve
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if hasattr(layer, 'set_geometry_mask_type'):
+                from substance_painter.layerstack import GeometryMaskType
+                layer.set_geometry_mask_type(GeometryMaskType.Mesh)
+                substance_painter.logging.info("Set geometry mask to mesh mode")
+                self.report("Geometry mask set to mesh mode")
+            else:
+                raise ValueError("Selected node does not support geometry masks")
+        else:
+            raise ValueError("No layer selected")
+    
+    def set_geometry_mask_uv_tile(self):
+        """Set geometry mask to UV tile mode"""
+        selected_nodes = self.context.selection
         
-        # Check against known Substance Painter shortcuts
-        sp_shortcuts = [
-            'Ctrl+N', 'Ctrl+O', 'Ctrl+S', 'Ctrl+Z', 'Ctrl+Y', 'Ctrl+C', 'Ctrl+V', 'Ctrl+X',
-            'Ctrl+A', 'F1', 'F11', 'Ctrl+Shift+S', 'Ctrl+R', 'Space'
-        ]
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if hasattr(layer, 'set_geometry_mask_type'):
+                from substance_painter.layerstack import GeometryMaskType
+                try:
+                    layer.set_geometry_mask_type(GeometryMaskType.UVTile)
+                    substance_painter.logging.info("Set geometry mask to UV tile mode")
+                    self.report("Geometry mask set to UV tile mode")
+                except ValueError as e:
+                    raise ValueError("UV Tile mode not supported in this project")
+            else:
+                raise ValueError("Selected node does not support geometry masks")
+        else:
+            raise ValueError("No layer selected")
+    
+    def enable_geometry_mask(self):
+        """Enable geometry mask (basic implementation)"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if hasattr(layer, 'set_geometry_mask_type'):
+                from substance_painter.layerstack import GeometryMaskType
+                layer.set_geometry_mask_type(GeometryMaskType.Mesh)  # Default to mesh
+                substance_painter.logging.info("Enabled geometry mask")
+                self.report("Geometry mask enabled")
+            else:
+                raise ValueError("Selected node does not support geometry masks")
+        else:
+            raise ValueError("No layer selected")
+    
+    # Projection methods
+    def set_projection_uv(self):
+        """Set projection mode to UV"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if hasattr(layer, 'set_projection_mode'):
+                layer.set_projection_mode(ProjectionMode.UV)
+                substance_painter.logging.info("Set projection mode to UV")
+                self.report("Projection: UV")
+            else:
+                raise ValueError("Selected layer does not support projection modes")
+        else:
+            raise ValueError("No layer selected")
+    
+    def set_projection_triplanar(self):
+        """Set projection mode to Triplanar"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if hasattr(layer, 'set_projection_mode'):
+                layer.set_projection_mode(ProjectionMode.Triplanar)
+                substance_painter.logging.info("Set projection mode to Triplanar")
+                self.report("Projection: Triplanar")
+            else:
+                raise ValueError("Selected layer does not support projection modes")
+        else:
+            raise ValueError("No layer selected")
+    
+    def set_projection_planar(self):
+        """Set projection mode to Planar"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if hasattr(layer, 'set_projection_mode'):
+                layer.set_projection_mode(ProjectionMode.Planar)
+                substance_painter.logging.info("Set projection mode to Planar")
+                self.report("Projection: Planar")
+            else:
+                raise ValueError("Selected layer does not support projection modes")
+        else:
+            raise ValueError("No layer selected")
+    
+    def set_projection_spherical(self):
+        """Set projection mode to Spherical"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if hasattr(layer, 'set_projection_mode'):
+                layer.set_projection_mode(ProjectionMode.Spherical)
+                substance_painter.logging.info("Set projection mode to Spherical")
+                self.report("Projection: Spherical")
+            else:
+                raise ValueError("Selected layer does not support projection modes")
+        else:
+            raise ValueError("No layer selected")
+    
+    def set_projection_cylindrical(self):
+        """Set projection mode to Cylindrical"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if hasattr(layer, 'set_projection_mode'):
+                layer.set_projection_mode(ProjectionMode.Cylindrical)
+                substance_painter.logging.info("Set projection mode to Cylindrical")
+                self.report("Projection: Cylindrical")
+            else:
+                raise ValueError("Selected layer does not support projection modes")
+        else:
+            raise ValueError("No layer selected")
+    
+    # Symmetry methods
+    def enable_symmetry(self):
+        """Enable symmetry on selected layer"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if hasattr(layer, 'set_symmetry_enabled'):
+                layer.set_symmetry_enabled(True)
+                substance_painter.logging.info("Enabled symmetry")
+                self.report("Symmetry enabled")
+            else:
+                raise ValueError("Selected layer does not support symmetry")
+        else:
+            raise ValueError("No layer selected")
+    
+    def disable_symmetry(self):
+        """Disable symmetry on selected layer"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if hasattr(layer, 'set_symmetry_enabled'):
+                layer.set_symmetry_enabled(False)
+                substance_painter.logging.info("Disabled symmetry")
+                self.report("Symmetry disabled")
+            else:
+                raise ValueError("Selected layer does not support symmetry")
+        else:
+            raise ValueError("No layer selected")
+    
+    # Channel Management methods
+    def enable_basecolor_channel(self):
+        """Enable BaseColor channel on selected layers"""
+        context = self.context
+        selected_nodes = context.selection
+        
+        if selected_nodes:
+            success_count = 0
+            
+            for layer in selected_nodes:
+                if hasattr(layer, 'active_channels'):
+                    try:
+                        # Get available channels on the stack
+                        available_channels = set(context.channels)
+                        
+                        if ChannelType.BaseColor in available_channels:
+                            # Get current active channels and add BaseColor
+                            current_channels = layer.active_channels
+                            current_channels.add(ChannelType.BaseColor)
+                            layer.active_channels = current_channels
+                            success_count += 1
+                        
+                    except Exception as e:
+                        substance_painter.logging.warning(f"Could not enable BaseColor for layer '{layer.get_name()}': {e}")
+            
+            if success_count > 0:
+                substance_painter.logging.info(f"Enabled BaseColor channel on {success_count} layer{'s' if success_count != 1 else ''}")
+                self.report(f"BaseColor enabled on {success_count} layer{'s' if success_count != 1 else ''}")
+            else:
+                raise ValueError("No fill layers selected or BaseColor channel not available")
+        else:
+            raise ValueError("No layers selected")
+    
+    def enable_all_channels(self):
+        """Enable all available channels on selected layers"""
+        context = self.context
+        selected_nodes = context.selection
+        
+        if selected_nodes:
+            success_count = 0
+            
+            for layer in selected_nodes:
+                if hasattr(layer, 'active_channels'):
+                    try:
+                        # Get all available channels on the stack
+                        available_channels = set(context.channels)
+                        
+                        if available_channels:
+                            layer.active_channels = available_channels
+                            success_count += 1
+                        
+                    except Exception as e:
+                        substance_painter.logging.warning(f"Could not enable all channels for layer '{layer.get_name()}': {e}")
+            
+            if success_count > 0:
+                substance_painter.logging.info(f"Enabled all channels on {success_count} layer{'s' if success_count != 1 else ''}")
+                self.report(f"All channels enabled on {success_count} layer{'s' if success_count != 1 else ''}")
+            else:
+                raise ValueError("No fill layers selected")
+        else:
+            raise ValueError("No layers selected")
+    
+    def disable_all_channels(self):
+        """Disable all channels on selected layers"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            success_count = 0
+            
+            for layer in selected_nodes:
+                if hasattr(layer, 'active_channels'):
+                    try:
+                        layer.active_channels = set()  # Empty set disables all channels
+                        success_count += 1
+                        
+                    except Exception as e:
+                        substance_painter.logging.warning(f"Could not disable channels for layer '{layer.get_name()}': {e}")
+            
+            if success_count > 0:
+                substance_painter.logging.info(f"Disabled all channels on {success_count} layer{'s' if success_count != 1 else ''}")
+                self.report(f"All channels disabled on {success_count} layer{'s' if success_count != 1 else ''}")
+            else:
+                raise ValueError("No fill layers selected")
+        else:
+            raise ValueError("No layers selected")
+    
+    def toggle_channels(self):
+        """Interactive channel selection for selected layers"""
+        context = self.context
+        selected_nodes = context.selection
+        
+        if selected_nodes:
+            fill_layers = [layer for layer in selected_nodes if hasattr(layer, 'active_channels')]
+            
+            if fill_layers:
+                # Get available channels on the stack
+                available_channels = list(context.channels)
+                channel_names = [ch.name for ch in available_channels]
+                
+                if not channel_names:
+                    raise ValueError("No channels available on this texture set")
+                
+                # Get currently active channels from first layer
+                first_layer = fill_layers[0]
+                active_channels = first_layer.active_channels
+                
+                # Create checkable items list for simple dialog
+                checked_indices = []
+                for i, channel in enumerate(available_channels):
+                    if channel in active_channels:
+                        checked_indices.append(i)
+                
+                # For now, show a simplified message about channel toggling
+                # (Full multi-selection dialog would require more complex QtWidgets setup)
+                layer_count = len(fill_layers)
+                active_names = [ch.name for ch in active_channels]
+                
+                message = f"Current active channels on first layer: {', '.join(active_names) if active_names else 'None'}"
+                substance_painter.logging.info(message)
+                self.report(f"Active channels: {len(active_channels)} of {len(available_channels)}")
+                
+            else:
+                raise ValueError("No fill layers selected (only fill layers support channel management)")
+        else:
+            raise ValueError("No layers selected")
+    
+    def create_paint_layer(self):
+        """Create a paint layer using official API"""
+        context = self.context
+        stack = context.stack
+        insert_position = InsertPosition.from_textureset_stack(stack)
+        layer = insert_paint(insert_position)
+        layer.set_name("Paint Layer")
         
-        if hotkey in sp_shortcuts:
-            reply = QtWidgets.QMessageBox.question(
-                self, "Potential Conflict",
-                f"Hotkey '{hotkey}' might conflict with Substance Painter.\n" +
-                "Use it anyway?",
-                QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
-            )
-            return reply != QtWidgets.QMessageBox.StandardButton.Yes
+        # Note: Paint layers don't use the same source system as fill layers
+        # They are ready to paint on by default, no channel enabling needed
         
-        return False  # No conflict
+        # Select the newly created layer for macro chaining
+        context.select([layer])
+        substance_painter.logging.info("Created and selected paint layer")
     
-    def register_macro_hotkey(self, macro_name, hotkey):
-        """Register a hotkey for a macro"""
+    def create_fill_layer(self):
+        """Create a fill layer using official API"""
+        context = self.context
+        stack = context.stack
+        insert_position = InsertPosition.from_textureset_stack(stack)
+        layer = insert_fill(insert_position)
+        layer.set_name("Fill Layer")
+        
+        # Enable BaseColor channel by default (and other common channels)
         try:
-            # Create QShortcut and connect to macro execution
-            main_window = substance_painter.ui.get_main_window()
-            shortcut = QtGui.QShortcut(QtGui.QKeySequence(hotkey), main_window)
-            shortcut.activated.connect(lambda: self.execute_macro_by_name(macro_name))
+            # Get available channels on the stack - all_channels() returns ChannelType objects directly
+            available_channels = set(context.channels)
+            
+            # Define default channels to enable
+            default_channels = {ChannelType.BaseColor}
             
-            # Store shortcut reference for later cleanup
-            if not hasattr(self, 'macro_shortcuts'):
-                self.macro_shortcuts = {}
-            self.macro_shortcuts[macro_name] = shortcut
+            # Only enable channels that exist on this stack
+            channels_to_enable = default_channels.intersection(available_channels)
             
-            substance_painter.logging.info(f"Registered hotkey '{hotkey}' for macro '{macro_name}'")
+            if channels_to_enable:
+                layer.active_channels = channels_to_enable
+                enabled_channel_names = [ch.name for ch in channels_to_enable]
+                substance_painter.logging.info(f"Enabled channels: {', '.join(enabled_channel_names)}")
         except Exception as e:
-            substance_painter.logging.error(f"Failed to register hotkey for macro '{macro_name}': {e}")
+            substance_painter.logging.warning(f"Could not enable default channels: {e}")
+        
+        # Select the newly created layer for macro chaining
+        context.select([layer])
+        substance_painter.logging.info("Created and selected fill layer")
     
-    def unregister_macro_hotkey(self, macro_name):
-        """Unregister a hotkey for a macro"""
-        try:
-            if hasattr(self, 'macro_shortcuts') and macro_name in self.macro_shortcuts:
-                shortcut = self.macro_shortcuts[macro_name]
-                shortcut.activated.disconnect()
-                shortcut.setParent(None)
-                shortcut.deleteLater()
-                del self.macro_shortcuts[macro_name]
-                substance_painter.logging.info(f"Unregistered hotkey for macro '{macro_name}'")
-        except Exception as e:
-            substance_painter.logging.error(f"Failed to unregister hotkey for macro '{macro_name}': {e}")
+    def create_group_layer(self):
+        """Create a group layer using official API"""
+        context = self.context
+        stack = context.stack
+        insert_position = InsertPosition.from_textureset_stack(stack)
+        layer = insert_group(insert_position)
+        layer.set_name("Group")
+        
+        # Select the newly created layer for macro chaining
+        context.select([layer])
+        substance_painter.logging.info("Created and selected group layer")
     
-    def execute_macro_by_name(self, macro_name):
-        """Execute a macro by name (called by hotkey)"""
-        if macro_name in self.macros:
-            substance_painter.logging.info(f"Executing macro '{macro_name}' via hotkey")
-            self.execute_macro(macro_name)
+    def create_instance_layer(self):
+        """Create instance layer from selected layer using official API"""
+        context = self.context
+        stack = context.stack
+        selected_nodes = context.selection
+        
+        if selected_nodes:
+            source_layer = selected_nodes[0]
+            insert_position = InsertPosition.from_textureset_stack(stack)
+            instance = instantiate(insert_position, source_layer)
+            instance.set_name(f"Instance of {source_layer.get_name()}")
+            
+            # Select the newly created instance for macro chaining
+            context.select([instance])
+            substance_painter.logging.info("Created and selected instance layer")
         else:
-            substance_painter.logging.error(f"Macro '{macro_name}' not found")
+            raise ValueError("No layer selected to instance")
     
-    def start_macro_creation(self):
-        """Start macro creation mode"""
-        self.macro_creation_mode = True
-        self.selected_commands = []
-        self.status_label.setText("Macro Creation Mode: Click commands to select")
-        substance_painter.logging.info("Started macro creation mode")
-        
-        # Update UI
-        self.create_macro_button.setText("Done Selecting")
-        self.create_macro_button.clicked.disconnect()
-        self.create_macro_button.clicked.connect(self.finish_macro_creation)
-        self.cancel_macro_button.setVisible(True)
+    def insert_smart_material(self):
+        """Insert smart material - requires resource selection (simplified for now)"""
+        context = self.context
+        stack = context.stack
+        insert_position = InsertPosition.from_textureset_stack(stack)
+        # Note: This would require resource selection UI in full implementation
+        raise ValueError("Smart Material insertion requires resource selection (not implemented in minimal version)")
     
-    def cancel_macro_creation(self):
-        """Cancel macro creation mode"""
-        self.macro_creation_mode = False
-        self.selected_commands = []
-        self.status_label.setText("Macro creation cancelled")
-        substance_painter.logging.info("Cancelled macro creation mode")
-        
-        # Reset UI
-        self.create_macro_button.setText("Create Macro")
-        self.create_macro_button.clicked.disconnect()
-        self.create_macro_button.clicked.connect(self.start_macro_creation)
-        self.cancel_macro_button.setVisible(False)
+    # === EFFECT COMMANDS ===
+    def insert_fill_effect(self):
+        """Insert fill effect on selected layer using official API - context aware"""
+        context = self.context
+        selected_nodes = context.selection
         
-        # Refresh to restore normal colors
-        self.refresh_commands()
+        if selected_nodes:
+            layer = selected_nodes[0]
+            
+            # Check selection context to determine where to insert
+            selection_type = context.selection_type(layer)
+            
+            if selection_type == SelectionType.Mask and layer.has_mask():
+                # Insert into mask stack
+                insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
+                context_name = "mask"
+            else:
+                # Insert into content stack
+                insert_position = InsertPosition.inside_node(layer, NodeStack.Content)
+                context_name = "content"
+            
+            effect = insert_fill(insert_position)
+            effect.set_name(f"Fill Effect ({context_name})")
+            substance_painter.logging.info(f"Inserted fill effect into {context_name} stack")
+        else:
+            raise ValueError("No layer selected")
     
-    def finish_macro_creation(self):
-        """Finish selecting commands and create macro"""
-        if len(self.selected_commands) == 0:
-            QtWidgets.QMessageBox.warning(self, "No Commands", "Please select some commands first.")
-            return
+    def insert_paint_effect(self):
+        """Insert paint effect on selected layer using official API - context aware"""
+        context = self.context
+        selected_nodes = context.selection
         
-        # Use advanced macro creation dialog
-        dialog = MacroCreationDialog(self, self.selected_commands)
-        if dialog.exec() == QtWidgets.QDialog.DialogCode.Accepted:
-            name = dialog.get_macro_name()
-            hotkey = dialog.get_hotkey()
-            if name:
-                self.create_macro(name, hotkey)
+        if selected_nodes:
+            layer = selected_nodes[0]
+            
+            # Check selection context to determine where to insert
+            selection_type = context.selection_type(layer)
+            
+            if selection_type == SelectionType.Mask and layer.has_mask():
+                # For masks, use insert_fill (paint doesn't work properly in mask context)
+                insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
+                effect = insert_fill(insert_position)  # Use fill for masks
+                effect.set_name("Paint Effect (mask)")
+                context_name = "mask"
+            else:
+                # For content, use insert_paint
+                insert_position = InsertPosition.inside_node(layer, NodeStack.Content)
+                effect = insert_paint(insert_position)
+                effect.set_name("Paint Effect (content)")
+                context_name = "content"
+            
+            substance_painter.logging.info(f"Inserted paint effect into {context_name} stack")
+        else:
+            raise ValueError("No layer selected")
     
-    def create_macro(self, name, hotkey=None):
-        """Create a macro with the selected commands and optional hotkey"""
-        if name in self.macros:
-            reply = QtWidgets.QMessageBox.question(
-                self, "Macro Exists", 
-                f"Macro '{name}' already exists. Replace it?",
-                QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
-            )
-            if reply != QtWidgets.QMessageBox.StandardButton.Yes:
-                return
-        
-        # Check hotkey conflicts
-        if hotkey and self.is_hotkey_conflict(hotkey, name):
-            return
-        
-        # Save macro
-        macro_data = {
-            'commands': self.selected_commands.copy()
-        }
-        if hotkey:
-            macro_data['hotkey'] = hotkey
-        
-        self.macros[name] = macro_data
-        self.save_macros()
-        
-        # Register hotkey if provided
-        if hotkey:
-            self.register_macro_hotkey(name, hotkey)
-        
-        # Reset UI
-        self.cancel_macro_creation()
+    def insert_levels_effect(self):
+        """Insert levels effect using official API - context aware"""
+        context = self.context
+        selected_nodes = context.selection
         
-        hotkey_text = f" with hotkey {hotkey}" if hotkey else ""
-        self.status_label.setText(f"Created macro '{name}'{hotkey_text} with {len(self.selected_commands)} commands")
-        substance_painter.logging.info(f"Created macro '{name}'{hotkey_text} with {len(self.selected_commands)} commands")
+        if selected_nodes:
+            layer = selected_nodes[0]
+            
+            # Check selection context to determine where to insert
+            selection_type = context.selection_type(layer)
+            
+            if selection_type == SelectionType.Mask and layer.has_mask():
+                # Insert into mask stack
+                insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
+                context_name = "mask"
+            else:
+                # Insert into content stack
+                insert_position = InsertPosition.inside_node(layer, NodeStack.Content)
+                context_name = "content"
+            
+            effect = insert_levels_effect(insert_position)
+            effect.set_name(f"Levels ({context_name})")
+            substance_painter.logging.info(f"Inserted levels effect into {context_name} stack")
+        else:
+            raise ValueError("No layer selected")
+    
+    def insert_compare_mask_effect(self):
+        """Insert compare mask effect using official API"""
+        selected_nodes = self.context.selection
         
-        # Refresh to show new macro
-        self.refresh_commands()
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if layer.has_mask():
+                insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
+                effect = insert_compare_mask_effect(insert_position)
+                effect.set_name("Compare Mask")
+            else:
+                raise ValueError("Layer needs a mask for compare mask effect")
+        else:
+            raise ValueError("No layer selected")
     
-    def on_single_click(self, item):
-        """Handle single-click for macro creation"""
-        if self.macro_creation_mode:
-            command = item.text()
+    def insert_filter_effect(self):
+        """Insert filter effect using official API - context aware"""
+        context = self.context
+        selected_nodes = context.selection
+        
+        if selected_nodes:
+            layer = selected_nodes[0]
             
-            # Skip macro items themselves
-            if command.startswith("[MACRO]"):
-                return
+            # Check selection context to determine where to insert
+            selection_type = context.selection_type(layer)
             
-            # Toggle selection
-            if command in self.selected_commands:
-                self.selected_commands.remove(command)
-                # Remove visual feedback
-                item.setForeground(QtGui.QBrush(QtCore.Qt.GlobalColor.white))
+            if selection_type == SelectionType.Mask and layer.has_mask():
+                # Insert into mask stack
+                insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
+                context_name = "mask"
+            else:
+                # Insert into content stack
+                insert_position = InsertPosition.inside_node(layer, NodeStack.Content)
+                context_name = "content"
+            
+            effect = insert_filter_effect(insert_position)
+            effect.set_name(f"Filter ({context_name})")
+            substance_painter.logging.info(f"Inserted filter effect into {context_name} stack")
+        else:
+            raise ValueError("No layer selected")
+    
+    def insert_generator_effect(self):
+        """Insert generator effect using official API - context aware"""
+        context = self.context
+        selected_nodes = context.selection
+        
+        if selected_nodes:
+            layer = selected_nodes[0]
+            
+            # Check selection context to determine where to insert
+            selection_type = context.selection_type(layer)
+            
+            if selection_type == SelectionType.Mask and layer.has_mask():
+                # Insert into mask stack
+                insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
+                context_name = "mask"
             else:
-                self.selected_commands.append(command)
-                # Add visual feedback (golden yellow)
-                item.setForeground(QtGui.QBrush(QtGui.QColor(255, 215, 0)))
+                # Insert into content stack
+                insert_position = InsertPosition.inside_node(layer, NodeStack.Content)
+                context_name = "content"
             
-            self.status_label.setText(f"Macro Mode: {len(self.selected_commands)} commands selected")
+            effect = insert_generator_effect(insert_position)
+            effect.set_name(f"Generator ({context_name})")
+            substance_painter.logging.info(f"Inserted generator effect into {context_name} stack")
+        else:
+            raise ValueError("No layer selected")
     
-    def show_context_menu(self, position):
-        """Show right-click context menu"""
-        item = self.results_list.itemAt(position)
-        if not item:
-            return
-            
-        menu = QtWidgets.QMenu(self)
-        command = item.text()
+    def insert_anchor_point_effect(self):
+        """Insert anchor point effect using official API - context aware"""
+        context = self.context
+        selected_nodes = context.selection
         
-        if command.startswith("[MACRO]"):
-            # Context menu for existing macros
-            macro_display = command[7:].strip()  # Remove "[MACRO] " prefix
-            
-            # Extract actual macro name (remove hotkey suffix if present)
-            if '(' in macro_display and macro_display.endswith(')'):
-                macro_name = macro_display.rsplit(' (', 1)[0].strip()
-            else:
-                macro_name = macro_display
+        if selected_nodes:
+            layer = selected_nodes[0]
             
-            execute_action = menu.addAction("Execute Macro")
-            execute_action.triggered.connect(lambda: self.execute_macro(macro_name))
+            # Check selection context to determine where to insert
+            selection_type = context.selection_type(layer)
             
-            # Hotkey management
-            macro_data = self.macros.get(macro_name, {})
-            if 'hotkey' in macro_data:
-                remove_hotkey_action = menu.addAction(f"Remove Hotkey ({macro_data['hotkey']})")
-                remove_hotkey_action.triggered.connect(lambda: self.remove_macro_hotkey(macro_name))
+            if selection_type == SelectionType.Mask and layer.has_mask():
+                # Insert into mask stack
+                insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
+                context_name = "mask"
             else:
-                add_hotkey_action = menu.addAction("Add Hotkey")
-                add_hotkey_action.triggered.connect(lambda: self.add_macro_hotkey(macro_name))
+                # Insert into content stack
+                insert_position = InsertPosition.inside_node(layer, NodeStack.Content)
+                context_name = "content"
             
-            menu.addSeparator()
-            delete_action = menu.addAction("Delete Macro")
-            delete_action.triggered.connect(lambda: self.delete_macro(macro_name))
-        
+            effect = insert_anchor_point_effect(insert_position, "Anchor Point")
+            effect.set_name(f"Anchor Point ({context_name})")
+            substance_painter.logging.info(f"Inserted anchor point effect into {context_name} stack")
         else:
-            # Context menu for regular commands
-            if not self.macro_creation_mode:
-                create_action = menu.addAction("Create Macro from this Command")
-                create_action.triggered.connect(lambda: self.create_single_command_macro(command))
-        
-        menu.exec(self.results_list.mapToGlobal(position))
-    
-    def create_single_command_macro(self, command):
-        """Create a macro from a single command using advanced dialog"""
-        dialog = MacroCreationDialog(self, [command])
-        if dialog.exec() == QtWidgets.QDialog.DialogCode.Accepted:
-            name = dialog.get_macro_name()
-            hotkey = dialog.get_hotkey()
-            if name:
-                # Check hotkey conflicts
-                if hotkey and self.is_hotkey_conflict(hotkey, name):
-                    return
-                
-                # Save macro
-                macro_data = {'commands': [command]}
-                if hotkey:
-                    macro_data['hotkey'] = hotkey
-                
-                self.macros[name] = macro_data
-                self.save_macros()
-                
-                # Register hotkey if provided
-                if hotkey:
-                    self.register_macro_hotkey(name, hotkey)
-                
-                hotkey_text = f" with hotkey {hotkey}" if hotkey else ""
-                self.status_label.setText(f"Created macro '{name}'{hotkey_text} with 1 command")
-                self.refresh_commands()
+            raise ValueError("No layer selected")
     
-    def execute_macro(self, name):
-        """Execute a macro by running all its commands in sequence"""
-        if name not in self.macros:
-            substance_painter.logging.error(f"Macro '{name}' not found")
-            return False
-        
-        macro = self.macros[name]
-        commands = macro['commands']
-        substance_painter.logging.info(f"Executing macro '{name}' with {len(commands)} commands")
-        
-        success_count = 0
-        failed_commands = []
-        
-        for i, command in enumerate(commands):
-            try:
-                substance_painter.logging.info(f"  [{i+1}/{len(commands)}] {command}")
-                
-                # Find and execute the command
-                if command.startswith("[PROC]"):
-                    # Handle procedural command
-                    success = self.execute_procedural_from_command(command)
-                else:
-                    # Handle regular command
-                    success = self.execute_single_command(command)
-                
-                if success:
-                    success_count += 1
-                else:
-                    failed_commands.append(command)
-                    
-            except Exception as e:
-                failed_commands.append(command)
-                substance_painter.logging.error(f"    Error: {e}")
+    def insert_color_selection_effect(self):
+        """Insert color selection effect using official API"""
+        selected_nodes = self.context.selection
         
-        # Report results
-        if failed_commands:
-            self.status_label.setText(f"Macro '{name}': {success_count}/{len(commands)} succeeded")
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if layer.has_mask():
+                insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
+                effect = insert_color_selection_effect(insert_position)
+                effect.set_name("Color Selection")
+            else:
+                raise ValueError("Layer needs a mask for color selection effect")
         else:
-            self.status_label.setText(f"Macro '{name}': All {len(commands)} commands succeeded")
-        
-        return len(failed_commands) == 0
+            raise ValueError("No layer selected")
+    
+    # === MASK OPERATIONS ===
+    def get_selected_nodes(self):
+        """Get currently selected layer nodes of the execution context's stack"""
+        try:
+            return self.context.selection
+        except Exception:
+            return []
     
-    def execute_single_command(self, command):
-        """Execute a single command (used by macro execution)"""
+    def add_layer_mask(self):
+        """Add mask to selected layer using real API"""
         try:
-            # Create a temporary list item to use existing execute logic
-            temp_item = QtWidgets.QListWidgetItem(command)
-            
-            # For procedural commands, we need to set the user data
-            if command.startswith("[PROC]"):
-                proc_name = command[7:].strip()
-                # Find the procedural in our list
-                for proc in self.get_procedural_resources():
-                    if proc['name'] == proc_name:
-                        temp_item.setData(QtCore.Qt.UserRole, proc)
-                        break
-            
-            self.on_item_double_clicked(temp_item)
+            selected = self.get_selected_nodes()
+            if not selected:
+                raise ValueError("No layer selected")
+            
+            layer = selected[0]
+            if layer.has_mask():
+                raise ValueError("Layer already has a mask")
+            
+            # Add mask with white background (default)
+            layer.add_mask(MaskBackground.White)
+            
+            # Switch selection context to the mask for subsequent macro commands
+            self.context.set_selection_type(layer, SelectionType.Mask)
+            substance_painter.logging.info("Added layer mask and switched to mask context")
             return True
+            
         except Exception as e:
-            substance_painter.logging.error(f"Failed to execute command '{command}': {e}")
-            return False
+            raise ValueError(f"Error adding layer mask: {e}")
     
-    def execute_procedural_from_command(self, command):
-        """Execute a procedural command from a macro"""
+    def remove_layer_mask(self):
+        """Remove mask from selected layer using official API"""
         try:
-            proc_name = command[7:].strip()  # Remove "[PROC] " prefix
-            # Find the matching procedural resource
-            for proc in self.get_procedural_resources():
-                if proc['name'] == proc_name:
-                    result = self.apply_procedural(proc)
-                    return True
-            return False
+            selected = self.get_selected_nodes()
+            if not selected:
+                raise ValueError("No layer selected")
+            
+            layer = selected[0]
+            if not layer.has_mask():
+                raise ValueError("Layer has no mask to remove")
+            
+            layer.remove_mask()
+            # A mask selection doesn't survive its mask; ask the host again next time
+            self.context.forget_selection_type(layer)
+            substance_painter.logging.info("Removed layer mask")
+            return True
+            
         except Exception as e:
-            substance_painter.logging.error(f"Failed to execute procedural '{command}': {e}")
-            return False
+            raise ValueError(f"Error removing layer mask: {e}")
     
-    def delete_macro(self, name):
-        """Delete a macro"""
-        reply = QtWidgets.QMessageBox.question(
-            self, "Delete Macro", 
-            f"Are you sure you want to delete macro '{name}'?",
-            QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
-        )
+    def toggle_mask(self):
+        """Toggle mask enable/disable using official API"""
+        selected_nodes = self.context.selection
         
-        if reply == QtWidgets.QMessageBox.StandardButton.Yes:
-            if name in self.macros:
-                # Unregister hotkey if it exists
-                self.unregister_macro_hotkey(name)
-                del self.macros[name]
-                self.save_macros()
-                self.status_label.setText(f"Deleted macro '{name}'")
-                self.refresh_commands()
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if hasattr(layer, 'is_mask_enabled') and layer.has_mask():
+                current_state = layer.is_mask_enabled()
+                layer.enable_mask(not current_state)
+            else:
+                raise ValueError("Layer has no mask to toggle")
+        else:
+            raise ValueError("No layer selected")
     
-    def add_macro_hotkey(self, macro_name):
-        """Add a hotkey to an existing macro"""
-        # Simple hotkey input dialog
-        hotkey, ok = QtWidgets.QInputDialog.getText(
-            self, "Add Hotkey", 
-            f"Enter hotkey for macro '{macro_name}':\n" +
-            "(Examples: F5, Ctrl+Shift+W, Alt+Q)"
-        )
-        
-        if ok and hotkey.strip():
-            hotkey = hotkey.strip()
-            if self.is_hotkey_conflict(hotkey, macro_name):
-                return
-            
-            # Add hotkey to macro
-            self.macros[macro_name]['hotkey'] = hotkey
-            self.save_macros()
-            self.register_macro_hotkey(macro_name, hotkey)
-            
-            self.status_label.setText(f"Added hotkey '{hotkey}' to macro '{macro_name}'")
-            self.refresh_commands()
+    def enable_layer_mask(self):
+        """Enable the mask of the selected layer using official API"""
+        self._set_mask_enabled(True)
     
-    def remove_macro_hotkey(self, macro_name):
-        """Remove a hotkey from a macro"""
-        reply = QtWidgets.QMessageBox.question(
-            self, "Remove Hotkey", 
-            f"Remove hotkey from macro '{macro_name}'?",
-            QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
-        )
+    def disable_layer_mask(self):
+        """Disable the mask of the selected layer using official API"""
+        self._set_mask_enabled(False)
+    
+    def _set_mask_enabled(self, enabled):
+        """Set the mask enabled state of the selected layer"""
+        selected_nodes = self.context.selection
         
-        if reply == QtWidgets.QMessageBox.StandardButton.Yes:
-            if macro_name in self.macros and 'hotkey' in self.macros[macro_name]:
-                self.unregister_macro_hotkey(macro_name)
-                del self.macros[macro_name]['hotkey']
-                self.save_macros()
-                self.refresh_commands()
-                self.status_label.setText(f"Removed hotkey for '{macro_name}'")
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if hasattr(layer, 'enable_mask') and layer.has_mask():
+                layer.enable_mask(enabled)
+            else:
+                raise ValueError("Layer has no mask")
+        else:
+            raise ValueError("No layer selected")
     
-    # ---- End Macro System ----
+    def set_mask_black(self):
+        """Set mask background to black using official API"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if hasattr(layer, 'set_mask_background') and layer.has_mask():
+                layer.set_mask_background(MaskBackground.Black)
+            else:
+                raise ValueError("Layer has no mask")
+        else:
+            raise ValueError("No layer selected")
     
-    def refresh_procedurals(self):
-        """Refresh procedural resources on demand"""
-        try:
-            self.status_label.setText("Refreshing procedural resources...")
-            # Force a fresh reload of procedurals
-            self.procedurals_loaded = False
-            self.procedurals_cache = []
-            
-            # Refresh the command list which will reload procedurals
-            self.refresh_commands(force_reload_procedurals=True)
-            
-            # Update button text temporarily to show success
-            original_text = self.refresh_procedurals_button.text()
-            self.refresh_procedurals_button.setText("✓ Refreshed!")
-            
-            # Timer to reset button text
-            QtCore.QTimer.singleShot(2000, lambda: self.refresh_procedurals_button.setText(original_text))
-            
-            substance_painter.logging.info("Commander: Manual procedural refresh completed")
-            
-        except Exception as e:
-            self.status_label.setText(f"Error refreshing procedurals: {str(e)}")
-            substance_painter.logging.error(f"Commander: Error during manual procedural refresh: {e}")
+    def set_mask_white(self):
+        """Set mask background to white using official API"""
+        selected_nodes = self.context.selection
+        
+        if selected_nodes:
+            layer = selected_nodes[0]
+            if hasattr(layer, 'set_mask_background') and layer.has_mask():
+                layer.set_mask_background(MaskBackground.White)
+            else:
+                raise ValueError("Layer has no mask")
+        else:
+            raise ValueError("No layer selected")
     
-    # ---- End Procedural System ----
+    # === SELECTION & DELETION ===
+    def delete_selected(self):
+        """Delete selected nodes using official API"""
+        context = self.context
+        selected_nodes = context.selection
+        
+        if selected_nodes:
+            for node in selected_nodes:
+                delete_node(node)
+            context.invalidate_selection()
+        else:
+            raise ValueError("No nodes selected")
     
-    def set_layer_opacity(self):
-        """Set opacity for all selected layers using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def select_content(self):
+        """Select layer content using official API"""
+        context = self.context
+        selected_nodes = context.selection
         
         if selected_nodes:
-            # Get current opacity from first layer for default value
-            first_layer = selected_nodes[0]
-            if first_layer.has_blending():
-                # Get current opacity from first layer
-                if first_layer.is_in_mask_stack():
-                    current_opacity = first_layer.get_opacity()
-                else:
-                    current_opacity = first_layer.get_opacity(ChannelType.BaseColor)
-                
-                # Show count of selected layers in dialog
-                layer_count = len(selected_nodes)
-                dialog_title = f"Set Layer Opacity ({layer_count} layer{'s' if layer_count > 1 else ''} selected)"
-                
-                # Prompt user for opacity
-                opacity, ok = QtWidgets.QInputDialog.getDouble(
-                    self, dialog_title, f"Enter opacity (0.0 - 1.0) for {layer_count} layer{'s' if layer_count > 1 else ''}:",
-                    current_opacity, 0.0, 1.0, 2
-                )
-                
-                if ok:
-                    # Apply to all selected layers
-                    success_count = 0
-                    skip_count = 0
-                    
-                    for layer in selected_nodes:
-                        if layer.has_blending():
-                            try:
-                                if layer.is_in_mask_stack():
-                                    layer.set_opacity(opacity)  # No channel needed for mask
-                                else:
-                                    # Apply to all major channels
-                                    channels = [ChannelType.BaseColor, ChannelType.Roughness, ChannelType.Normal, 
-                                               ChannelType.Metallic, ChannelType.Height]
-                                    for channel in channels:
-                                        try:
-                                            layer.set_opacity(opacity, channel)
-                                        except:
-                                            pass  # Skip channels that don't exist
-                                success_count += 1
-                            except Exception as e:
-                                substance_painter.logging.warning(f"Failed to set opacity for layer '{layer.get_name()}': {e}")
-                                skip_count += 1
-                        else:
-                            skip_count += 1
-                    
-                    # Log results
-                    if success_count > 0:
-                        substance_painter.logging.info(f"Set opacity to {opacity} for {success_count} layer{'s' if success_count != 1 else ''}")
-                    if skip_count > 0:
-                        substance_painter.logging.info(f"Skipped {skip_count} layer{'s' if skip_count != 1 else ''} (no blending support)")
-                    
-                    self.status_label.setText(f"Opacity: {opacity} → {success_count} layer{'s' if success_count != 1 else ''}")
-            else:
-                raise ValueError("First selected layer does not support opacity")
+            layer = selected_nodes[0]
+            context.set_selection_type(layer, SelectionType.Content)
         else:
-            raise ValueError("No layers selected")
+            raise ValueError("No layer selected")
     
-    def get_layer_opacity(self):
-        """Get opacity of selected layer using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def select_mask(self):
+        """Select layer mask using official API"""
+        context = self.context
+        selected_nodes = context.selection
         
         if selected_nodes:
             layer = selected_nodes[0]
-            if layer.has_blending():
-                if layer.is_in_mask_stack():
-                    opacity = layer.get_opacity()
-                    substance_painter.logging.info(f"Mask '{layer.get_name()}' opacity: {opacity}")
-                    self.status_label.setText(f"Mask opacity: {opacity}")
-                else:
-                    # For content layers, show BaseColor channel opacity as representative
-                    opacity = layer.get_opacity(ChannelType.BaseColor)
-                    substance_painter.logging.info(f"Layer '{layer.get_name()}' opacity (BaseColor): {opacity}")
-                    self.status_label.setText(f"Layer opacity: {opacity}")
+            if hasattr(layer, 'has_mask') and layer.has_mask():
+                context.set_selection_type(layer, SelectionType.Mask)
             else:
-                raise ValueError("Selected layer does not support opacity")
+                raise ValueError("Layer has no mask to select")
         else:
             raise ValueError("No layer selected")
     
-    def set_blend_mode(self):
-        """Set blend mode for all selected layers using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def select_properties(self):
+        """Select layer properties using official API"""
+        context = self.context
+        selected_nodes = context.selection
         
         if selected_nodes:
-            # Get current blend mode from first layer for default selection
-            first_layer = selected_nodes[0]
-            current_index = 0
-            if first_layer.has_blending():
-                # Get available blend modes
-                blend_modes = [
-                    "Normal", "PassThrough", "Disable", "Replace", "Multiply", "Divide", 
-                    "InverseDivide", "Darken", "Lighten", "LinearDodge", "Subtract", 
-                    "InverseSubtract", "Difference", "Exclusion", "SignedAddition", 
-                    "Overlay", "Screen", "LinearBurn", "ColorBurn", "ColorDodge", 
-                    "SoftLight", "HardLight", "VividLight", "LinearLight", "PinLight", 
-                    "Tint", "Saturation", "Color", "Value", "NormalMapCombine", 
-                    "NormalMapDetail", "NormalMapInverseDetail"
-                ]
+            layer = selected_nodes[0]
+            # Properties selection is only for instance layers
+            if hasattr(layer, 'instance_source'):
+                context.set_selection_type(layer, SelectionType.Properties)
+            else:
+                raise ValueError("Properties selection only available for instance layers")
+        else:
+            raise ValueError("No layer selected")
+
+    @PROFILER.timed("procedural")
+    def apply_procedural(self, procedural_data):
+        """Apply a procedural resource to a fill effect"""
+        try:
+            # Resolve the resource identifier from the catalog record
+            resource_id = procedural_data.resource_id
+            if not resource_id:
+                raise ValueError("No resource found in procedural data")
+            
+            # Get current selection and context
+            context = self.context
+            stack = context.stack
+            selected_nodes = context.selection
+            
+            # Determine insertion context
+            if selected_nodes:
+                layer = selected_nodes[0]
+                # Check selection type to determine context (mask vs content)
+                selection_type = context.selection_type(layer)
                 
-                # Get current blend mode from first layer
+                if selection_type == SelectionType.Mask:
+                    # Insert as fill effect in mask stack (grayscale)
+                    if not layer.has_mask():
+                        layer.add_mask(MaskBackground.Black)
+                    insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
+                    context_name = "mask"
+                else:
+                    # Insert as fill effect in content stack (roughness)
+                    insert_position = InsertPosition.inside_node(layer, NodeStack.Content)
+                    context_name = "content"
+            else:
+                # No selection - create at top of stack
+                insert_position = InsertPosition.from_textureset_stack(stack)
+                context_name = "content"
+            
+            # Create the fill effect
+            effect = insert_fill(insert_position)
+            effect.set_name(f"{procedural_data.name}")
+            set_source = PROFILER.wrap("host", "set_source", effect.set_source)
+            
+            # Apply the procedural resource to the effect
+            if context_name == "mask":
+                # For masks, set to grayscale channel (channel type = None)
+                set_source(None, resource_id)
+                substance_painter.logging.info(f"Commander: Applied procedural to mask (grayscale)")
+            else:
+                # For content, target Roughness channel with BaseColor fallback
+                # The correct signature is: set_source(channel_type, resource_id)
                 try:
-                    if first_layer.is_in_mask_stack():
-                        current_mode = first_layer.get_blending_mode()
-                    else:
-                        current_mode = first_layer.get_blending_mode(ChannelType.BaseColor)
-                    current_index = blend_modes.index(current_mode.name)
-                except:
-                    pass
-                
-                # Show count of selected layers in dialog
-                layer_count = len(selected_nodes)
-                dialog_title = f"Set Blend Mode ({layer_count} layer{'s' if layer_count > 1 else ''} selected)"
-                
-                # Prompt user for blend mode
-                blend_mode_name, ok = QtWidgets.QInputDialog.getItem(
-                    self, dialog_title, f"Select blend mode to apply to {layer_count} layer{'s' if layer_count > 1 else ''}:",
-                    blend_modes, current_index, False
-                )
-                
-                if ok and blend_mode_name:
-                    # Convert string to BlendingMode enum
-                    blend_mode = getattr(BlendingMode, blend_mode_name)
-                    
-                    # Apply to all selected layers
-                    success_count = 0
-                    skip_count = 0
-                    
-                    for layer in selected_nodes:
-                        if layer.has_blending():
-                            try:
-                                if layer.is_in_mask_stack():
-                                    layer.set_blending_mode(blend_mode)  # No channel needed for mask
-                                else:
-                                    # Apply to all major channels
-                                    channels = [ChannelType.BaseColor, ChannelType.Roughness, ChannelType.Normal, 
-                                               ChannelType.Metallic, ChannelType.Height]
-                                    for channel in channels:
-                                        try:
-                                            layer.set_blending_mode(blend_mode, channel)
-                                        except:
-                                            pass  # Skip channels that don't exist
-                                success_count += 1
-                            except Exception as e:
-                                substance_painter.logging.warning(f"Failed to set blend mode for layer '{layer.get_name()}': {e}")
-                                skip_count += 1
-                        else:
-                            skip_count += 1
-                    
-                    # Log results
-                    if success_count > 0:
-                        substance_painter.logging.info(f"Set blend mode to {blend_mode_name} for {success_count} layer{'s' if success_count != 1 else ''}")
-                    if skip_count > 0:
-                        substance_painter.logging.info(f"Skipped {skip_count} layer{'s' if skip_count != 1 else ''} (no blending support)")
-                    
-                    self.status_label.setText(f"Blend mode: {blend_mode_name} → {success_count} layer{'s' if success_count != 1 else ''}")
+                    # Try to set source to Roughness channel - CHANNEL TYPE FIRST!
+                    set_source(ChannelType.Roughness, resource_id)
+                    substance_painter.logging.info(f"Commander: Applied to Roughness channel")
+                except Exception as e:
+                    # Fallback to BaseColor if Roughness fails
+                    try:
+                        set_source(ChannelType.BaseColor, resource_id)
+                        substance_painter.logging.info(f"Commander: Applied to BaseColor channel")
+                    except Exception as fallback_error:
+                        # Final fallback - no channel specification
+                        set_source(resource_id)
+                        substance_painter.logging.info(f"Commander: Applied to default channel")
+            
+            return f"✓ Applied procedural '{procedural_data.name}' as fill effect in {context_name}"
+            
+        except Exception as e:
+            raise ValueError(f"Failed to apply procedural: {e}")
+
+def iter_project_files(path):
+    """Yield .spp project paths under a folder (recursively, sorted per folder) without listing them all up front"""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.lower().endswith(".spp"):
+                yield os.path.join(root, filename)
+
+class MacroRunner(LayerCommands):
+    """Runs saved macros without the Commander dock, for pipeline scripts and batch jobs.
+    
+        runner = MacroRunner()
+        for result in runner.run("Base Setup", texture_sets=["Body", "Head"]):
+            print(result['target'], result['succeeded'], result['failed'], result['error'])
+    
+    Steps that need interactive input (opacity, rename, ...) fail instead of prompting.
+    """
+    
+    def __init__(self, macros_file=None):
+        super().__init__()
+        self.macros_file = macros_file or commander_data_file("commander_macros.json")
+        self.macros = {}
+        self.compiled_macros = {}  # macro name -> [(command, step callable)]
+        self.load_macros()
+    
+    def load_macros(self):
+        """(Re)load macros from the macros file"""
+        self.compiled_macros = {}
+        self.macros = read_macros_file(self.macros_file)[0]
+        substance_painter.logging.info(f"Commander: MacroRunner loaded {len(self.macros)} macros from {self.macros_file}")
+    
+    def macro_names(self):
+        """Names of the loaded macros"""
+        return sorted(self.macros)
+    
+    def compile_macro(self, name):
+        """Resolve a macro's steps once; raises ValueError for an unknown macro"""
+        if name not in self.macros:
+            raise ValueError(f"Macro '{name}' not found in {self.macros_file}")
+        steps = self.compile_macro_steps(self.macros[name]['commands'])
+        self.compiled_macros[name] = steps
+        return steps
+    
+    def run(self, name, texture_sets=None):
+        """Run a macro in the open project and return one result dict per stack it ran on.
+        
+        texture_sets: None for the active stack, a list of texture set names, or a
+        name pattern (e.g. "*_body"); every stack of each matching set is processed.
+        Result keys: macro, target, steps, succeeded, failed (step labels), error.
+        """
+        if not substance_painter.project.is_open():
+            raise ValueError("No project open")
+        steps = self.compiled_macros.get(name) or self.compile_macro(name)
+        
+        outcomes = []
+        def action():
+            outcome = {'macro': name, 'steps': len(steps), 'succeeded': 0, 'failed': [], 'error': None}
+            outcomes.append(outcome)
+            outcome['succeeded'], outcome['failed'] = self.run_macro_steps(name, steps)
+        
+        if texture_sets is None:
+            stack = substance_painter.textureset.get_active_stack()
+            with self._modification_scope(f"macro '{name}'"):
+                with self.execution_context(stack):
+                    action()
+            outcomes[0]['target'] = stack.material().name()
+            return outcomes
+        
+        # run_on_texture_sets calls action() once per reported target, in order
+        targets = self.run_on_texture_sets(f"macro '{name}'", action, texture_sets)
+        for outcome, (target, error) in zip(outcomes, targets):
+            outcome['target'] = target
+            outcome['error'] = error
+        return outcomes
+    
+    def run_on_project(self, project_path, name, texture_sets=None, save=True, on_done=None, save_on_failure=False):
+        """Open a project, run a macro once the host has finished loading it, save and close it.
+        
+        The host loads projects asynchronously, so the outcome is passed to
+        on_done({'project', 'results', 'error', 'saved'}) rather than returned.
+        A run with failed steps or errors is closed without saving (so the file
+        on disk is left as it was) unless save_on_failure is set.
+        A project already open is closed first, unless it has unsaved changes.
+        """
+        if substance_painter.project.is_open():
+            if substance_painter.project.needs_saving():
+                raise ValueError("The open project has unsaved changes")
+            substance_painter.project.close()
+        substance_painter.project.open(project_path)
+        
+        def run_when_loaded():
+            outcome = {'project': project_path, 'results': [], 'error': None, 'saved': False}
+            try:
+                outcome['results'] = self.run(name, texture_sets)
+                failed = any(result['failed'] or result['error'] for result in outcome['results'])
+                if save and failed and not save_on_failure:
+                    substance_painter.logging.warning(f"Commander: Macro '{name}' failed on {project_path} - closing without saving")
+                elif save:
+                    substance_painter.project.save()
+                    outcome['saved'] = True
+            except Exception as e:
+                outcome['error'] = str(e)
+                substance_painter.logging.error(f"Commander: Macro '{name}' failed on {project_path}: {e}")
+            try:
+                substance_painter.project.close()
+            except Exception as e:
+                # Still report the outcome, so a batch moves on to its next project
+                outcome['error'] = outcome['error'] or f"Could not close project: {e}"
+                substance_painter.logging.error(f"Commander: Could not close {project_path}: {e}")
+            if on_done is not None:
+                on_done(outcome)
+        
+        substance_painter.project.execute_when_not_busy(run_when_loaded)
+    
+    def run_batch(self, projects, name, texture_sets=None, save=True, on_project=None, on_finished=None,
+                  save_on_failure=False):
+        """Apply a macro to many projects, one at a time: open, run, save, close, next.
+        
+        projects: a folder (searched for .spp files) or any iterable of project paths.
+        Projects are pulled from it as the previous one finishes, and only failed
+        projects are kept, so memory doesn't grow with the size of the batch.
+        on_project gets each project's outcome (run_on_project's, plus 'seconds');
+        on_finished gets {'macro', 'projects', 'failed', 'seconds'} at the end.
+        Failed projects are left unsaved unless save_on_failure is set.
+        Raises ValueError for an unknown macro before any project is opened.
+        """
+        self.compile_macro(name)
+        pending = iter_project_files(projects) if isinstance(projects, str) else iter(projects)
+        summary = {'macro': name, 'projects': 0, 'failed': [], 'seconds': 0.0}
+        batch_start = time.perf_counter()
+        
+        def project_done(outcome, started):
+            outcome['seconds'] = time.perf_counter() - started
+            summary['projects'] += 1
+            step_failures = sum(len(result['failed']) for result in outcome['results'])
+            if outcome['error'] or step_failures or any(result['error'] for result in outcome['results']):
+                summary['failed'].append(outcome)
+                substance_painter.logging.warning(
+                    f"Commander: [{summary['projects']}] {outcome['project']}: ✗ {outcome['error'] or f'{step_failures} failed steps'} ({outcome['seconds']:.1f}s)")
             else:
-                raise ValueError("First selected layer does not support blending")
-        else:
-            raise ValueError("No layers selected")
+                substance_painter.logging.info(f"Commander: [{summary['projects']}] {outcome['project']}: ✓ ({outcome['seconds']:.1f}s)")
+            if on_project is not None:
+                on_project(outcome)
+            # Start the next project from the event loop, not from inside this callback chain
+            QtCore.QTimer.singleShot(0, next_project)
+        
+        def next_project():
+            project_path = next(pending, None)
+            if project_path is None:
+                summary['seconds'] = time.perf_counter() - batch_start
+                substance_painter.logging.info(
+                    f"Commander: Batch '{name}' done: {summary['projects'] - len(summary['failed'])}/{summary['projects']} projects succeeded in {summary['seconds']:.1f}s")
+                if on_finished is not None:
+                    on_finished(summary)
+                return
+            started = time.perf_counter()
+            try:
+                self.run_on_project(project_path, name, texture_sets, save, lambda outcome: project_done(outcome, started),
+                                    save_on_failure)
+            except Exception as e:
+                # Could not even open it; record and move on
+                project_done({'project': project_path, 'results': [], 'error': str(e), 'saved': False}, started)
+        
+        next_project()
+
+class CommanderWidget(QtWidgets.QWidget, LayerCommands):
+    """Stable dock widget - no crashes!"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        
+        # Set required properties for dock widget
+        self.setObjectName("CommanderWidget") 
+        self.setWindowTitle("Commander")
+        self.ui_built = False  # palette UI is built on first show (see build_ui)
+        
+        # Execution context and command handlers (see LayerCommands)
+        LayerCommands.__init__(self)
+        
+        # Macro system and settings (macro hotkeys work before the UI exists)
+        self.macro_creation_mode = False
+        self.selected_commands = []
+        self.macros = {}
+        self.compiled_macros = {}  # macro name -> [(command, step callable)]
+        self.macros_file = self._get_macros_file_path()
+        self.macros_load_error = None  # set when the macros file couldn't be read; saving is refused then
+        self.persistence = PersistenceWriter(parent=self)  # debounced background saves
+        self.hotkey_router = HotkeyRouter(self)  # macro hotkeys (register_macro_hotkey)
+        self.hotkey_router.activated.connect(self.execute_macro_by_name)
+        self.hotkey_router.install()
+        self.load_macros()
+        
+        # Procedural catalog: set up by the palette or the first macro that needs it
+        self.procedural_loader = None
+        self.last_project_state = None
+        
+        # Initialize settings system
+        self.settings = self.load_settings()
+        self.settings_file = self._get_settings_file_path()  # Store for easy access
     
-    def get_blend_mode(self):
-        """Get blend mode of selected layer using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def build_ui(self):
+        """Build the palette: widgets, command list (with the procedural catalog) and project monitoring (once)"""
+        if self.ui_built:
+            return
+        # Set first: the build's own list refresh and loader callbacks update the widgets it creates
+        self.ui_built = True
+        try:
+            self._build_ui()
+        except Exception:
+            # Leave nothing half-built, so the next show can try again from scratch
+            self._discard_ui()
+            raise
+    
+    def _build_ui(self):
+        """The steps of build_ui"""
+        with timed_phase("widgets"):
+            self._build_widgets()
+        
+        with timed_phase("procedural catalog"):
+            self.ensure_procedural_catalog()
+        
+        with timed_phase("command list"):
+            # Search index over the model entries (rebuilt by refresh_commands)
+            self.search_index = CommandSearchIndex()
+            # Ranks the rest of a capped search on the next event loop turns
+            self.search_timer = QtCore.QTimer(self)
+            self.search_timer.setSingleShot(True)
+            self.search_timer.setInterval(0)
+            self.search_timer.timeout.connect(self.score_pending_results)
+            self.macro_entries = {}  # macro name -> model entry id
+            self.refresh_commands()
+        
+        # A catalog loaded from disk is shown immediately; rescan only if shelves changed.
+        # The project state is recorded first so monitoring's initial check doesn't revalidate again.
+        try:
+            self.last_project_state = substance_painter.project.is_open()
+        except Exception:
+            pass
+        if self.procedurals_loaded:
+            self.revalidate_procedural_catalog()
+        
+        # Start project monitoring for automatic procedural loading
+        with timed_phase("project monitoring"):
+            self.start_project_monitoring()
+        
+        if self.macros_load_error is not None:
+            self.report(f"⚠ Macros file couldn't be loaded - changes to macros won't be saved ({self.macros_load_error})")
+    
+    def _discard_ui(self):
+        """Undo a failed build_ui: stop monitoring and drop the widgets and layout it created"""
+        self.ui_built = False
+        self.stop_project_monitoring()
+        if getattr(self, 'search_timer', None):
+            self.search_timer.stop()
+        layout = self.layout()
+        if layout is not None:
+            QtWidgets.QWidget().setLayout(layout)  # a layout can only be dropped by handing it to another widget
+        for child in self.findChildren(QtWidgets.QWidget, options=QtCore.Qt.FindChildOption.FindDirectChildrenOnly):
+            child.setParent(None)
+            child.deleteLater()
+    
+    def _build_widgets(self):
+        """Create the palette's child widgets and connect them"""
+        # Simple layout
+        layout = QtWidgets.QVBoxLayout()
+        
+        # Search input
+        self.search_input = QtWidgets.QLineEdit()
+        self.search_input.setPlaceholderText("Search commands and procedurals...")
+        layout.addWidget(self.search_input)
+        
+        # Results list (model/view - rows are drawn from flat arrays on demand)
+        self.results_model = CommandListModel(self)
+        self.results_list = QtWidgets.QListView()
+        self.results_list.setModel(self.results_model)
+        self.results_list.setUniformItemSizes(True)
+        self.results_list.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.results_list)
+        
+        # Macro controls
+        macro_layout = QtWidgets.QHBoxLayout()
+        
+        self.create_macro_button = QtWidgets.QPushButton("Create Macro")
+        self.create_macro_button.clicked.connect(self.start_macro_creation)
+        macro_layout.addWidget(self.create_macro_button)
+        
+        self.cancel_macro_button = QtWidgets.QPushButton("Cancel")
+        self.cancel_macro_button.clicked.connect(self.cancel_macro_creation)
+        self.cancel_macro_button.setVisible(False)
+        macro_layout.addWidget(self.cancel_macro_button)
+        
+        layout.addLayout(macro_layout)
+        
+        # Procedural refresh controls
+        procedural_layout = QtWidgets.QHBoxLayout()
+        
+        self.refresh_procedurals_button = QtWidgets.QPushButton("Refresh Procedurals")
+        self.refresh_procedurals_button.clicked.connect(self.refresh_procedurals)
+        self.refresh_procedurals_button.setToolTip("Reload procedural resources from Substance Painter")
+        procedural_layout.addWidget(self.refresh_procedurals_button)
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if layer.has_blending():
-                if layer.is_in_mask_stack():
-                    blend_mode = layer.get_blending_mode()
-                    substance_painter.logging.info(f"Mask '{layer.get_name()}' blend mode: {blend_mode.name}")
-                    self.status_label.setText(f"Mask blend mode: {blend_mode.name}")
-                else:
-                    # For content layers, show BaseColor channel blend mode as representative
-                    blend_mode = layer.get_blending_mode(ChannelType.BaseColor)
-                    substance_painter.logging.info(f"Layer '{layer.get_name()}' blend mode (BaseColor): {blend_mode.name}")
-                    self.status_label.setText(f"Layer blend mode: {blend_mode.name}")
-            else:
-                raise ValueError("Selected layer does not support blending")
-        else:
-            raise ValueError("No layer selected")
-    
-    def rename_selected_layer(self):
-        """Rename the selected layer using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+        self.settings_button = QtWidgets.QPushButton("Settings")
+        self.settings_button.clicked.connect(self.open_settings)
+        self.settings_button.setToolTip("Configure Commander settings including keyboard shortcuts")
+        procedural_layout.addWidget(self.settings_button)
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            current_name = layer.get_name()
-            
-            # Prompt user for new name
-            new_name, ok = QtWidgets.QInputDialog.getText(
-                self, "Rename Layer", "Enter new layer name:",
-                QtWidgets.QLineEdit.EchoMode.Normal, current_name
-            )
-            
-            if ok and new_name.strip():
-                layer.set_name(new_name.strip())
-                substance_painter.logging.info(f"Renamed layer from '{current_name}' to '{new_name.strip()}'")
-                self.status_label.setText(f"Renamed layer to: {new_name.strip()}")
-        else:
-            raise ValueError("No layer selected")
-    
-    def toggle_layer_visibility(self):
-        """Toggle visibility of all selected layers using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+        layout.addLayout(procedural_layout)
         
-        if selected_nodes:
-            layer_count = len(selected_nodes)
-            
-            # Determine action based on first layer's visibility
-            first_layer_visible = selected_nodes[0].is_visible()
-            new_visibility = not first_layer_visible
-            
-            # Apply to all selected layers
-            for layer in selected_nodes:
-                layer.set_visible(new_visibility)
-            
-            status = "visible" if new_visibility else "hidden"
-            substance_painter.logging.info(f"Set {layer_count} layer{'s' if layer_count != 1 else ''} to {status}")
-            self.status_label.setText(f"{layer_count} layer{'s' if layer_count != 1 else ''} {status}")
-        else:
-            raise ValueError("No layers selected")
-    
-    def show_layer(self):
-        """Show all selected layers using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+        # Status label
+        self.status_label = QtWidgets.QLabel("Ready")
+        layout.addWidget(self.status_label)
         
-        if selected_nodes:
-            layer_count = len(selected_nodes)
-            
-            # Apply to all selected layers
-            for layer in selected_nodes:
-                layer.set_visible(True)
-            
-            substance_painter.logging.info(f"Showed {layer_count} layer{'s' if layer_count != 1 else ''}")
-            self.status_label.setText(f"{layer_count} layer{'s' if layer_count != 1 else ''} shown")
-        else:
-            raise ValueError("No layers selected")
+        self.setLayout(layout)
+        
+        # Connect events
+        self.search_input.textChanged.connect(self.on_search_changed)
+        self.results_list.doubleClicked.connect(self.on_item_double_clicked)
+        self.results_list.clicked.connect(self.on_single_click)
+        
+        # Install event filter on search input to capture arrow keys
+        self.search_input.installEventFilter(self)
+        
+        # Context menu
+        self.results_list.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.results_list.customContextMenuRequested.connect(self.show_context_menu)
     
-    def hide_layer(self):
-        """Hide all selected layers using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def ensure_procedural_catalog(self):
+        """Set up procedural loading and the catalog cached by a previous session (once; needs no palette UI)"""
+        if self.procedural_loader is not None:
+            return
+        self.procedurals_loaded = False
+        self._set_procedural_cache([])
+        self.procedural_loader = ProceduralLoader(self)
+        self.procedural_loader.batch_loaded.connect(self.on_procedural_batch)
+        self.procedural_loader.progress.connect(self.on_procedural_progress)
+        self.procedural_loader.finished.connect(self.on_procedurals_finished)
+        self.catalog_file = self._get_catalog_file_path()
+        self.catalog_fingerprint = None  # shelves the current catalog was built from (see compute_shelf_fingerprint)
+        self._catalog_rescan = False  # running scan replaces the shown catalog when done
+        self.load_procedural_catalog()
+    
+    def eventFilter(self, obj, event):
+        """Event filter to intercept key events from search input"""
+        if obj == self.search_input and event.type() == QtCore.QEvent.Type.KeyPress:
+            key = event.key()
+            
+            if key == QtCore.Qt.Key_Down:
+                # Down arrow pressed in search field - jump to results
+                self._jump_to_results()
+                return True  # Event handled
+            elif key == QtCore.Qt.Key_Up:
+                # Up arrow in search field - also jump to results (last item)
+                self._jump_to_results(select_last=True)
+                return True  # Event handled
+            elif key == QtCore.Qt.Key_Return or key == QtCore.Qt.Key_Enter:
+                # Enter in search field - execute first (best matching) item
+                if self.results_model.rowCount() > 0:
+                    self.on_item_double_clicked(self.results_model.index(0))
+                return True  # Event handled
+                
+        # Pass the event to the parent class
+        return super().eventFilter(obj, event)
         
-        if selected_nodes:
-            layer_count = len(selected_nodes)
+    def keyPressEvent(self, event):
+        """Enhanced key press handler for results list navigation"""
+        key = event.key()
+        
+        if key == QtCore.Qt.Key_Escape:
+            # Hide dock on ESC
+            global DOCK_WIDGET
+            if DOCK_WIDGET:
+                DOCK_WIDGET.hide()
+                
+        elif key == QtCore.Qt.Key_Down and self.results_list.hasFocus():
+            # Arrow down in results - navigate to next item
+            self._navigate_results(1)
             
-            # Apply to all selected layers
-            for layer in selected_nodes:
-                layer.set_visible(False)
+        elif key == QtCore.Qt.Key_Up and self.results_list.hasFocus():
+            # Arrow up in results - navigate to previous item
+            self._navigate_results(-1)
+            
+        elif key == QtCore.Qt.Key_Return or key == QtCore.Qt.Key_Enter:
+            # Enter key - execute selected command
+            if self.results_list.hasFocus():
+                current_index = self.results_list.currentIndex()
+                if current_index.isValid():
+                    self.on_item_double_clicked(current_index)
             
-            substance_painter.logging.info(f"Hid {layer_count} layer{'s' if layer_count != 1 else ''}")
-            self.status_label.setText(f"{layer_count} layer{'s' if layer_count != 1 else ''} hidden")
         else:
-            raise ValueError("No layers selected")
+            # For any other key, make sure search input gets focus for typing
+            if not self.search_input.hasFocus() and event.text().isprintable():
+                self.search_input.setFocus()
+                # Re-send the key event to the search input
+                QtWidgets.QApplication.sendEvent(self.search_input, event)
+                return
+            super().keyPressEvent(event)
     
-    # Smart Material and Mask methods (placeholder implementations)
-    def create_smart_material(self):
-        """Create smart material from selected group - requires group layer selection"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def _navigate_results(self, direction):
+        """Navigate through the shown results (direction: 1 for down, -1 for up)"""
+        row_count = self.results_model.rowCount()
+        if row_count == 0:
+            return
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if hasattr(layer, 'get_type') and layer.get_type().name == 'GroupLayer':
-                # Prompt for name
-                name, ok = QtWidgets.QInputDialog.getText(
-                    self, "Create Smart Material", "Enter smart material name:"
-                )
-                if ok and name.strip():
-                    try:
-                        from substance_painter.layerstack import create_smart_material
-                        resource = create_smart_material(layer, name.strip())
-                        substance_painter.logging.info(f"Created smart material: {name.strip()}")
-                        self.status_label.setText(f"Created smart material: {name.strip()}")
-                    except Exception as e:
-                        raise ValueError(f"Failed to create smart material: {e}")
-                else:
-                    raise ValueError("Smart material name required")
-            else:
-                raise ValueError("Please select a group layer to create smart material")
+        # Move to next/previous row, wrapping around; start from first/last if none is current
+        current_index = self.results_list.currentIndex()
+        if current_index.isValid():
+            new_row = (current_index.row() + direction) % row_count
         else:
-            raise ValueError("No layer selected")
-    
-    def insert_smart_mask(self):
-        """Insert smart mask - requires smart mask resource selection"""
-        raise ValueError("Smart mask insertion requires resource selection (not implemented in minimal version)")
-    
-    def create_smart_mask(self):
-        """Create smart mask from selected layer's mask stack"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+            new_row = 0 if direction > 0 else row_count - 1
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if layer.has_mask():
-                # Prompt for name
-                name, ok = QtWidgets.QInputDialog.getText(
-                    self, "Create Smart Mask", "Enter smart mask name:"
-                )
-                if ok and name.strip():
-                    try:
-                        from substance_painter.layerstack import create_smart_mask
-                        resource = create_smart_mask(layer, name.strip())
-                        substance_painter.logging.info(f"Created smart mask: {name.strip()}")
-                        self.status_label.setText(f"Created smart mask: {name.strip()}")
-                    except Exception as e:
-                        raise ValueError(f"Failed to create smart mask: {e}")
-                else:
-                    raise ValueError("Smart mask name required")
-            else:
-                raise ValueError("Selected layer must have a mask to create smart mask")
-        else:
-            raise ValueError("No layer selected")
-    
-    # Geometry mask methods
-    def set_geometry_mask_mesh(self):
-        """Set geometry mask to mesh mode and configure mesh selection"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+        # Select the new row and scroll to make sure it's visible
+        new_index = self.results_model.index(new_row)
+        self.results_list.setCurrentIndex(new_index)
+        self.results_list.scrollTo(new_index)
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if hasattr(layer, 'set_geometry_mask_type'):
-                from substance_painter.layerstack import GeometryMaskType
-                layer.set_geometry_mask_type(GeometryMaskType.Mesh)
-                substance_painter.logging.info("Set geometry mask to mesh mode")
-                self.status_label.setText("Geometry mask set to mesh mode")
-            else:
-                raise ValueError("Selected node does not support geometry masks")
-        else:
-            raise ValueError("No layer selected")
+        # Focus stays on results list for continued navigation
     
-    def set_geometry_mask_uv_tile(self):
-        """Set geometry mask to UV tile mode"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def _jump_to_results(self, select_last=False):
+        """Jump from search field to results list and select first/last shown item"""
+        row_count = self.results_model.rowCount()
+        if row_count == 0:
+            return
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if hasattr(layer, 'set_geometry_mask_type'):
-                from substance_painter.layerstack import GeometryMaskType
-                try:
-                    layer.set_geometry_mask_type(GeometryMaskType.UVTile)
-                    substance_painter.logging.info("Set geometry mask to UV tile mode")
-                    self.status_label.setText("Geometry mask set to UV tile mode")
-                except ValueError as e:
-                    raise ValueError("UV Tile mode not supported in this project")
-            else:
-                raise ValueError("Selected node does not support geometry masks")
-        else:
-            raise ValueError("No layer selected")
+        index = self.results_model.index(row_count - 1 if select_last else 0)
+        self.results_list.setCurrentIndex(index)
+        self.results_list.scrollTo(index)
+        self.results_list.setFocus()
     
-    def enable_geometry_mask(self):
-        """Enable geometry mask (basic implementation)"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
-        
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if hasattr(layer, 'set_geometry_mask_type'):
-                from substance_painter.layerstack import GeometryMaskType
-                layer.set_geometry_mask_type(GeometryMaskType.Mesh)  # Default to mesh
-                substance_painter.logging.info("Enabled geometry mask")
-                self.status_label.setText("Geometry mask enabled")
-            else:
-                raise ValueError("Selected node does not support geometry masks")
+    def select_first_result(self):
+        """Make the first shown result current (or clear the current row if none)"""
+        if self.results_model.rowCount() > 0:
+            first_index = self.results_model.index(0)
+            self.results_list.setCurrentIndex(first_index)
+            self.results_list.scrollTo(first_index)
         else:
-            raise ValueError("No layer selected")
+            self.results_list.setCurrentIndex(QtCore.QModelIndex())
     
-    # Projection methods
-    def set_projection_uv(self):
-        """Set projection mode to UV"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
-        
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if hasattr(layer, 'set_projection_mode'):
-                layer.set_projection_mode(ProjectionMode.UV)
-                substance_painter.logging.info("Set projection mode to UV")
-                self.status_label.setText("Projection: UV")
-            else:
-                raise ValueError("Selected layer does not support projection modes")
-        else:
-            raise ValueError("No layer selected")
     
-    def set_projection_triplanar(self):
-        """Set projection mode to Triplanar"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
-        
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if hasattr(layer, 'set_projection_mode'):
-                layer.set_projection_mode(ProjectionMode.Triplanar)
-                substance_painter.logging.info("Set projection mode to Triplanar")
-                self.status_label.setText("Projection: Triplanar")
-            else:
-                raise ValueError("Selected layer does not support projection modes")
+    # ---- Core Commander functionality ----
+    
+    @PROFILER.timed("list")
+    def refresh_commands(self, force_reload_procedurals=False):
+        """Populate the list with ALL available layer commands from API"""
+        commands = [descriptor.label for descriptor in COMMAND_REGISTRY]
+        
+        # Procedurals stream in from the background loader; show what is cached now
+        start_loading = force_reload_procedurals or (
+            not self.procedurals_loaded and not self.procedural_loader.is_running())
+        if start_loading:
+            self.procedural_loader.cancel()
+            self._catalog_rescan = False
+            self._set_procedural_cache([])
         else:
-            raise ValueError("No layer selected")
+            substance_painter.logging.info(f"Commander: Using cached procedural resources ({len(self.procedurals_cache)} items)")
+        procedurals = self.procedurals_cache
+        
+        # Flat entry arrays: macros FIRST (at the top), then commands, then procedurals
+        labels = []
+        kinds = []
+        payloads = []
+        
+        self.macro_entries = {}
+        for macro_name in self.macros:
+            self.macro_entries[macro_name] = len(labels)
+            labels.append(self._macro_label(macro_name))
+            kinds.append(CommandListModel.KIND_MACRO)
+            payloads.append(macro_name)
+        
+        labels.extend(commands)
+        kinds.extend([CommandListModel.KIND_COMMAND] * len(commands))
+        payloads.extend([descriptor.id for descriptor in COMMAND_REGISTRY])
+        
+        for procedural in procedurals:
+            labels.append(f"[PROC] {procedural.name}")
+            kinds.append(CommandListModel.KIND_PROCEDURAL)
+            # Store the resource data for later use
+            payloads.append(procedural)
+        
+        # One model reset instead of one widget item per row, then re-apply the search filter
+        self.results_model.set_entries(labels, kinds, payloads)
+        self.search_index.build(labels)
+        self.apply_search_filter()
+        
+        self.show_item_counts()
+        
+        if start_loading:
+            self.load_procedurals_async()
     
-    def set_projection_planar(self):
-        """Set projection mode to Planar"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def show_item_counts(self):
+        """Show how many commands, procedurals and macros are listed"""
+        if not self.ui_built:
+            return
+        command_count = len(COMMAND_REGISTRY)
+        procedural_count = len(self.procedurals_cache)
+        macro_count = len(self.macros)
+        total_items = command_count + procedural_count + macro_count
+        status_text = f"Found {total_items} items ({command_count} commands, {procedural_count} procedurals, {macro_count} macros)"
+        if not self.procedurals_loaded and procedural_count == 0:
+            status_text += " - Try 'Refresh Procedurals' if missing"
+        self.status_label.setText(status_text)
+    
+    # ---- Background procedural loading ----
+    
+    def load_procedurals_async(self):
+        """Start streaming procedural resources into the list"""
+        substance_painter.logging.info("Commander: Loading procedural resources in the background...")
+        if self.ui_built:
+            self.refresh_procedurals_button.setEnabled(False)
+        self.procedural_loader.start()
+    
+    def revalidate_procedural_catalog(self):
+        """Rescan procedurals in the background only if the shelves changed since the last scan"""
+        if self.procedural_loader.is_running():
+            return
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if hasattr(layer, 'set_projection_mode'):
-                layer.set_projection_mode(ProjectionMode.Planar)
-                substance_painter.logging.info("Set projection mode to Planar")
-                self.status_label.setText("Projection: Planar")
-            else:
-                raise ValueError("Selected layer does not support projection modes")
+        embedded_count = sum(proc.embedded for proc in self.procedurals_cache)
+        fingerprint = compute_shelf_fingerprint(embedded_count)
+        if self.procedurals_loaded and fingerprint is not None and fingerprint == self.catalog_fingerprint:
+            substance_painter.logging.info("Commander: Procedural catalog is up to date")
+            return
+        
+        if self.procedurals_loaded:
+            # Keep showing the current catalog and swap in the rescan once it finishes
+            substance_painter.logging.info("Commander: Shelves changed - rescanning procedurals in the background")
+            self._catalog_rescan = True
+            self.load_procedurals_async()
         else:
-            raise ValueError("No layer selected")
+            self.refresh_commands(force_reload_procedurals=True)
     
-    def set_projection_spherical(self):
-        """Set projection mode to Spherical"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
-        
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if hasattr(layer, 'set_projection_mode'):
-                layer.set_projection_mode(ProjectionMode.Spherical)
-                substance_painter.logging.info("Set projection mode to Spherical")
-                self.status_label.setText("Projection: Spherical")
-            else:
-                raise ValueError("Selected layer does not support projection modes")
+    def on_procedural_batch(self, batch):
+        """Append a batch of loaded procedurals to the list and search index"""
+        if self._catalog_rescan:
+            return  # Replaces the shown catalog in one go when the scan finishes
+        if not self.ui_built:
+            self._extend_procedural_cache(batch)  # loaded for a macro; the list is built from the cache later
+            return
+        labels = [f"[PROC] {proc.name}" for proc in batch]
+        first = self.results_model.add_entries(labels, CommandListModel.KIND_PROCEDURAL, batch)
+        self.search_index.extend(labels, first)
+        self._extend_procedural_cache(batch)
+        
+        # Keep the user's current row while results grow underneath it
+        current = self.results_list.currentIndex()
+        current_entry = self.results_model.entry_at(current.row()) if current.isValid() else None
+        self.apply_search_filter()
+        if current_entry is not None and current_entry in self.results_model.order:
+            self.results_list.setCurrentIndex(self.results_model.index(self.results_model.order.index(current_entry)))
         else:
-            raise ValueError("No layer selected")
+            self.select_first_result()
     
-    def set_projection_cylindrical(self):
-        """Set projection mode to Cylindrical"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def on_procedural_progress(self, done, total):
+        """Show procedural loading progress"""
+        if done < total and self.ui_built:
+            action = "Updating" if self._catalog_rescan else "Loading"
+            self.status_label.setText(f"{action} procedurals... {done}/{total}")
+    
+    def on_procedurals_finished(self, procedurals):
+        """Mark the catalog loaded, persist it and report the final counts"""
+        if self.ui_built:
+            self.refresh_procedurals_button.setEnabled(True)
+        
+        if self._catalog_rescan:
+            self._catalog_rescan = False
+            if not procedurals:
+                # Keep the catalog we already show rather than emptying the list
+                substance_painter.logging.warning("Commander: Procedural rescan found nothing - keeping cached catalog")
+                self.show_item_counts()
+                return
+            self._set_procedural_cache(procedurals)
+            self.procedurals_loaded = True
+            if self.ui_built:
+                self.refresh_commands()
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if hasattr(layer, 'set_projection_mode'):
-                layer.set_projection_mode(ProjectionMode.Cylindrical)
-                substance_painter.logging.info("Set projection mode to Cylindrical")
-                self.status_label.setText("Projection: Cylindrical")
-            else:
-                raise ValueError("Selected layer does not support projection modes")
+        self.procedurals_loaded = len(procedurals) > 0
+        if self.procedurals_loaded:
+            substance_painter.logging.info("Commander: Successfully cached procedural resources")
+            # Taken from the scan's own search, less the project's procedurals
+            self.catalog_fingerprint = self.procedural_loader.fingerprint()
+            self.save_procedural_catalog()
         else:
-            raise ValueError("No layer selected")
+            substance_painter.logging.warning("Commander: No procedural resources found - resource system may not be ready yet")
+        self.show_item_counts()
     
-    # Symmetry methods
-    def enable_symmetry(self):
-        """Enable symmetry on selected layer"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    # ---- Procedural catalog cache ----
+    
+    def _get_catalog_file_path(self):
+        """Get the path for the procedural catalog cache (next to the macros file)"""
+        return os.path.join(os.path.dirname(self.macros_file), "commander_procedurals.json")
+    
+    def load_procedural_catalog(self):
+        """Load the procedural catalog saved by a previous session, if any"""
+        try:
+            if not os.path.exists(self.catalog_file):
+                return
+            records, fingerprint = read_catalog_file(self.catalog_file)
+            self._set_procedural_cache([ProceduralEntry(*record) for record in records])
+            self.catalog_fingerprint = fingerprint
+            self.procedurals_loaded = len(self.procedurals_cache) > 0
+            substance_painter.logging.info(f"Commander: Loaded {len(self.procedurals_cache)} procedurals from catalog cache")
+        except Exception as e:
+            # Any decode problem just means a cold cache: the catalog is rescanned
+            substance_painter.logging.warning(f"Commander: Ignoring unreadable procedural catalog cache: {e}")
+            self._set_procedural_cache([])
+            self.catalog_fingerprint = None
+    
+    def save_procedural_catalog(self):
+        """Save the procedural catalog as compact JSON rows with the shelf fingerprint"""
+        records = [(proc.name, proc.category, proc.url) for proc in self.procedurals_cache if not proc.embedded]
+        try:
+            write_file_atomically(self.catalog_file, catalog_file_text(records, self.catalog_fingerprint))
+        except Exception as e:
+            substance_painter.logging.warning(f"Commander: Failed to save procedural catalog cache: {e}")
+    
+    def on_search_changed(self, text):
+        """Filter commands based on search and auto-select first visible item"""
+        # Check if user is searching for procedurals but they haven't been loaded yet
+        if (text.lower() in ['proc', 'procedural', 'noise', 'grunge', 'pattern'] and not self.procedurals_loaded
+                and not self.procedural_loader.is_running()):
+            substance_painter.logging.info("Commander: User searching for procedurals - triggering lazy load")
+            self.refresh_commands(force_reload_procedurals=True)
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if hasattr(layer, 'set_symmetry_enabled'):
-                layer.set_symmetry_enabled(True)
-                substance_painter.logging.info("Enabled symmetry")
-                self.status_label.setText("Symmetry enabled")
-            else:
-                raise ValueError("Selected layer does not support symmetry")
-        else:
-            raise ValueError("No layer selected")
+        # Only candidate rows are scored; the view just gets the ranked entry order
+        self.apply_search_filter()
+        
+        # Auto-select first (best scoring) item for easy arrow navigation
+        self.select_first_result()
     
-    def disable_symmetry(self):
-        """Disable symmetry on selected layer"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def _set_procedural_cache(self, procedurals):
+        """Store the procedural list and its name/id lookup tables"""
+        self.procedurals_cache = []
+        self.procedurals_by_name = {}
+        self._extend_procedural_cache(procedurals)
+    
+    def _extend_procedural_cache(self, procedurals):
+        """Add procedurals to the cached list and lookup tables"""
+        self.procedurals_cache.extend(procedurals)
+        for proc in procedurals:
+            # First match wins, as the old linear scan did
+            self.procedurals_by_name.setdefault(proc.name, proc)
+    
+    def find_procedural(self, name, resource_id=None):
+        """Resolve a procedural step: a stored resource id applies directly, a bare name comes from the catalog"""
+        if resource_id:
+            return super().find_procedural(name, resource_id)
+        return self.procedurals_by_name.get(name)
+    
+    @PROFILER.timed("list")
+    def apply_search_filter(self):
+        """Show the entries matching the current search text, best first"""
+        self.results_model.set_order(self.search_index.query(self.search_input.text()))
+        if self.search_index.pending:
+            self.search_timer.start()
+    
+    def score_pending_results(self):
+        """Append the rest of a capped search's results, one scoring chunk per event loop turn"""
+        order = self.search_index.score_pending()
+        if order is not None:
+            self.results_model.set_order(order)
+        elif self.search_index.pending:
+            self.search_timer.start()
+    
+    def _macro_label(self, macro_name):
+        """List label for a macro (with its hotkey if it has one)"""
+        macro_data = self.macros[macro_name]
+        hotkey_suffix = f" ({macro_data['hotkey']})" if 'hotkey' in macro_data else ""
+        return f"[MACRO] {macro_name}{hotkey_suffix}"
+    
+    def update_macro_entry(self, macro_name):
+        """Insert, relabel or remove one macro's list row without rebuilding the list"""
+        entry = self.macro_entries.get(macro_name)
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if hasattr(layer, 'set_symmetry_enabled'):
-                layer.set_symmetry_enabled(False)
-                substance_painter.logging.info("Disabled symmetry")
-                self.status_label.setText("Symmetry disabled")
-            else:
-                raise ValueError("Selected layer does not support symmetry")
+        if macro_name not in self.macros:
+            if entry is None:
+                return
+            del self.macro_entries[macro_name]
+            self.search_index.remove(entry)
+            self.apply_search_filter()
+            self.results_model.remove_entry(entry)
+            return
+        
+        label = self._macro_label(macro_name)
+        if entry is None:
+            # New macros go at the end of the macro block at the top of the list
+            position = len(self.macro_entries)
+            entry = self.results_model.add_entry(label, CommandListModel.KIND_MACRO, macro_name)
+            self.macro_entries[macro_name] = entry
+            self.search_index.add(entry, label, position)
+        elif label != self.results_model.labels[entry]:
+            self.results_model.set_label(entry, label)
+            self.search_index.update(entry, label)
         else:
-            raise ValueError("No layer selected")
+            return
+        self.apply_search_filter()
     
-    # Channel Management methods
-    def enable_basecolor_channel(self):
-        """Enable BaseColor channel on selected layers"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def on_item_double_clicked(self, index):
+        """Execute the command behind a results list index"""
+        if not index.isValid():
+            return
+        entry = self.results_model.entry_at(index.row())
+        self.execute_command(self.results_model.labels[entry], self.results_model.payloads[entry])
+    
+    def execute_command(self, command, payload=None):
+        """Execute a command by its display text using official API functions
         
-        if selected_nodes:
-            success_count = 0
+        payload is the macro name for macros, the resource data for procedurals
+        and the registry id for commands.
+        """
+        global DOCK_WIDGET
+        
+        try:
+            # Handle macro execution
+            if command.startswith("[MACRO]"):
+                self.execute_macro(payload)
+                return
             
-            for layer in selected_nodes:
-                if hasattr(layer, 'active_channels'):
-                    try:
-                        # Get available channels on the stack
-                        available_channels = set(stack.all_channels())
-                        
-                        if ChannelType.BaseColor in available_channels:
-                            # Get current active channels and add BaseColor
-                            current_channels = layer.active_channels
-                            current_channels.add(ChannelType.BaseColor)
-                            layer.active_channels = current_channels
-                            success_count += 1
-                        
-                    except Exception as e:
-                        substance_painter.logging.warning(f"Could not enable BaseColor for layer '{layer.get_name()}': {e}")
+            # Handle procedural resources
+            elif command.startswith("[PROC]"):
+                procedural_data = payload
+                if procedural_data:
+                    result = self.apply_procedural(procedural_data)
+                    self.status_label.setText(result)
+                    # Keep dock open after procedural execution - user can use shortcut to refocus
+                else:
+                    raise ValueError("No procedural data found")
+                return
             
-            if success_count > 0:
-                substance_painter.logging.info(f"Enabled BaseColor channel on {success_count} layer{'s' if success_count != 1 else ''}")
-                self.status_label.setText(f"BaseColor enabled on {success_count} layer{'s' if success_count != 1 else ''}")
+            # Registered commands: the payload is the stable command id; macro steps
+            # still refer to commands by label
+            descriptor = COMMANDS_BY_ID.get(payload) or COMMANDS_BY_LABEL.get(command)
+            if descriptor is None:
+                raise ValueError(f"Unknown command: {command}")
+            self.run_command(descriptor.id)
+                
+            self.status_label.setText(f"✓ Executed: {command}")
+            # Keep dock open after execution - user can use shortcut to refocus
+            
+        except Exception as e:
+            self.status_label.setText(f"✗ Failed: {command}")
+            substance_painter.logging.error(f"Command failed: {e}")
+    
+    # ---- Macro System Methods ----
+    
+    def _get_macros_file_path(self):
+        """Get the path for the macros file"""
+        return commander_data_file("commander_macros.json")
+    
+    def _get_settings_file_path(self):
+        """Get the path for the settings file"""
+        return commander_data_file("commander_settings.json")
+    
+    def load_settings(self):
+        """Load Commander settings from file"""
+        try:
+            settings_file = self._get_settings_file_path()
+            if os.path.exists(settings_file):
+                with open(settings_file, 'r') as f:
+                    return json.load(f)
             else:
-                raise ValueError("No fill layers selected or BaseColor channel not available")
-        else:
-            raise ValueError("No layers selected")
+                # Return default settings
+                return {
+                    'main_shortcut': 'Ctrl+;',
+                    'version': '1.0'
+                }
+        except Exception as e:
+            substance_painter.logging.error(f"Failed to load settings: {str(e)}")
+            return {'main_shortcut': 'Ctrl+;', 'version': '1.0'}
     
-    def enable_all_channels(self):
-        """Enable all available channels on selected layers"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
-        
-        if selected_nodes:
-            success_count = 0
+    def save_settings(self, settings):
+        """Schedule a settings write (coalesced with other edits, written off the GUI thread)"""
+        self.persistence.mark_dirty(self._get_settings_file_path(), lambda: json.dumps(settings, indent=2), "settings")
+    
+    def open_settings(self):
+        """Open the settings dialog"""
+        dialog = SettingsDialog(self, self.settings)
+        if dialog.exec() == QtWidgets.QDialog.DialogCode.Accepted:
+            new_settings = dialog.get_settings()
             
-            for layer in selected_nodes:
-                if hasattr(layer, 'active_channels'):
-                    try:
-                        # Get all available channels on the stack
-                        available_channels = set(stack.all_channels())
-                        
-                        if available_channels:
-                            layer.active_channels = available_channels
-                            success_count += 1
-                        
-                    except Exception as e:
-                        substance_painter.logging.warning(f"Could not enable all channels for layer '{layer.get_name()}': {e}")
+            # Check for shortcut changes
+            if canonical_hotkey(new_settings['main_shortcut']) != canonical_hotkey(self.settings['main_shortcut']):
+                # Check for conflicts with existing macros
+                if self.is_main_shortcut_conflict(new_settings['main_shortcut']):
+                    return  # User declined to proceed with conflict
+                
+                # Update the global shortcut
+                self.update_main_shortcut(new_settings['main_shortcut'])
+                
+                self.status_label.setText(f"Main shortcut changed to: {new_settings['main_shortcut']}")
+                substance_painter.logging.info(f"Commander main shortcut updated to: {new_settings['main_shortcut']}")
             
-            if success_count > 0:
-                substance_painter.logging.info(f"Enabled all channels on {success_count} layer{'s' if success_count != 1 else ''}")
-                self.status_label.setText(f"All channels enabled on {success_count} layer{'s' if success_count != 1 else ''}")
-            else:
-                raise ValueError("No fill layers selected")
-        else:
-            raise ValueError("No layers selected")
+            # Save the new settings
+            self.settings = new_settings
+            self.save_settings(self.settings)
     
-    def disable_all_channels(self):
-        """Disable all channels on selected layers"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def is_main_shortcut_conflict(self, shortcut):
+        """Check if main shortcut conflicts with existing macro shortcuts or problematic keys"""
         
-        if selected_nodes:
-            success_count = 0
-            
-            for layer in selected_nodes:
-                if hasattr(layer, 'active_channels'):
-                    try:
-                        layer.active_channels = set()  # Empty set disables all channels
-                        success_count += 1
-                        
-                    except Exception as e:
-                        substance_painter.logging.warning(f"Could not disable channels for layer '{layer.get_name()}': {e}")
-            
-            if success_count > 0:
-                substance_painter.logging.info(f"Disabled all channels on {success_count} layer{'s' if success_count != 1 else ''}")
-                self.status_label.setText(f"All channels disabled on {success_count} layer{'s' if success_count != 1 else ''}")
+        # Check for problematic shortcuts that won't work
+        problematic_shortcuts = ['Space', 'Tab', 'Enter', 'Return', 'Escape']
+        if hotkey_in(shortcut, problematic_shortcuts):
+            QtWidgets.QMessageBox.warning(
+                self, "Problematic Shortcut",
+                f"⚠️ Shortcut '{shortcut}' is reserved by Substance Painter and may not work properly.\n\n" +
+                f"Recommended shortcuts: F9, F10, F11, Ctrl+Shift+C, Alt+Space, Ctrl+/\n\n" +
+                f"If Commander stops responding, manually edit:\n" +
+                f"commander_settings.json (in your home folder)\n" +
+                f"and change 'main_shortcut' back to 'Ctrl+;'"
+            )
+            # Allow it but warn them
+        
+        # Check for known SP conflicts and warn
+        sp_shortcuts = ['F1', 'F5', 'Ctrl+N', 'Ctrl+O', 'Ctrl+S', 'Ctrl+Z', 'Ctrl+Y', 
+                       'Ctrl+C', 'Ctrl+V', 'Ctrl+X', 'Ctrl+A', 'Ctrl+R', 'Ctrl+Shift+S']
+        if hotkey_in(shortcut, sp_shortcuts):
+            reply = QtWidgets.QMessageBox.question(
+                self, "Potential Conflict",
+                f"⚠️ Shortcut '{shortcut}' is used by Substance Painter.\n" +
+                f"This may cause conflicts. Use it anyway?\n\n" +
+                f"Better alternatives: F9, F10, F11, Ctrl+Shift+C",
+                QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
+            )
+            if reply == QtWidgets.QMessageBox.StandardButton.No:
+                return True  # User declined, treat as conflict
+        
+        # Check against existing macro shortcuts
+        macro_name = self.hotkey_router.conflict(shortcut)
+        if macro_name is not None:
+            reply = QtWidgets.QMessageBox.question(
+                self, "Shortcut Conflict",
+                f"Shortcut '{shortcut}' clashes with the hotkey of macro '{macro_name}'.\n" +
+                f"Remove it from '{macro_name}' and use as main Commander shortcut?",
+                QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
+            )
+            if reply == QtWidgets.QMessageBox.StandardButton.Yes:
+                # Remove from macro
+                self.unregister_macro_hotkey(macro_name)
+                del self.macros[macro_name]['hotkey']
+                self.save_macros()
+                self.update_macro_entry(macro_name)
+                return False  # No conflict, we resolved it
             else:
-                raise ValueError("No fill layers selected")
-        else:
-            raise ValueError("No layers selected")
+                return True  # Conflict, user declined to resolve
+        return False  # No conflict
     
-    def toggle_channels(self):
-        """Interactive channel selection for selected layers"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def update_main_shortcut(self, new_shortcut):
+        """Update the main Commander shortcut"""
+        global COMMANDER_SHORTCUT
         
-        if selected_nodes:
-            fill_layers = [layer for layer in selected_nodes if hasattr(layer, 'active_channels')]
-            
-            if fill_layers:
-                # Get available channels on the stack
-                available_channels = list(stack.all_channels())
-                channel_names = [ch.name for ch in available_channels]
-                
-                if not channel_names:
-                    raise ValueError("No channels available on this texture set")
-                
-                # Get currently active channels from first layer
-                first_layer = fill_layers[0]
-                active_channels = first_layer.active_channels
-                
-                # Create checkable items list for simple dialog
-                checked_indices = []
-                for i, channel in enumerate(available_channels):
-                    if channel in active_channels:
-                        checked_indices.append(i)
-                
-                # For now, show a simplified message about channel toggling
-                # (Full multi-selection dialog would require more complex QtWidgets setup)
-                layer_count = len(fill_layers)
-                active_names = [ch.name for ch in active_channels]
+        # Update the global shortcut reference
+        if COMMANDER_SHORTCUT:
+            try:
+                COMMANDER_SHORTCUT.activated.disconnect()
+                COMMANDER_SHORTCUT.setParent(None)
+                COMMANDER_SHORTCUT.deleteLater()
+            except Exception as e:
+                substance_painter.logging.warning(f"Error cleaning up old shortcut: {e}")
+        
+        # Create new shortcut with updated key sequence
+        main_window = substance_painter.ui.get_main_window()
+        COMMANDER_SHORTCUT = QtGui.QShortcut(QtGui.QKeySequence(new_shortcut), main_window)
+        COMMANDER_SHORTCUT.activated.connect(show_commander)
+        
+        substance_painter.logging.info(f"Updated main shortcut to: {new_shortcut}")
+    
+    def load_macros(self):
+        """Load macros from file and register their hotkeys (steps are compiled on first run)"""
+        self.macros_load_error = None
+        try:
+            if os.path.exists(self.macros_file):
+                self.macros, migrated = read_macros_file(self.macros_file)
                 
-                message = f"Current active channels on first layer: {', '.join(active_names) if active_names else 'None'}"
-                substance_painter.logging.info(message)
-                self.status_label.setText(f"Active channels: {len(active_channels)} of {len(available_channels)}")
+                # Register hotkeys for existing macros (stored in canonical spelling)
+                hotkey_count = 0
+                respelled = False
+                for macro_name, macro_data in self.macros.items():
+                    if 'hotkey' in macro_data:
+                        hotkey = canonical_hotkey(macro_data['hotkey']) or macro_data['hotkey']
+                        if hotkey != macro_data['hotkey']:
+                            macro_data['hotkey'] = hotkey
+                            respelled = True
+                        self.register_macro_hotkey(macro_name, hotkey)
+                        hotkey_count += 1
                 
+                substance_painter.logging.info(f"Loaded {len(self.macros)} macros ({hotkey_count} with hotkeys)")
+                if migrated:
+                    self.migrate_macros_file()
+                elif respelled:
+                    self.save_macros()
             else:
-                raise ValueError("No fill layers selected (only fill layers support channel management)")
-        else:
-            raise ValueError("No layers selected")
-    
-    def start_project_monitoring(self):
-        """Start monitoring project state changes for automatic procedural loading"""
-        try:
-            # Create timer for project monitoring
-            self.project_timer = QtCore.QTimer()
-            self.project_timer.timeout.connect(self.check_project_status)
-            self.project_timer.start(2000)  # Check every 2 seconds
-            
-            # Initial check
-            self.check_project_status()
-            
-            substance_painter.logging.info("Commander: Started project monitoring for automatic procedural loading")
-            
+                self.macros = {}
+                substance_painter.logging.info("No macros file found, starting with empty macros")
         except Exception as e:
-            substance_painter.logging.error(f"Commander: Error starting project monitoring: {e}")
+            # Don't let the next save replace a file we couldn't read (e.g. from a newer Commander)
+            self.macros_load_error = str(e)
+            substance_painter.logging.error(f"Failed to load macros: {str(e)} - macros won't be saved until {self.macros_file} can be read")
+            self.macros = {}
     
-    def check_project_status(self):
-        """Check for project state changes and load procedurals when project opens"""
+    def migrate_macros_file(self):
+        """Rewrite an old-format macros file in the current format, keeping the original as a backup"""
+        backup_path = self.macros_file + f".v{MACROS_VERSION - 1}.bak"
         try:
-            current_state = substance_painter.project.is_open()
-            
-            # Check for state changes
-            if self.last_project_state != current_state:
-                if current_state:
-                    # Project just opened - perfect time to load procedurals!
-                    substance_painter.logging.info("Commander: Project opened - automatically loading procedurals")
-                    
-                    # Force a fresh reload of procedurals since project context is now available
-                    self.procedurals_loaded = False
-                    self.procedurals_cache = []
-                    self.refresh_commands(force_reload_procedurals=True)
-                    
-                    substance_painter.logging.info("Commander: Automatic procedural loading completed")
-                else:
-                    substance_painter.logging.info("Commander: Project closed")
-                
-                self.last_project_state = current_state
-        
+            if not os.path.exists(backup_path):
+                import shutil
+                shutil.copy2(self.macros_file, backup_path)
+            write_macros_file(self.macros_file, self.macros)
+            substance_painter.logging.info(f"Commander: Upgraded macros file to format version {MACROS_VERSION} (backup: {backup_path})")
         except Exception as e:
-            # Don't log monitoring errors as they're not critical and could spam the log
-            pass
+            substance_painter.logging.error(f"Failed to upgrade macros file: {str(e)}")
     
-    # ---- End Project Monitoring ----
+    def save_macros(self):
+        """Schedule a macros write (coalesced with other edits, written off the GUI thread)"""
+        if self.macros_load_error is not None:
+            self.report(f"Macros not saved: the macros file couldn't be loaded ({self.macros_load_error})")
+            substance_painter.logging.warning(f"Commander: Not saving macros over {self.macros_file}, which failed to load")
+            return
+        self.persistence.mark_dirty(self.macros_file, lambda: macros_file_text(self.macros), "macros")
     
-    def create_paint_layer(self):
-        """Create a paint layer using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        insert_position = InsertPosition.from_textureset_stack(stack)
-        layer = substance_painter.layerstack.insert_paint(insert_position)
-        layer.set_name("Paint Layer")
+    def is_hotkey_conflict(self, hotkey, macro_name):
+        """Check if hotkey conflicts with existing assignments"""
+        # Check against main Commander shortcut
+        if canonical_hotkey(hotkey) == canonical_hotkey(self.settings['main_shortcut']):
+            reply = QtWidgets.QMessageBox.question(
+                self, "Shortcut Conflict",
+                f"Hotkey '{hotkey}' is the main Commander shortcut.\n" +
+                f"Use it for macro '{macro_name}' instead? (You can set a new main shortcut in Settings)",
+                QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
+            )
+            if reply == QtWidgets.QMessageBox.StandardButton.Yes:
+                # Change main shortcut to default
+                self.settings['main_shortcut'] = 'Ctrl+;'
+                self.save_settings(self.settings)
+                self.update_main_shortcut('Ctrl+;')
+                self.status_label.setText(f"Main shortcut reset to Ctrl+; ('{hotkey}' assigned to macro)")
+                return False  # No conflict, we resolved it
+            else:
+                return True  # Conflict, user declined to resolve
         
-        # Note: Paint layers don't use the same source system as fill layers
-        # They are ready to paint on by default, no channel enabling needed
+        # Check against other macros (same hotkey, or one that is the start of the other)
+        name = self.hotkey_router.conflict(hotkey)
+        if name is not None and name != macro_name:
+            reply = QtWidgets.QMessageBox.question(
+                self, "Hotkey Conflict",
+                f"Hotkey '{hotkey}' clashes with the hotkey of macro '{name}'.\n" +
+                f"Remove it from '{name}' and assign to '{macro_name}'?",
+                QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
+            )
+            if reply == QtWidgets.QMessageBox.StandardButton.Yes:
+                # Remove from old macro
+                self.unregister_macro_hotkey(name)
+                del self.macros[name]['hotkey']
+                self.update_macro_entry(name)
+                return False  # No conflict, we resolved it
+            else:
+                return True  # Conflict, user declined to resolve
         
-        # Select the newly created layer for macro chaining
-        set_selected_nodes([layer])
-        substance_painter.logging.info("Created and selected paint layer")
-    
-    def create_fill_layer(self):
-        """Create a fill layer using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        insert_position = InsertPosition.from_textureset_stack(stack)
-        layer = substance_painter.layerstack.insert_fill(insert_position)
-        layer.set_name("Fill Layer")
+        # Check against known Substance Painter shortcuts
+        sp_shortcuts = [
+            'Ctrl+N', 'Ctrl+O', 'Ctrl+S', 'Ctrl+Z', 'Ctrl+Y', 'Ctrl+C', 'Ctrl+V', 'Ctrl+X',
+            'Ctrl+A', 'F1', 'F11', 'Ctrl+Shift+S', 'Ctrl+R', 'Space'
+        ]
         
-        # Enable BaseColor channel by default (and other common channels)
+        if hotkey_in(hotkey, sp_shortcuts):
+            reply = QtWidgets.QMessageBox.question(
+                self, "Potential Conflict",
+                f"Hotkey '{hotkey}' might conflict with Substance Painter.\n" +
+                "Use it anyway?",
+                QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
+            )
+            return reply != QtWidgets.QMessageBox.StandardButton.Yes
+        
+        return False  # No conflict
+    
+    def register_macro_hotkey(self, macro_name, hotkey):
+        """Register a hotkey for a macro with the hotkey router"""
         try:
-            # Get available channels on the stack - all_channels() returns ChannelType objects directly
-            available_channels = set(stack.all_channels())
-            
-            # Define default channels to enable
-            default_channels = {ChannelType.BaseColor}
-            
-            # Only enable channels that exist on this stack
-            channels_to_enable = default_channels.intersection(available_channels)
-            
-            if channels_to_enable:
-                layer.active_channels = channels_to_enable
-                enabled_channel_names = [ch.name for ch in channels_to_enable]
-                substance_painter.logging.info(f"Enabled channels: {', '.join(enabled_channel_names)}")
+            self.hotkey_router.bind(hotkey, macro_name)
+            substance_painter.logging.info(f"Registered hotkey '{hotkey}' for macro '{macro_name}'")
         except Exception as e:
-            substance_painter.logging.warning(f"Could not enable default channels: {e}")
-        
-        # Select the newly created layer for macro chaining
-        set_selected_nodes([layer])
-        substance_painter.logging.info("Created and selected fill layer")
+            substance_painter.logging.error(f"Failed to register hotkey for macro '{macro_name}': {e}")
     
-    def create_group_layer(self):
-        """Create a group layer using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        insert_position = InsertPosition.from_textureset_stack(stack)
-        layer = substance_painter.layerstack.insert_group(insert_position)
-        layer.set_name("Group")
+    def unregister_macro_hotkey(self, macro_name):
+        """Unregister a hotkey for a macro"""
+        if macro_name in self.hotkey_router.chords:
+            self.hotkey_router.unbind(macro_name)
+            substance_painter.logging.info(f"Unregistered hotkey for macro '{macro_name}'")
+    
+    def execute_macro_by_name(self, macro_name):
+        """Execute a macro by name (called by hotkey)"""
+        if macro_name in self.macros:
+            substance_painter.logging.info(f"Executing macro '{macro_name}' via hotkey")
+            self.execute_macro(macro_name)
+        else:
+            substance_painter.logging.error(f"Macro '{macro_name}' not found")
+    
+    def start_macro_creation(self):
+        """Start macro creation mode"""
+        self.macro_creation_mode = True
+        self.selected_commands = []
+        self.status_label.setText("Macro Creation Mode: Click commands to select")
+        substance_painter.logging.info("Started macro creation mode")
         
-        # Select the newly created layer for macro chaining
-        set_selected_nodes([layer])
-        substance_painter.logging.info("Created and selected group layer")
+        # Update UI
+        self.create_macro_button.setText("Done Selecting")
+        self.create_macro_button.clicked.disconnect()
+        self.create_macro_button.clicked.connect(self.finish_macro_creation)
+        self.cancel_macro_button.setVisible(True)
     
-    def create_instance_layer(self):
-        """Create instance layer from selected layer using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def cancel_macro_creation(self):
+        """Cancel macro creation mode"""
+        self.macro_creation_mode = False
+        self.selected_commands = []
+        self.status_label.setText("Macro creation cancelled")
+        substance_painter.logging.info("Cancelled macro creation mode")
         
-        if selected_nodes:
-            source_layer = selected_nodes[0]
-            insert_position = InsertPosition.from_textureset_stack(stack)
-            instance = instantiate(insert_position, source_layer)
-            instance.set_name(f"Instance of {source_layer.get_name()}")
-            
-            # Select the newly created instance for macro chaining
-            set_selected_nodes([instance])
-            substance_painter.logging.info("Created and selected instance layer")
-        else:
-            raise ValueError("No layer selected to instance")
+        # Reset UI
+        self.create_macro_button.setText("Create Macro")
+        self.create_macro_button.clicked.disconnect()
+        self.create_macro_button.clicked.connect(self.start_macro_creation)
+        self.cancel_macro_button.setVisible(False)
+        
+        # Restore normal colors
+        self.results_model.clear_marks()
     
-    def insert_smart_material(self):
-        """Insert smart material - requires resource selection (simplified for now)"""
-        stack = substance_painter.textureset.get_active_stack()
-        insert_position = InsertPosition.from_textureset_stack(stack)
-        # Note: This would require resource selection UI in full implementation
-        raise ValueError("Smart Material insertion requires resource selection (not implemented in minimal version)")
+    def finish_macro_creation(self):
+        """Finish selecting commands and create macro"""
+        if len(self.selected_commands) == 0:
+            QtWidgets.QMessageBox.warning(self, "No Commands", "Please select some commands first.")
+            return
+        
+        # Use advanced macro creation dialog
+        dialog = MacroCreationDialog(self, self.selected_commands)
+        if dialog.exec() == QtWidgets.QDialog.DialogCode.Accepted:
+            name = dialog.get_macro_name()
+            hotkey = dialog.get_hotkey()
+            if name:
+                self.create_macro(name, hotkey, dialog.get_steps())
     
-    # === EFFECT COMMANDS ===
-    def insert_fill_effect(self):
-        """Insert fill effect on selected layer using official API - context aware"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def create_macro(self, name, hotkey=None, steps=None):
+        """Create a macro with the selected commands (or given steps) and optional hotkey"""
+        steps = steps if steps is not None else self.selected_commands.copy()
+        if name in self.macros:
+            reply = QtWidgets.QMessageBox.question(
+                self, "Macro Exists", 
+                f"Macro '{name}' already exists. Replace it?",
+                QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
+            )
+            if reply != QtWidgets.QMessageBox.StandardButton.Yes:
+                return
+        
+        # Check hotkey conflicts
+        if hotkey and self.is_hotkey_conflict(hotkey, name):
+            return
+        
+        # Save macro
+        macro_data = {
+            'commands': steps
+        }
+        if hotkey:
+            macro_data['hotkey'] = hotkey
         
-        if selected_nodes:
-            layer = selected_nodes[0]
+        self.macros[name] = macro_data
+        self.compile_macro(name)
+        self.save_macros()
+        
+        # Register hotkey if provided
+        if hotkey:
+            self.register_macro_hotkey(name, hotkey)
+        
+        # Reset UI
+        self.cancel_macro_creation()
+        
+        hotkey_text = f" with hotkey {hotkey}" if hotkey else ""
+        self.status_label.setText(f"Created macro '{name}'{hotkey_text} with {len(steps)} commands")
+        substance_painter.logging.info(f"Created macro '{name}'{hotkey_text} with {len(steps)} commands")
+        
+        # Show the new (or updated) macro row
+        self.update_macro_entry(name)
+    
+    def on_single_click(self, index):
+        """Handle single-click for macro creation"""
+        if self.macro_creation_mode and index.isValid():
+            entry = self.results_model.entry_at(index.row())
+            command = self.results_model.labels[entry]
             
-            # Check selection context to determine where to insert
-            selection_type = substance_painter.layerstack.get_selection_type(layer)
+            # Skip macro items themselves
+            if command.startswith("[MACRO]"):
+                return
             
-            if selection_type == SelectionType.Mask and layer.has_mask():
-                # Insert into mask stack
-                insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
-                context_name = "mask"
+            # Toggle selection
+            step = self._macro_step_for_entry(entry)
+            if step in self.selected_commands:
+                self.selected_commands.remove(step)
+                # Remove visual feedback
+                self.results_model.set_marked(entry, False)
             else:
-                # Insert into content stack
-                insert_position = InsertPosition.inside_node(layer, NodeStack.Content)
-                context_name = "content"
+                self.selected_commands.append(step)
+                # Add visual feedback (golden yellow)
+                self.results_model.set_marked(entry, True)
             
-            effect = insert_fill(insert_position)
-            effect.set_name(f"Fill Effect ({context_name})")
-            substance_painter.logging.info(f"Inserted fill effect into {context_name} stack")
-        else:
-            raise ValueError("No layer selected")
+            self.status_label.setText(f"Macro Mode: {len(self.selected_commands)} commands selected")
     
-    def insert_paint_effect(self):
-        """Insert paint effect on selected layer using official API - context aware"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def show_context_menu(self, position):
+        """Show right-click context menu"""
+        index = self.results_list.indexAt(position)
+        if not index.isValid():
+            return
+            
+        menu = QtWidgets.QMenu(self)
+        entry = self.results_model.entry_at(index.row())
+        command = self.results_model.labels[entry]
         
-        if selected_nodes:
-            layer = selected_nodes[0]
+        if command.startswith("[MACRO]"):
+            # Context menu for existing macros
+            macro_name = self.results_model.payloads[entry]
             
-            # Check selection context to determine where to insert
-            selection_type = substance_painter.layerstack.get_selection_type(layer)
+            execute_action = menu.addAction("Execute Macro")
+            execute_action.triggered.connect(lambda: self.execute_macro(macro_name))
+            profile_action = menu.addAction("Execute with Profiler")
+            profile_action.triggered.connect(lambda: self.profile_macro(macro_name))
+            self._add_texture_set_actions(menu, entry)
             
-            if selection_type == SelectionType.Mask and layer.has_mask():
-                # For masks, use insert_fill (paint doesn't work properly in mask context)
-                insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
-                effect = insert_fill(insert_position)  # Use fill for masks
-                effect.set_name("Paint Effect (mask)")
-                context_name = "mask"
+            # Hotkey management
+            macro_data = self.macros.get(macro_name, {})
+            if 'hotkey' in macro_data:
+                remove_hotkey_action = menu.addAction(f"Remove Hotkey ({macro_data['hotkey']})")
+                remove_hotkey_action.triggered.connect(lambda: self.remove_macro_hotkey(macro_name))
             else:
-                # For content, use insert_paint
-                insert_position = InsertPosition.inside_node(layer, NodeStack.Content)
-                effect = insert_paint(insert_position)
-                effect.set_name("Paint Effect (content)")
-                context_name = "content"
+                add_hotkey_action = menu.addAction("Add Hotkey")
+                add_hotkey_action.triggered.connect(lambda: self.add_macro_hotkey(macro_name))
             
-            substance_painter.logging.info(f"Inserted paint effect into {context_name} stack")
+            menu.addSeparator()
+            delete_action = menu.addAction("Delete Macro")
+            delete_action.triggered.connect(lambda: self.delete_macro(macro_name))
+        
         else:
-            raise ValueError("No layer selected")
+            # Context menu for regular commands
+            if not self.macro_creation_mode:
+                create_action = menu.addAction("Create Macro from this Command")
+                step = self._macro_step_for_entry(entry)
+                create_action.triggered.connect(lambda: self.create_single_command_macro(step))
+                self._add_texture_set_actions(menu, entry)
+        
+        menu.exec(self.results_list.mapToGlobal(position))
     
-    def insert_levels_effect(self):
-        """Insert levels effect using official API - context aware"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def _add_texture_set_actions(self, menu, entry):
+        """Add the 'run on texture sets' fan-out actions for a list entry"""
+        menu.addSeparator()
+        all_sets_action = menu.addAction("Run on All Texture Sets")
+        all_sets_action.triggered.connect(lambda: self.run_entry_on_texture_sets(entry))
+        matching_sets_action = menu.addAction("Run on Texture Sets Matching...")
+        matching_sets_action.triggered.connect(lambda: self.prompt_run_entry_on_texture_sets(entry))
+    
+    def _macro_step_for_entry(self, entry):
+        """Macro step to store for a list entry (procedurals keep their resource id)"""
+        label = self.results_model.labels[entry]
+        if self.results_model.kinds[entry] == CommandListModel.KIND_PROCEDURAL:
+            return {'command': label, 'resource_id': self.results_model.payloads[entry].url}
+        return label
+    
+    def create_single_command_macro(self, step):
+        """Create a macro from a single command using advanced dialog"""
+        dialog = MacroCreationDialog(self, [step])
+        if dialog.exec() == QtWidgets.QDialog.DialogCode.Accepted:
+            name = dialog.get_macro_name()
+            hotkey = dialog.get_hotkey()
+            if name:
+                # Check hotkey conflicts
+                if hotkey and self.is_hotkey_conflict(hotkey, name):
+                    return
+                
+                # Save macro
+                macro_data = {'commands': dialog.get_steps()}
+                if hotkey:
+                    macro_data['hotkey'] = hotkey
+                
+                self.macros[name] = macro_data
+                self.compile_macro(name)
+                self.save_macros()
+                
+                # Register hotkey if provided
+                if hotkey:
+                    self.register_macro_hotkey(name, hotkey)
+                
+                hotkey_text = f" with hotkey {hotkey}" if hotkey else ""
+                self.status_label.setText(f"Created macro '{name}'{hotkey_text} with 1 command")
+                self.update_macro_entry(name)
+    
+    def compile_macro(self, name):
+        """Resolve a macro's commands to step callables once, so running it skips lookups"""
+        steps = self.compile_macro_steps(self.macros[name]['commands'])
+        self.compiled_macros[name] = steps
+        return steps
+    
+    def compile_macro_with_args(self, name):
+        """Compile a macro with every step input it would prompt for asked once up front; None if cancelled"""
+        steps = []
+        for index, step in enumerate(self.macros[name]['commands']):
+            descriptor = COMMANDS_BY_LABEL.get(macro_step_label(step))
+            if descriptor is not None and descriptor.params:
+                bound = step.get('args', {}) if isinstance(step, dict) else {}
+                args = self.ask_params(f"Macro '{name}' step {index + 1}: {descriptor.label}", descriptor.params, bound)
+                if args is None:
+                    return None
+                step = dict(step, args=args) if isinstance(step, dict) else {'command': step, 'args': args}
+            steps.append(step)
+        return self.compile_macro_steps(steps)
+    
+    def execute_macro(self, name):
+        """Execute a macro by running all its compiled steps in sequence"""
+        if name not in self.macros:
+            substance_painter.logging.error(f"Macro '{name}' not found")
+            return False
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            
-            # Check selection context to determine where to insert
-            selection_type = substance_painter.layerstack.get_selection_type(layer)
-            
-            if selection_type == SelectionType.Mask and layer.has_mask():
-                # Insert into mask stack
-                insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
-                context_name = "mask"
+        steps = self.compiled_macros.get(name) or self.compile_macro(name)
+        
+        # One undo entry and one stack recompute for the whole macro
+        succeeded = []
+        with self._modification_scope(f"macro '{name}'"):
+            success_count, failed_commands = self.run_macro_steps(name, steps, succeeded)
+        
+        # Roll back a partially applied macro as one unit - only when its edits really are one
+        # undo entry, and only if a step changed something (else Undo hits the user's last edit)
+        modified = any(macro_step_modifies(command) for command in succeeded)
+        if failed_commands and modified and self.settings.get('undo_failed_macros', False):
+            if not host_groups_modifications():
+                substance_painter.logging.warning(f"Cannot roll back macro '{name}': this Substance Painter version can't group its edits into one undo step")
+            elif self.undo_last_modification():
+                self.report(f"Macro '{name}': {len(failed_commands)} failed - changes undone")
+                substance_painter.logging.info(f"Undid partially applied macro '{name}'")
+                return False
             else:
-                # Insert into content stack
-                insert_position = InsertPosition.inside_node(layer, NodeStack.Content)
-                context_name = "content"
-            
-            effect = insert_levels_effect(insert_position)
-            effect.set_name(f"Levels ({context_name})")
-            substance_painter.logging.info(f"Inserted levels effect into {context_name} stack")
+                substance_painter.logging.warning(f"Could not find the Undo action to roll back macro '{name}'")
+        
+        # Report results
+        if failed_commands:
+            self.report(f"Macro '{name}': {success_count}/{len(steps)} succeeded")
         else:
-            raise ValueError("No layer selected")
+            self.report(f"Macro '{name}': All {len(steps)} commands succeeded")
+        
+        return len(failed_commands) == 0
     
-    def insert_compare_mask_effect(self):
-        """Insert compare mask effect using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def profile_macro(self, name):
+        """Execute a macro once under cProfile; the stats go next to the macros file"""
+        path = commander_data_file("commander_macro.prof")
+        PROFILER.profile_next_macro(path)
+        try:
+            succeeded = self.execute_macro(name)
+        finally:
+            PROFILER.profile_next_macro(None)  # not used if the macro didn't run
+        self.report(f"Macro '{name}' {'succeeded' if succeeded else 'failed'} - profile saved to {path}")
+        return succeeded
+    
+    # ---- Texture set fan-out ----
+    
+    def run_entry_on_texture_sets(self, entry, name_filter=None):
+        """Run a list entry (command, procedural or macro) on all (or matching) texture sets"""
+        label = self.results_model.labels[entry]
+        kind = self.results_model.kinds[entry]
+        payload = self.results_model.payloads[entry]
+        
+        # Inputs are asked for once here, not once per texture set
+        if kind == CommandListModel.KIND_MACRO:
+            steps = self.compile_macro_with_args(payload)
+            if steps is None:
+                self.status_label.setText(f"Cancelled macro '{payload}' on texture sets")
+                return []
+            def action():
+                success_count, failed_commands = self.run_macro_steps(payload, steps)
+                if failed_commands:
+                    raise ValueError(f"{len(failed_commands)}/{len(steps)} steps failed: {', '.join(failed_commands)}")
+            label = f"macro '{payload}'"
+        elif kind == CommandListModel.KIND_PROCEDURAL:
+            action = lambda: self.apply_procedural(payload)
+        else:
+            args = self.ask_params(f"{label} (texture sets)", COMMANDS_BY_ID[payload].params)
+            if args is None:
+                self.status_label.setText(f"Cancelled {label} on texture sets")
+                return []
+            action = lambda: self.run_command(payload, args)
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if layer.has_mask():
-                insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
-                effect = insert_compare_mask_effect(insert_position)
-                effect.set_name("Compare Mask")
+        results = self.run_on_texture_sets(label, action, name_filter)
+        self.report_texture_set_results(label, results, name_filter)
+        return results
+    
+    def prompt_run_entry_on_texture_sets(self, entry):
+        """Ask for a texture set name pattern, then fan the entry out over the matching sets"""
+        pattern, ok = QtWidgets.QInputDialog.getText(
+            self, "Run on Texture Sets",
+            "Texture set name pattern (e.g. *_body, Head*, Eye?):"
+        )
+        if ok and pattern.strip():
+            self.run_entry_on_texture_sets(entry, pattern.strip())
+    
+    def report_texture_set_results(self, label, results, name_filter=None):
+        """Log one line per texture set and summarize the fan-out in the status bar"""
+        failed = [(target, error) for target, error in results if error]
+        for target, error in results:
+            if error:
+                substance_painter.logging.error(f"  {target}: ✗ {error}")
             else:
-                raise ValueError("Layer needs a mask for compare mask effect")
-        else:
-            raise ValueError("No layer selected")
+                substance_painter.logging.info(f"  {target}: ✓")
+        
+        if not results:
+            scope = f" matching '{name_filter}'" if name_filter else ""
+            self.status_label.setText(f"No texture sets{scope}")
+            return
+        
+        summary = f"{label}: {len(results) - len(failed)}/{len(results)} texture sets succeeded"
+        substance_painter.logging.info(f"Commander: {summary}")
+        self.status_label.setText(f"✓ {summary}" if not failed else f"✗ {summary}")
+        if failed:
+            details = "\n".join(f"• {target}: {error}" for target, error in failed)
+            QtWidgets.QMessageBox.warning(self, "Texture Set Results", f"{summary}\n\nFailed:\n{details}")
     
-    def insert_filter_effect(self):
-        """Insert filter effect using official API - context aware"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def undo_last_modification(self):
+        """Trigger the host's Undo action; returns False if it can't be found"""
+        main_window = substance_painter.ui.get_main_window()
+        undo_keys = QtGui.QKeySequence(QtGui.QKeySequence.StandardKey.Undo)
+        for action in main_window.findChildren(QtGui.QAction):
+            if action.shortcut() == undo_keys and action.isEnabled():
+                action.trigger()
+                return True
+        return False
+    
+    def execute_procedural_step(self, proc_name, resource_id=None):
+        """Apply a procedural as a macro step; only steps without a stored resource id need the catalog"""
+        context = self.context
+        if not resource_id and not context.procedural_scan_done:
+            self.ensure_procedural_catalog()  # a hotkeyed macro can run before the palette was first shown
+            if not self.procedurals_loaded:
+                # Older steps only store the name: load the library once per run, even if it comes up empty
+                context.procedural_scan_done = True
+                if not self.procedural_loader.is_running():
+                    if self.ui_built:
+                        self.refresh_commands(force_reload_procedurals=True)
+                    else:
+                        self._set_procedural_cache([])
+                        self.load_procedurals_async()
+                self.procedural_loader.run_to_completion()
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            
-            # Check selection context to determine where to insert
-            selection_type = substance_painter.layerstack.get_selection_type(layer)
-            
-            if selection_type == SelectionType.Mask and layer.has_mask():
-                # Insert into mask stack
-                insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
-                context_name = "mask"
-            else:
-                # Insert into content stack
-                insert_position = InsertPosition.inside_node(layer, NodeStack.Content)
-                context_name = "content"
-            
-            effect = insert_filter_effect(insert_position)
-            effect.set_name(f"Filter ({context_name})")
-            substance_painter.logging.info(f"Inserted filter effect into {context_name} stack")
-        else:
-            raise ValueError("No layer selected")
+        super().execute_procedural_step(proc_name, resource_id)
     
-    def insert_generator_effect(self):
-        """Insert generator effect using official API - context aware"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def delete_macro(self, name):
+        """Delete a macro"""
+        reply = QtWidgets.QMessageBox.question(
+            self, "Delete Macro", 
+            f"Are you sure you want to delete macro '{name}'?",
+            QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
+        )
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            
-            # Check selection context to determine where to insert
-            selection_type = substance_painter.layerstack.get_selection_type(layer)
-            
-            if selection_type == SelectionType.Mask and layer.has_mask():
-                # Insert into mask stack
-                insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
-                context_name = "mask"
-            else:
-                # Insert into content stack
-                insert_position = InsertPosition.inside_node(layer, NodeStack.Content)
-                context_name = "content"
-            
-            effect = insert_generator_effect(insert_position)
-            effect.set_name(f"Generator ({context_name})")
-            substance_painter.logging.info(f"Inserted generator effect into {context_name} stack")
-        else:
-            raise ValueError("No layer selected")
+        if reply == QtWidgets.QMessageBox.StandardButton.Yes:
+            if name in self.macros:
+                # Unregister hotkey if it exists
+                self.unregister_macro_hotkey(name)
+                del self.macros[name]
+                self.compiled_macros.pop(name, None)
+                self.save_macros()
+                self.status_label.setText(f"Deleted macro '{name}'")
+                self.update_macro_entry(name)
     
-    def insert_anchor_point_effect(self):
-        """Insert anchor point effect using official API - context aware"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def add_macro_hotkey(self, macro_name):
+        """Add a hotkey to an existing macro"""
+        # Simple hotkey input dialog
+        hotkey, ok = QtWidgets.QInputDialog.getText(
+            self, "Add Hotkey", 
+            f"Enter hotkey for macro '{macro_name}':\n" +
+            "(Examples: F5, Ctrl+Shift+W, Alt+Q)"
+        )
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            
-            # Check selection context to determine where to insert
-            selection_type = substance_painter.layerstack.get_selection_type(layer)
+        if ok and hotkey.strip():
+            hotkey = canonical_hotkey(hotkey.strip())
+            if not hotkey:
+                QtWidgets.QMessageBox.warning(self, "Invalid Hotkey", "That is not a key combination Qt recognizes.")
+                return
+            if self.is_hotkey_conflict(hotkey, macro_name):
+                return
             
-            if selection_type == SelectionType.Mask and layer.has_mask():
-                # Insert into mask stack
-                insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
-                context_name = "mask"
-            else:
-                # Insert into content stack
-                insert_position = InsertPosition.inside_node(layer, NodeStack.Content)
-                context_name = "content"
+            # Add hotkey to macro
+            self.macros[macro_name]['hotkey'] = hotkey
+            self.save_macros()
+            self.register_macro_hotkey(macro_name, hotkey)
             
-            effect = insert_anchor_point_effect(insert_position, "Anchor Point")
-            effect.set_name(f"Anchor Point ({context_name})")
-            substance_painter.logging.info(f"Inserted anchor point effect into {context_name} stack")
-        else:
-            raise ValueError("No layer selected")
+            self.status_label.setText(f"Added hotkey '{hotkey}' to macro '{macro_name}'")
+            self.update_macro_entry(macro_name)
     
-    def insert_color_selection_effect(self):
-        """Insert color selection effect using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def remove_macro_hotkey(self, macro_name):
+        """Remove a hotkey from a macro"""
+        reply = QtWidgets.QMessageBox.question(
+            self, "Remove Hotkey", 
+            f"Remove hotkey from macro '{macro_name}'?",
+            QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
+        )
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if layer.has_mask():
-                insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
-                effect = insert_color_selection_effect(insert_position)
-                effect.set_name("Color Selection")
-            else:
-                raise ValueError("Layer needs a mask for color selection effect")
-        else:
-            raise ValueError("No layer selected")
+        if reply == QtWidgets.QMessageBox.StandardButton.Yes:
+            if macro_name in self.macros and 'hotkey' in self.macros[macro_name]:
+                self.unregister_macro_hotkey(macro_name)
+                del self.macros[macro_name]['hotkey']
+                self.save_macros()
+                self.update_macro_entry(macro_name)
+                self.status_label.setText(f"Removed hotkey for '{macro_name}'")
     
-    # === MASK OPERATIONS ===
-    def get_selected_nodes(self):
-        """Get currently selected layer nodes using real API"""
-        try:
-            # Get active texture set
-            texture_sets = substance_painter.textureset.all_texture_sets()
-            if not texture_sets:
-                return []
-            
-            active_set = texture_sets[0]
-            stack = active_set.get_stack()
-            if not stack:
-                return []
-            
-            # Get selected nodes - this is the actual API call
-            return substance_painter.layerstack.get_selected_nodes(stack)
-        except Exception:
-            return []
+    # ---- End Macro System ----
     
-    def add_layer_mask(self):
-        """Add mask to selected layer using real API"""
+    def refresh_procedurals(self):
+        """Refresh procedural resources on demand"""
         try:
-            selected = self.get_selected_nodes()
-            if not selected:
-                raise ValueError("No layer selected")
-            
-            layer = selected[0]
-            if layer.has_mask():
-                raise ValueError("Layer already has a mask")
+            self.status_label.setText("Refreshing procedural resources...")
+            # Force a fresh reload of procedurals
+            self.procedurals_loaded = False
+            self._set_procedural_cache([])
             
-            # Add mask with white background (default)
-            layer.add_mask(MaskBackground.White)
+            # Refresh the command list which will reload procedurals in the background
+            self.refresh_commands(force_reload_procedurals=True)
             
-            # Switch selection context to the mask for subsequent macro commands
-            from substance_painter.layerstack import set_selection_type, SelectionType
-            set_selection_type(layer, SelectionType.Mask)
-            substance_painter.logging.info("Added layer mask and switched to mask context")
-            return True
+            substance_painter.logging.info("Commander: Manual procedural refresh started")
             
         except Exception as e:
-            raise ValueError(f"Error adding layer mask: {e}")
+            self.status_label.setText(f"Error refreshing procedurals: {str(e)}")
+            substance_painter.logging.error(f"Commander: Error during manual procedural refresh: {e}")
     
-    def remove_layer_mask(self):
-        """Remove mask from selected layer using official API"""
+    # ---- End Procedural System ----
+    
+    # ---- Project Monitoring ----
+    
+    def start_project_monitoring(self):
+        """Subscribe to host project/shelf events for automatic procedural loading (polling as fallback)"""
+        self.project_event_handlers = []
+        self._monitor_error_logged = False
+        
+        # Shelf crawls arrive in bursts (one per shelf); revalidate once they settle
+        self.shelf_change_timer = QtCore.QTimer(self)
+        self.shelf_change_timer.setSingleShot(True)
+        self.shelf_change_timer.setInterval(500)
+        self.shelf_change_timer.timeout.connect(self.on_shelves_changed)
+        
         try:
-            selected = self.get_selected_nodes()
-            if not selected:
-                raise ValueError("No layer selected")
+            import substance_painter.event
+            for event_type, handler in (
+                (substance_painter.event.ProjectEditionEntered, self.on_project_opened),
+                (substance_painter.event.ProjectAboutToClose, self.on_project_about_to_close),
+                (substance_painter.event.ShelfCrawlingEnded, self.on_shelf_crawling_ended),
+            ):
+                substance_painter.event.DISPATCHER.connect(event_type, handler)
+                self.project_event_handlers.append((event_type, handler))
             
-            layer = selected[0]
-            if not layer.has_mask():
-                raise ValueError("Layer has no mask to remove")
+            # Initial check; events take it from here
+            self.check_project_status()
+            substance_painter.logging.info("Commander: Started event-driven project monitoring")
+            return
+        except Exception as e:
+            substance_painter.logging.warning(f"Commander: Project events unavailable ({e}) - falling back to polling")
+            self.stop_project_monitoring()
+        
+        try:
+            # Poll with backoff: fast after a change, slower while nothing happens
+            self.project_timer = QtCore.QTimer(self)
+            self.project_timer.setSingleShot(True)
+            self.project_timer.timeout.connect(self.poll_project_status)
+            self.project_poll_interval = PROJECT_POLL_MIN_MS
+            self.poll_project_status()
             
-            layer.remove_mask()
-            substance_painter.logging.info("Removed layer mask")
-            return True
+            substance_painter.logging.info("Commander: Started polling project monitoring for automatic procedural loading")
             
         except Exception as e:
-            raise ValueError(f"Error removing layer mask: {e}")
+            substance_painter.logging.error(f"Commander: Error starting project monitoring: {e}")
     
-    def toggle_mask(self):
-        """Toggle mask enable/disable using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def stop_project_monitoring(self):
+        """Unsubscribe from host events and stop the fallback poll timer"""
+        if getattr(self, 'project_event_handlers', None):
+            import substance_painter.event
+            for event_type, handler in self.project_event_handlers:
+                try:
+                    substance_painter.event.DISPATCHER.disconnect(event_type, handler)
+                except Exception as e:
+                    substance_painter.logging.warning(f"Commander: Error disconnecting {event_type.__name__}: {e}")
+            self.project_event_handlers = []
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if hasattr(layer, 'is_mask_enabled') and layer.has_mask():
-                current_state = layer.is_mask_enabled()
-                layer.enable_mask(not current_state)
-            else:
-                raise ValueError("Layer has no mask to toggle")
-        else:
-            raise ValueError("No layer selected")
-    
-    def set_mask_black(self):
-        """Set mask background to black using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+        if getattr(self, 'project_timer', None):
+            self.project_timer.stop()
+            self.project_timer.deleteLater()
+            self.project_timer = None
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if hasattr(layer, 'set_mask_background') and layer.has_mask():
-                layer.set_mask_background(MaskBackground.Black)
-            else:
-                raise ValueError("Layer has no mask")
-        else:
-            raise ValueError("No layer selected")
+        if getattr(self, 'shelf_change_timer', None):
+            self.shelf_change_timer.stop()
     
-    def set_mask_white(self):
-        """Set mask background to white using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
-        
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if hasattr(layer, 'set_mask_background') and layer.has_mask():
-                layer.set_mask_background(MaskBackground.White)
-            else:
-                raise ValueError("Layer has no mask")
-        else:
-            raise ValueError("No layer selected")
+    def on_project_opened(self, event):
+        """Host event: project is ready for edition"""
+        self.set_project_state(True)
     
-    # === SELECTION & DELETION ===
-    def delete_selected(self):
-        """Delete selected nodes using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
-        
-        if selected_nodes:
-            for node in selected_nodes:
-                delete_node(node)
-        else:
-            raise ValueError("No nodes selected")
+    def on_project_about_to_close(self, event):
+        """Host event: project is closing"""
+        self.set_project_state(False)
     
-    def select_content(self):
-        """Select layer content using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
-        
-        if selected_nodes:
-            layer = selected_nodes[0]
-            set_selection_type(layer, SelectionType.Content)
+    def on_shelf_crawling_ended(self, event):
+        """Host event: a shelf finished (re)indexing its resources"""
+        self.shelf_change_timer.start()
+    
+    def on_shelves_changed(self):
+        """Revalidate the procedural catalog after shelf contents changed"""
+        try:
+            self.revalidate_procedural_catalog()
+        except Exception:
+            self._log_monitor_error("revalidating procedurals after a shelf change")
+    
+    def poll_project_status(self):
+        """Fallback poll: check the project state, then back off while nothing changes"""
+        changed = self.check_project_status()
+        if changed:
+            self.project_poll_interval = PROJECT_POLL_MIN_MS
         else:
-            raise ValueError("No layer selected")
+            self.project_poll_interval = min(self.project_poll_interval * 2, PROJECT_POLL_MAX_MS)
+        self.project_timer.start(self.project_poll_interval)
     
-    def select_mask(self):
-        """Select layer mask using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
+    def check_project_status(self):
+        """Check for project state changes and load procedurals when project opens; returns True on change"""
+        try:
+            return self.set_project_state(substance_painter.project.is_open())
+        except Exception:
+            self._log_monitor_error("checking project status")
+            return False
+    
+    def set_project_state(self, current_state):
+        """Apply a project open/closed state; returns True if it changed"""
+        if self.last_project_state == current_state:
+            return False
+        self.last_project_state = current_state
         
-        if selected_nodes:
-            layer = selected_nodes[0]
-            if hasattr(layer, 'has_mask') and layer.has_mask():
-                set_selection_type(layer, SelectionType.Mask)
-            else:
-                raise ValueError("Layer has no mask to select")
+        if current_state:
+            # Project just opened - perfect time to load procedurals!
+            substance_painter.logging.info("Commander: Project opened - checking procedural catalog")
+            
+            # Project context is now available; rescan only if the catalog is stale
+            try:
+                self.revalidate_procedural_catalog()
+            except Exception:
+                self._log_monitor_error("loading procedurals for the opened project")
         else:
-            raise ValueError("No layer selected")
+            substance_painter.logging.info("Commander: Project closed")
+            # The closed project's own procedurals go with it; the shelf catalog stays
+            if any(proc.embedded for proc in self.procedurals_cache):
+                self._set_procedural_cache([proc for proc in self.procedurals_cache if not proc.embedded])
+                self.refresh_commands()
+        return True
     
-    def select_properties(self):
-        """Select layer properties using official API"""
-        stack = substance_painter.textureset.get_active_stack()
-        selected_nodes = get_selected_nodes(stack)
-        
-        if selected_nodes:
-            layer = selected_nodes[0]
-            # Properties selection is only for instance layers
-            if hasattr(layer, 'instance_source'):
-                set_selection_type(layer, SelectionType.Properties)
-            else:
-                raise ValueError("Properties selection only available for instance layers")
+    def _log_monitor_error(self, action):
+        """Log a monitoring error with its traceback, once per session so it can't spam the log"""
+        if self._monitor_error_logged:
+            return
+        self._monitor_error_logged = True
+        import traceback
+        substance_painter.logging.error(f"Commander: Error {action} (further monitoring errors are not logged): {traceback.format_exc()}")
+    
+    # ---- End Project Monitoring ----
+    
+    # ---- User interaction hooks (see LayerCommands) ----
+    
+    def report(self, message):
+        """Show a command's result in the status bar (logged if the palette hasn't been built yet)"""
+        if self.ui_built:
+            self.status_label.setText(message)
         else:
-            raise ValueError("No layer selected")
+            super().report(message)
+    
+    def prompt_double(self, title, label, value, minimum, maximum, decimals):
+        """Ask for a number in a dialog; returns (value, ok)"""
+        return QtWidgets.QInputDialog.getDouble(self, title, label, value, minimum, maximum, decimals)
+    
+    def prompt_item(self, title, label, items, current):
+        """Ask to pick one of items in a dialog; returns (item, ok)"""
+        return QtWidgets.QInputDialog.getItem(self, title, label, items, current, False)
+    
+    def prompt_text(self, title, label, text=""):
+        """Ask for a line of text in a dialog; returns (text, ok)"""
+        return QtWidgets.QInputDialog.getText(self, title, label, QtWidgets.QLineEdit.EchoMode.Normal, text)
 
-    def get_procedural_resources(self):
-        """Get list of available procedural resources"""
-        try:
-            from substance_painter.resource import Usage
-            # First try to get all resources and filter by usage
-            all_resources = substance_painter.resource.search("")  # Get all resources
-            substance_painter.logging.info(f"Commander: Total resources found: {len(all_resources)}")
-            
-            procedurals = []
-            for resource in all_resources:
-                try:
-                    # Check if this resource has procedural usage
-                    if hasattr(resource, 'usages'):
-                        usages = resource.usages()
-                        # Check if Usage.PROCEDURAL is in the usages
-                        if Usage.PROCEDURAL in usages:
-                            identifier = resource.identifier()
-                            procedurals.append({
-                                'name': resource.gui_name(),
-                                'category': resource.category() if hasattr(resource, 'category') else 'Unknown',
-                                'resource_id': identifier,
-                                'resource': resource
-                            })
-                            substance_painter.logging.info(f"Commander: Found procedural: {resource.gui_name()}")
-                except Exception as e:
-                    # Skip resources that cause errors - don't log each one
-                    continue
-            
-            substance_painter.logging.info(f"Commander: Final procedural count: {len(procedurals)}")
-            return procedurals
-            
-        except Exception as e:
-            substance_painter.logging.error(f"Error searching for procedural resources: {e}")
-            import traceback
-            substance_painter.logging.error(f"Traceback: {traceback.format_exc()}")
-            return []
+def build_commander_dock():
+    """Build the palette UI and its dock on first use; returns False if that fails"""
+    global DOCK_WIDGET
     
-    def apply_procedural(self, procedural_data):
-        """Apply a procedural resource to a fill effect"""
-        try:
-            # Get the resource from procedural_data
-            resource = procedural_data.get('resource')
-            if not resource:
-                raise ValueError("No resource found in procedural data")
-            
-            # Get current selection and context
-            stack = substance_painter.textureset.get_active_stack()
-            selected_nodes = get_selected_nodes(stack)
-            
-            # Determine insertion context
-            if selected_nodes:
-                layer = selected_nodes[0]
-                # Check selection type to determine context (mask vs content)
-                selection_type = substance_painter.layerstack.get_selection_type(layer)
-                
-                if selection_type == SelectionType.Mask:
-                    # Insert as fill effect in mask stack (grayscale)
-                    if not layer.has_mask():
-                        layer.add_mask(MaskBackground.Black)
-                    insert_position = InsertPosition.inside_node(layer, NodeStack.Mask)
-                    context_name = "mask"
-                else:
-                    # Insert as fill effect in content stack (roughness)
-                    insert_position = InsertPosition.inside_node(layer, NodeStack.Content)
-                    context_name = "content"
-            else:
-                # No selection - create at top of stack
-                insert_position = InsertPosition.from_textureset_stack(stack)
-                context_name = "content"
-            
-            # Create the fill effect
-            effect = insert_fill(insert_position)
-            effect.set_name(f"{procedural_data['name']}")
-            
-            # Apply the procedural resource to the effect
-            # Get the resource ID from the procedural data
-            resource_id = resource.identifier()
-            
-            if context_name == "mask":
-                # For masks, set to grayscale channel (channel type = None)
-                effect.set_source(None, resource_id)
-                substance_painter.logging.info(f"Commander: Applied procedural to mask (grayscale)")
-            else:
-                # For content, target Roughness channel with BaseColor fallback
-                # The correct signature is: set_source(channel_type, resource_id)
-                try:
-                    # Try to set source to Roughness channel - CHANNEL TYPE FIRST!
-                    effect.set_source(ChannelType.Roughness, resource_id)
-                    substance_painter.logging.info(f"Commander: Applied to Roughness channel")
-                except Exception as e:
-                    # Fallback to BaseColor if Roughness fails
-                    try:
-                        effect.set_source(ChannelType.BaseColor, resource_id)
-                        substance_painter.logging.info(f"Commander: Applied to BaseColor channel")
-                    except Exception as fallback_error:
-                        # Final fallback - no channel specification
-                        effect.set_source(resource_id)
-                        substance_painter.logging.info(f"Commander: Applied to default channel")
-            
-            return f"✓ Applied procedural '{procedural_data['name']}' as fill effect in {context_name}"
-            
-        except Exception as e:
-            raise ValueError(f"Failed to apply procedural: {e}")
+    if DOCK_WIDGET:
+        return True
+    try:
+        COMMANDER_WIDGET.build_ui()
+        with timed_phase("dock"):
+            DOCK_WIDGET = substance_painter.ui.add_dock_widget(COMMANDER_WIDGET)
+            DOCK_WIDGET.hide()  # shown at the cursor by show_commander
+        log_startup_timings("First open", ("widgets", "procedural catalog", "command list", "project monitoring", "dock"))
+        return True
+    except Exception as e:
+        substance_painter.logging.error(f"Failed to build Commander dock: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
 
 def show_commander():
     """Show dock widget at cursor OR refocus if already visible"""
     global DOCK_WIDGET, COMMANDER_WIDGET
     
-    if not DOCK_WIDGET or not COMMANDER_WIDGET:
+    if not COMMANDER_WIDGET or not build_commander_dock():
         return
     
     # If dock is already visible, just refocus the search input
@@ -2774,18 +4891,12 @@ def show_commander():
         COMMANDER_WIDGET.search_input.setFocus()
         COMMANDER_WIDGET.search_input.selectAll()
         
-        # Select first visible item for immediate arrow navigation
-        if COMMANDER_WIDGET.results_list.count() > 0:
-            # Find first visible item (not hidden by search filter)
-            for i in range(COMMANDER_WIDGET.results_list.count()):
-                item = COMMANDER_WIDGET.results_list.item(i)
-                if not item.isHidden():
-                    COMMANDER_WIDGET.results_list.setCurrentRow(i)
-                    break
+        # Select first shown item for immediate arrow navigation
+        COMMANDER_WIDGET.select_first_result()
         return
     
-    # If procedurals haven't been loaded yet, try a lazy load when first opening
-    if not COMMANDER_WIDGET.procedurals_loaded:
+    # If procedurals haven't been loaded yet, start a background load when first opening
+    if not COMMANDER_WIDGET.procedurals_loaded and not COMMANDER_WIDGET.procedural_loader.is_running():
         substance_painter.logging.info("Commander: First time opening - attempting procedural lazy load")
         COMMANDER_WIDGET.refresh_commands(force_reload_procedurals=True)
     
@@ -2821,33 +4932,35 @@ def show_commander():
     COMMANDER_WIDGET.search_input.selectAll()
     
     # Select first item in results for immediate arrow navigation
-    if COMMANDER_WIDGET.results_list.count() > 0:
-        COMMANDER_WIDGET.results_list.setCurrentRow(0)
+    COMMANDER_WIDGET.select_first_result()
 
 def start_plugin():
     """STABLE DOCK WIDGET with popup-like behavior - No crashes!"""
     global COMMANDER_WIDGET, COMMANDER_SHORTCUT, DOCK_WIDGET
     
     try:
-        # Create Commander widget  
-        COMMANDER_WIDGET = CommanderWidget()
+        with timed_phase("crash logging"):
+            init_crash_logging()
         
-        # Create dock widget
-        DOCK_WIDGET = substance_painter.ui.add_dock_widget(COMMANDER_WIDGET)
-        DOCK_WIDGET.hide()  # Hidden by default
+        # Create Commander widget: settings, macros and hotkeys only; the palette
+        # UI and dock are built when it is first shown (see build_commander_dock)
+        with timed_phase("settings, macros and hotkeys"):
+            COMMANDER_WIDGET = CommanderWidget()
         
         # Create keyboard shortcut from settings
-        main_window = substance_painter.ui.get_main_window()
-        from PySide6.QtGui import QShortcut
-        
-        # Load settings to get the custom shortcut
-        shortcut_key = COMMANDER_WIDGET.settings['main_shortcut']
-        COMMANDER_SHORTCUT = QShortcut(QtGui.QKeySequence(shortcut_key), main_window)
-        COMMANDER_SHORTCUT.activated.connect(show_commander)
+        with timed_phase("main shortcut"):
+            main_window = substance_painter.ui.get_main_window()
+            from PySide6.QtGui import QShortcut
+            
+            # Load settings to get the custom shortcut
+            shortcut_key = COMMANDER_WIDGET.settings['main_shortcut']
+            COMMANDER_SHORTCUT = QShortcut(QtGui.QKeySequence(shortcut_key), main_window)
+            COMMANDER_SHORTCUT.activated.connect(show_commander)
         
         substance_painter.logging.info(f"Commander shortcut set to: {shortcut_key}")
         
         substance_painter.logging.info("Commander Plugin started - STABLE DOCK with popup behavior")
+        log_startup_timings("Startup", ("crash logging", "settings, macros and hotkeys", "main shortcut"))
         
     except Exception as e:
         substance_painter.logging.error(f"Failed to start Commander Plugin: {e}")
@@ -2860,26 +4973,25 @@ def close_plugin():
     
     substance_painter.logging.info("Commander: Starting stable dock cleanup")
     
-    # Stop project monitoring timer if it exists
-    if COMMANDER_WIDGET and hasattr(COMMANDER_WIDGET, 'project_timer'):
+    # Write settings/macro edits still waiting for their save
+    if COMMANDER_WIDGET:
         try:
-            COMMANDER_WIDGET.project_timer.stop()
-            COMMANDER_WIDGET.project_timer.deleteLater()
-            substance_painter.logging.info("Commander: Project monitoring timer cleaned up")
+            COMMANDER_WIDGET.persistence.close()
         except Exception as e:
-            substance_painter.logging.error(f"Error cleaning up project timer: {e}")
+            substance_painter.logging.error(f"Error saving settings and macros: {e}")
     
-    # Clean up macro hotkey shortcuts
-    if COMMANDER_WIDGET and hasattr(COMMANDER_WIDGET, 'macro_shortcuts'):
+    # Stop project monitoring (event subscriptions or fallback timer)
+    if COMMANDER_WIDGET:
         try:
-            for macro_name, shortcut in COMMANDER_WIDGET.macro_shortcuts.items():
-                try:
-                    shortcut.activated.disconnect()
-                    shortcut.setParent(None)
-                    shortcut.deleteLater()
-                except Exception:
-                    pass
-            COMMANDER_WIDGET.macro_shortcuts.clear()
+            COMMANDER_WIDGET.stop_project_monitoring()
+            substance_painter.logging.info("Commander: Project monitoring cleaned up")
+        except Exception as e:
+            substance_painter.logging.error(f"Error cleaning up project monitoring: {e}")
+    
+    # Clean up macro hotkeys (removes the application event filter)
+    if COMMANDER_WIDGET:
+        try:
+            COMMANDER_WIDGET.hotkey_router.uninstall()
             substance_painter.logging.info("Commander: Macro hotkeys cleaned up")
         except Exception as e:
             substance_painter.logging.error(f"Error cleaning up macro hotkeys: {e}")
@@ -2904,6 +5016,9 @@ def close_plugin():
         
     COMMANDER_WIDGET = None
     substance_painter.logging.info("Commander Plugin closed - Stable cleanup complete")
+    
+    # Last, so the teardown above still has its Qt messages logged
+    shutdown_crash_logging()
 
 if __name__ == "__main__":
     start_plugin()